@@ -0,0 +1,268 @@
+"""
+Offline end-to-end benchmark for process_video
+
+Runs the real pipeline (script -> TTS -> stock clips -> subtitles -> FFmpeg
+render -> thumbnail) against local stand-ins for HuggingFace, Pexels,
+Pixabay and Google TTS, and reports per-stage latency percentiles, jobs
+per minute, peak RSS and the cost of importing main and starting the
+services as JSON.
+
+Usage (from the backend directory):
+    python -m benchmarks.pipeline_benchmark --jobs 8 --concurrency 4 --output bench.json
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+import functools
+import logging
+from datetime import datetime
+from typing import Dict, List
+
+from benchmarks.stand_ins import StandIns
+
+logger = logging.getLogger("benchmarks")
+
+# Service methods timed as pipeline stages: stage -> (service, method)
+STAGES = {
+    "script": ("script_service", "stream_script"),
+    "tts": ("tts_service", "generate_audio_for_scenes"),
+    "clips": ("stock_service", "fetch_videos_for_scenes"),
+    "subtitles": ("subtitle_generator", "generate_srt"),
+    "render": ("video_service", "create_final_video"),
+    "thumbnail": ("video_service", "generate_thumbnail"),
+}
+
+PERCENTILES = [50, 90, 95, 99]
+
+# Run in a fresh interpreter, so nothing is cached from the benchmark itself
+STARTUP_PROBE = """
+import json, time, asyncio
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from services.registry import registry
+async def startup():
+    await registry.startup()
+    await registry.shutdown()
+asyncio.run(startup())
+print(json.dumps({"import_main": imported - start, "service_startup": time.perf_counter() - imported}))
+"""
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile with linear interpolation"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values: List[float]) -> Dict:
+    summary = {"count": len(values)}
+    if values:
+        summary["mean"] = round(sum(values) / len(values), 4)
+        summary["max"] = round(max(values), 4)
+        for pct in PERCENTILES:
+            summary[f"p{pct}"] = round(percentile(values, pct), 4)
+    return summary
+
+
+def instrument_stages(timings: Dict[str, List[float]]):
+    """Wrap the services' stage methods with wall-clock timers"""
+    from services.registry import registry
+    from services.script_service import SCRIPT_STREAMING
+    from utils.subtitle_generator import subtitle_generator
+    
+    for stage, (name, method) in STAGES.items():
+        if stage == "script" and not SCRIPT_STREAMING:
+            # process_video only streams the script when SCRIPT_STREAMING is on
+            method = "generate_script"
+        service = subtitle_generator if name == "subtitle_generator" else registry.get(name)
+        original = getattr(service, method)
+        timings[stage] = []
+        
+        if asyncio.iscoroutinefunction(original):
+            async def timed(*args, _original=original, _stage=stage, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await _original(*args, **kwargs)
+                finally:
+                    timings[_stage].append(time.perf_counter() - start)
+        else:
+            def timed(*args, _original=original, _stage=stage, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return _original(*args, **kwargs)
+                finally:
+                    timings[_stage].append(time.perf_counter() - start)
+        
+        setattr(service, method, functools.wraps(original)(timed))
+
+
+def measure_startup(repeats: int) -> Dict:
+    """Time 'import main' and service startup in fresh interpreters"""
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    samples: Dict[str, List[float]] = {"import_main": [], "service_startup": []}
+    
+    for _ in range(repeats):
+        result = subprocess.run(
+            [sys.executable, "-c", STARTUP_PROBE],
+            cwd=backend_dir, capture_output=True, text=True, timeout=120
+        )
+        if result.returncode != 0:
+            logger.warning(f"Startup probe failed: {result.stderr.strip()[-500:]}")
+            continue
+        for key, value in json.loads(result.stdout.strip().splitlines()[-1]).items():
+            samples[key].append(value)
+    
+    return {key: summarize(values) for key, values in samples.items()}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, timeout=5
+        ).stdout.strip() or "unknown"
+    except Exception:
+        return "unknown"
+
+
+async def run_jobs(jobs: int, concurrency: int, duration: int, timings: Dict[str, List[float]]) -> Dict:
+    import main
+    from database import init_db, SessionLocal, VideoDB
+    from models import VideoStatus
+    from services.registry import registry
+    
+    init_db()
+    await registry.startup()
+    instrument_stages(timings)
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses: Dict[str, str] = {}
+    timings["total"] = []
+    
+    async def one_job(index: int):
+        video_id = str(uuid.uuid4())
+        topic = f"benchmark topic {index}"
+        
+        db = SessionLocal()
+        try:
+            db.add(VideoDB(id=video_id, topic=topic, status=VideoStatus.PENDING, progress=0))
+            db.commit()
+        finally:
+            db.close()
+        
+        async with semaphore:
+            start = time.perf_counter()
+            await main.process_video(video_id=video_id, topic=topic, duration=duration)
+            timings["total"].append(time.perf_counter() - start)
+        
+        db = SessionLocal()
+        try:
+            video = db.query(VideoDB).filter(VideoDB.id == video_id).first()
+            statuses[video_id] = video.status.value if video and video.status else "missing"
+        finally:
+            db.close()
+    
+    wall_start = time.perf_counter()
+    try:
+        await asyncio.gather(*(one_job(i) for i in range(jobs)))
+    finally:
+        await registry.shutdown()
+    wall_seconds = time.perf_counter() - wall_start
+    
+    completed = sum(1 for status in statuses.values() if status == VideoStatus.COMPLETED.value)
+    return {
+        "wall_seconds": round(wall_seconds, 3),
+        "completed": completed,
+        "failed": jobs - completed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline process_video benchmark")
+    parser.add_argument("--jobs", type=int, default=4, help="Number of jobs to run")
+    parser.add_argument("--concurrency", type=int, default=2, help="Jobs running at once")
+    parser.add_argument("--duration", type=int, default=30, help="Target video duration (s)")
+    parser.add_argument("--hf-latency", type=float, default=1.0, help="HuggingFace stand-in latency (s)")
+    parser.add_argument("--pexels-latency", type=float, default=0.2, help="Pexels stand-in latency (s)")
+    parser.add_argument("--pixabay-latency", type=float, default=0.2, help="Pixabay stand-in latency (s)")
+    parser.add_argument("--tts-latency", type=float, default=0.3, help="Google TTS stand-in latency (s)")
+    parser.add_argument("--startup-repeats", type=int, default=3, help="Fresh-interpreter import/startup samples")
+    parser.add_argument("--work-dir", default=None, help="Scratch directory (default: temp dir)")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON results path")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.WARNING)
+    logger.setLevel(logging.INFO)
+    
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="faceless_bench_")
+    media_dir = os.path.join(work_dir, "media")
+    os.makedirs(media_dir, exist_ok=True)
+    
+    latencies = {
+        "huggingface": args.hf_latency,
+        "pexels": args.pexels_latency,
+        "pixabay": args.pixabay_latency,
+        "google_tts": args.tts_latency,
+    }
+    
+    with StandIns(os.path.join(work_dir, "stand_in_media"), latencies) as stand_ins:
+        # Configure the services before anything imports them
+        os.environ.update(stand_ins.environment())
+        os.environ["MEDIA_DIR"] = media_dir
+        os.environ["SCRATCH_DIR"] = os.path.join(work_dir, "scratch")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(work_dir, 'benchmark.db')}"
+        stand_ins.patch_gtts()
+        
+        startup = measure_startup(args.startup_repeats)
+        
+        timings: Dict[str, List[float]] = {}
+        logger.info(f"Running {args.jobs} jobs with concurrency {args.concurrency} in {work_dir}")
+        outcome = asyncio.run(run_jobs(args.jobs, args.concurrency, args.duration, timings))
+        request_counts = stand_ins.request_counts()
+    
+    wall_seconds = outcome["wall_seconds"]
+    results = {
+        "revision": git_revision(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "config": {
+            "jobs": args.jobs,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "latencies": latencies,
+        },
+        "jobs": {
+            "completed": outcome["completed"],
+            "failed": outcome["failed"],
+        },
+        "wall_seconds": wall_seconds,
+        "jobs_per_minute": round(outcome["completed"] / wall_seconds * 60, 3) if wall_seconds else 0.0,
+        "stages": {stage: summarize(values) for stage, values in timings.items()},
+        "startup": startup,
+        "peak_rss_mb": {
+            # ru_maxrss is in KiB on Linux; children is the largest FFmpeg process
+            "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+        },
+        "stand_in_requests": request_counts,
+    }
+    
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
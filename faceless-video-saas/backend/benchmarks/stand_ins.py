@@ -0,0 +1,347 @@
+"""
+Deterministic local stand-ins for the external services used by the pipeline
+
+Each stand-in is a small threaded HTTP server that answers in the same
+shape as the real API after a fixed latency:
+
+- HuggingFace Inference API (script generation, whole or streamed)
+- Pexels video search (+ serving the clip files)
+- Pixabay video search (+ serving the clip files)
+- Google Translate TTS endpoint used by gTTS
+
+Stock clips and TTS audio are synthetic and generated once with FFmpeg's
+lavfi sources, so runs are repeatable and need no network access.
+"""
+import os
+import re
+import json
+import math
+import time
+import base64
+import subprocess
+import threading
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import urlparse, parse_qs, unquote_plus
+
+logger = logging.getLogger(__name__)
+
+# Synthetic stock clips: lavfi source pattern -> file name
+CLIP_SOURCES = {
+    "clip_testsrc2.mp4": "testsrc2",
+    "clip_smptehdbars.mp4": "smptehdbars",
+    "clip_rgbtestsrc.mp4": "rgbtestsrc",
+}
+CLIP_SECONDS = 10
+CLIP_WIDTH = 1080
+CLIP_HEIGHT = 1920
+
+# Seconds of narration returned per gTTS request (gTTS sends <=100 chars per request)
+TTS_WORDS_PER_SECOND = 2.3
+
+
+def generate_media(cache_dir: str) -> Dict[str, str]:
+    """
+    Create the synthetic clips and the one-second narration chunk
+    
+    Files are reused across runs when they already exist.
+    
+    Returns:
+        Dict of file name -> path
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    files = {}
+    
+    for name, source in CLIP_SOURCES.items():
+        path = os.path.join(cache_dir, name)
+        if not os.path.exists(path):
+            subprocess.run([
+                'ffmpeg', '-y', '-loglevel', 'error',
+                '-f', 'lavfi',
+                '-i', f"{source}=s={CLIP_WIDTH}x{CLIP_HEIGHT}:r=25",
+                '-t', str(CLIP_SECONDS),
+                '-c:v', 'libx264',
+                '-preset', 'veryfast',
+                '-pix_fmt', 'yuv420p',
+                '-movflags', '+faststart',
+                path
+            ], check=True)
+        files[name] = path
+    
+    # One second of speech-like tone; concatenated MP3 frames stay decodable
+    tts_path = os.path.join(cache_dir, "tts_chunk.mp3")
+    if not os.path.exists(tts_path):
+        subprocess.run([
+            'ffmpeg', '-y', '-loglevel', 'error',
+            '-f', 'lavfi',
+            '-i', 'sine=frequency=220:sample_rate=24000:duration=1',
+            '-ac', '1',
+            '-c:a', 'libmp3lame',
+            '-b:a', '32k',
+            '-write_xing', '0',
+            '-id3v2_version', '0',
+            tts_path
+        ], check=True)
+    files["tts_chunk.mp3"] = tts_path
+    
+    return files
+
+
+class StandInServer:
+    """A fixed-latency HTTP server running in a background thread"""
+    
+    def __init__(self, name: str, handler: type, latency: float, state: Dict):
+        self.name = name
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        
+        server = self
+        
+        class Handler(handler):
+            stand_in = server
+            shared = state
+        
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+    
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+    
+    def start(self) -> "StandInServer":
+        self.thread.start()
+        logger.info(f"{self.name} stand-in listening on {self.base_url}")
+        return self
+    
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _BaseHandler(BaseHTTPRequestHandler):
+    """Common plumbing: fixed latency, JSON and file responses"""
+    
+    stand_in: StandInServer = None
+    shared: Dict = {}
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _delay(self):
+        self.stand_in.count_request()
+        if self.stand_in.latency:
+            time.sleep(self.stand_in.latency)
+    
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+    
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _send_json(self, payload, status: int = 200):
+        self._send(status, json.dumps(payload).encode(), "application/json")
+    
+    def _send_clip(self, name: str):
+        path = self.shared["media"].get(os.path.basename(name))
+        if not path:
+            self._send(404, b"not found", "text/plain")
+            return
+        with open(path, "rb") as f:
+            self._send(200, f.read(), "video/mp4")
+    
+    def _clip_url(self, index: int) -> str:
+        names = sorted(CLIP_SOURCES)
+        return f"{self.stand_in.base_url}/clips/{names[index % len(names)]}"
+
+
+class HuggingFaceHandler(_BaseHandler):
+    """
+    POST /models/<model> -> [{"generated_text": ...}], or with "stream": true
+    a text/event-stream of tokens spread evenly over the latency
+    """
+    
+    def do_POST(self):
+        payload = json.loads(self._read_body() or b"{}")
+        prompt = payload.get("inputs", "")
+        
+        topic_match = re.search(r'about "([^"]+)"', prompt)
+        words_match = re.search(r"Target length: (\d+) words", prompt)
+        topic = topic_match.group(1) if topic_match else "this topic"
+        target_words = int(words_match.group(1)) if words_match else 140
+        
+        sentences = [f"This is why {topic} will change how you see the world."]
+        i = 1
+        while sum(len(s.split()) for s in sentences) < target_words:
+            sentences.append(
+                f"Fact number {i} about {topic} surprises researchers, travellers and curious viewers."
+            )
+            i += 1
+        sentences.append("Follow for more amazing content like this!")
+        generated_text = ' '.join(sentences)
+        
+        if payload.get("stream"):
+            self._stream_tokens(generated_text)
+            return
+        
+        self._delay()
+        self._send_json([{"generated_text": generated_text}])
+    
+    def _stream_tokens(self, generated_text: str):
+        """Send one word per event, like text-generation-inference"""
+        self.stand_in.count_request()
+        words = generated_text.split(' ')
+        token_delay = self.stand_in.latency / len(words)
+        
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for i, word in enumerate(words):
+            time.sleep(token_delay)
+            last = i == len(words) - 1
+            event = {
+                "index": i + 1,
+                "token": {"id": i, "text": word if i == 0 else f" {word}", "special": False},
+                "generated_text": generated_text if last else None,
+            }
+            self.wfile.write(f"data:{json.dumps(event)}\n\n".encode())
+            self.wfile.flush()
+
+
+class PexelsHandler(_BaseHandler):
+    """GET /videos/search -> Pexels search payload; GET /clips/<file> -> clip"""
+    
+    def do_GET(self):
+        self._delay()
+        url = urlparse(self.path)
+        if url.path.startswith("/clips/"):
+            self._send_clip(url.path)
+            return
+        
+        query = parse_qs(url.query).get("query", [""])[0]
+        per_page = int(parse_qs(url.query).get("per_page", ["5"])[0])
+        seed = sum(query.encode())
+        
+        videos = []
+        for i in range(per_page):
+            videos.append({
+                "id": seed * 10 + i,
+                "duration": CLIP_SECONDS,
+                "width": CLIP_WIDTH,
+                "height": CLIP_HEIGHT,
+                "video_files": [{
+                    "quality": "hd",
+                    "width": CLIP_WIDTH,
+                    "height": CLIP_HEIGHT,
+                    "file_type": "video/mp4",
+                    "link": self._clip_url(seed + i)
+                }]
+            })
+        
+        self._send_json({"page": 1, "per_page": per_page, "videos": videos})
+
+
+class PixabayHandler(_BaseHandler):
+    """GET /api/videos/ -> Pixabay search payload; GET /clips/<file> -> clip"""
+    
+    def do_GET(self):
+        self._delay()
+        url = urlparse(self.path)
+        if url.path.startswith("/clips/"):
+            self._send_clip(url.path)
+            return
+        
+        query = parse_qs(url.query).get("q", [""])[0]
+        per_page = int(parse_qs(url.query).get("per_page", ["5"])[0])
+        seed = sum(query.encode())
+        
+        hits = []
+        for i in range(per_page):
+            rendition = {"url": self._clip_url(seed + i), "width": CLIP_WIDTH, "height": CLIP_HEIGHT}
+            hits.append({
+                "id": seed * 10 + i,
+                "duration": CLIP_SECONDS,
+                "videos": {"large": rendition, "medium": rendition, "small": rendition}
+            })
+        
+        self._send_json({"total": per_page, "hits": hits})
+
+
+class GoogleTTSHandler(_BaseHandler):
+    """POST /_/TranslateWebserverUi/data/batchexecute -> gTTS batchexecute payload"""
+    
+    def do_POST(self):
+        self._delay()
+        form = parse_qs(self._read_body().decode())
+        request_text = unquote_plus(form.get("f.req", [""])[0])
+        words = max(1, len(re.findall(r"\w+", request_text)) - 4)  # minus RPC envelope tokens
+        seconds = max(1, math.ceil(words / TTS_WORDS_PER_SECOND))
+        
+        with open(self.shared["media"]["tts_chunk.mp3"], "rb") as f:
+            audio = f.read() * seconds
+        
+        encoded = base64.b64encode(audio).decode("ascii")
+        # gTTS matches the raw line with a regex, so no spaces after separators
+        rpc = json.dumps(
+            [["wrb.fr", "jQ1olc", json.dumps([encoded]), None, None, None, "generic"]],
+            separators=(",", ":")
+        )
+        body = ")]}'\n\n" + str(len(rpc)) + "\n" + rpc + "\n"
+        self._send(200, body.encode(), "application/json")
+
+
+class StandIns:
+    """Start and stop all four stand-ins together"""
+    
+    def __init__(self, cache_dir: str, latencies: Optional[Dict[str, float]] = None):
+        latencies = latencies or {}
+        self.state = {"media": generate_media(cache_dir)}
+        self.servers = {
+            "huggingface": StandInServer("huggingface", HuggingFaceHandler, latencies.get("huggingface", 0.0), self.state),
+            "pexels": StandInServer("pexels", PexelsHandler, latencies.get("pexels", 0.0), self.state),
+            "pixabay": StandInServer("pixabay", PixabayHandler, latencies.get("pixabay", 0.0), self.state),
+            "google_tts": StandInServer("google_tts", GoogleTTSHandler, latencies.get("google_tts", 0.0), self.state),
+        }
+    
+    def __enter__(self) -> "StandIns":
+        for server in self.servers.values():
+            server.start()
+        return self
+    
+    def __exit__(self, *exc):
+        for server in self.servers.values():
+            server.stop()
+    
+    def environment(self) -> Dict[str, str]:
+        """Environment variables that point the services at the stand-ins"""
+        return {
+            "HUGGINGFACE_TOKEN": "hf_benchmark",
+            "HF_API_URL": f"{self.servers['huggingface'].base_url}/models/benchmark",
+            "PEXELS_API_KEY": "benchmark",
+            "PEXELS_API_URL": f"{self.servers['pexels'].base_url}/videos/search",
+            "PIXABAY_API_KEY": "benchmark",
+            "PIXABAY_API_URL": f"{self.servers['pixabay'].base_url}/api/videos/",
+            "NO_PROXY": "127.0.0.1,localhost",
+        }
+    
+    def patch_gtts(self):
+        """Point gTTS at the Google TTS stand-in (gTTS has no URL setting)"""
+        import gtts.tts
+        
+        base_url = self.servers["google_tts"].base_url
+        gtts.tts._translate_url = lambda tld="com", path="": f"{base_url}/{path}"
+    
+    def request_counts(self) -> Dict[str, int]:
+        return {name: server.requests for name, server in self.servers.items()}
@@ -3,11 +3,16 @@ Database configuration and models
 """
 import os
 from datetime import datetime
-from sqlalchemy import create_engine, Column, String, Integer, DateTime, Text, Enum as SQLEnum
+import json
+import logging
+from sqlalchemy import create_engine, inspect, text, Column, String, Integer, BigInteger, Float, DateTime, Text, ForeignKey, UniqueConstraint, Enum as SQLEnum
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, relationship
 from models import VideoStatus
 
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
 # Database URL from environment or default to SQLite
 DATABASE_URL = os.getenv(
     "DATABASE_URL", 
@@ -33,9 +38,19 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+def _hls_url(playlist_path: str) -> str:
+    """Public URL of an HLS playlist stored in its own media subdirectory"""
+    hls_dir = os.path.basename(os.path.dirname(playlist_path))
+    return f"/media/{hls_dir}/{os.path.basename(playlist_path)}"
+
+
 class VideoDB(Base):
     """Video model for database"""
     __tablename__ = "videos"
+    __table_args__ = (
+        # Scoped per tenant; cleared once past the retention window so the key can be reused
+        UniqueConstraint("tenant_id", "idempotency_key", name="uq_videos_tenant_idempotency_key"),
+    )
     
     id = Column(String(36), primary_key=True, index=True)
     topic = Column(String(200), nullable=False, index=True)
@@ -45,10 +60,35 @@ class VideoDB(Base):
     audio_path = Column(String(500), nullable=True)
     video_path = Column(String(500), nullable=True)
     thumbnail_path = Column(String(500), nullable=True)
+    storyboard_path = Column(String(500), nullable=True)
+    stream_path = Column(String(500), nullable=True)
+    preview_path = Column(String(500), nullable=True)
+    render_profiles = Column(String(100), nullable=True)  # comma-separated, primary first
+    encoding_profile = Column(Text, nullable=True)  # JSON, chosen by the encoding policy
+    degradations = Column(Text, nullable=True)  # JSON list, applied to meet the job deadline
+    priority = Column(String(20), nullable=True)
+    tenant_id = Column(String(100), nullable=True, index=True)
+    subtitle_mode = Column(String(20), nullable=True)
+    idempotency_key = Column(String(255), nullable=True)
+    request_hash = Column(String(64), nullable=True)  # SHA-256 of the create request body
+    srt_path = Column(String(500), nullable=True)
+    vtt_path = Column(String(500), nullable=True)
+    profile_path = Column(String(500), nullable=True)
+    profile_report_path = Column(String(500), nullable=True)
+    memory_report_path = Column(String(500), nullable=True)
+    peak_memory_bytes = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     error_message = Column(Text, nullable=True)
     
+    renditions = relationship(
+        "VideoRenditionDB",
+        back_populates="video",
+        cascade="all, delete-orphan"
+    )
+    spans = relationship("VideoSpanDB", cascade="all, delete-orphan")
+    artifacts = relationship("VideoArtifactDB", cascade="all, delete-orphan")
+    
     def to_dict(self):
         return {
             "id": self.id,
@@ -59,15 +99,176 @@ class VideoDB(Base):
             "audio_url": f"/media/{os.path.basename(self.audio_path)}" if self.audio_path else None,
             "video_url": f"/media/{os.path.basename(self.video_path)}" if self.video_path else None,
             "thumbnail_url": f"/media/{os.path.basename(self.thumbnail_path)}" if self.thumbnail_path else None,
+            "storyboard_url": f"/media/{os.path.basename(self.storyboard_path)}" if self.storyboard_path else None,
+            "preview_url": f"/media/{os.path.basename(self.preview_path)}" if self.preview_path else None,
+            "stream_url": _hls_url(self.stream_path) if self.stream_path else None,
+            "renditions": {r.name: f"/media/{os.path.basename(r.path)}" for r in self.renditions},
+            "profile_url": f"/media/{os.path.basename(self.profile_path)}" if self.profile_path else None,
+            "profile_report_url": f"/media/{os.path.basename(self.profile_report_path)}" if self.profile_report_path else None,
+            "memory_report_url": f"/media/{os.path.basename(self.memory_report_path)}" if self.memory_report_path else None,
+            "peak_memory_bytes": self.peak_memory_bytes,
+            "encoding": json.loads(self.encoding_profile) if self.encoding_profile else None,
+            "degradations": json.loads(self.degradations) if self.degradations else [],
+            "priority": self.priority,
+            "tenant_id": self.tenant_id,
+            "subtitle_mode": self.subtitle_mode,
+            "subtitle_urls": {
+                fmt: f"/media/{os.path.basename(path)}"
+                for fmt, path in (("srt", self.srt_path), ("vtt", self.vtt_path)) if path
+            },
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
             "error_message": self.error_message
         }
 
 
+# Columns of the compact status record: no script and no relationships, so a
+# batch is one query on the primary key
+STATUS_COLUMNS = [
+    VideoDB.id, VideoDB.status, VideoDB.progress, VideoDB.video_path, VideoDB.thumbnail_path,
+    VideoDB.preview_path, VideoDB.stream_path, VideoDB.updated_at, VideoDB.error_message
+]
+
+
+def status_to_dict(row) -> dict:
+    """Compact status record from a row of STATUS_COLUMNS"""
+    return {
+        "id": row.id,
+        "status": row.status.value if row.status else None,
+        "progress": row.progress,
+        "video_url": f"/media/{os.path.basename(row.video_path)}" if row.video_path else None,
+        "thumbnail_url": f"/media/{os.path.basename(row.thumbnail_path)}" if row.thumbnail_path else None,
+        "preview_url": f"/media/{os.path.basename(row.preview_path)}" if row.preview_path else None,
+        "stream_url": _hls_url(row.stream_path) if row.stream_path else None,
+        "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+        "error_message": row.error_message
+    }
+
+
+class VideoRenditionDB(Base):
+    """One encoded rendition (e.g. 720p) of a video"""
+    __tablename__ = "video_renditions"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    video_id = Column(String(36), ForeignKey("videos.id", ondelete="CASCADE"), nullable=False, index=True)
+    name = Column(String(20), nullable=False)
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    path = Column(String(500), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    video = relationship("VideoDB", back_populates="renditions")
+
+
+class VideoSpanDB(Base):
+    """One traced span (stage, provider call, FFmpeg command) of a video job"""
+    __tablename__ = "video_spans"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    video_id = Column(String(36), ForeignKey("videos.id", ondelete="CASCADE"), nullable=False, index=True)
+    trace_id = Column(String(32), nullable=False)
+    span_id = Column(String(16), nullable=False)
+    parent_id = Column(String(16), nullable=True)
+    name = Column(String(100), nullable=False)
+    start_time = Column(Float, nullable=False)  # unix epoch seconds
+    end_time = Column(Float, nullable=True)
+    status = Column(String(20), default="ok")
+    attributes = Column(Text, nullable=True)  # JSON object
+    
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration_ms": round((self.end_time - self.start_time) * 1000, 3) if self.end_time else None,
+            "status": self.status,
+            "attributes": json.loads(self.attributes) if self.attributes else {}
+        }
+
+
+class VideoArtifactDB(Base):
+    """A file or directory a video job wrote to the media directory"""
+    __tablename__ = "video_artifacts"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    video_id = Column(String(36), ForeignKey("videos.id", ondelete="CASCADE"), nullable=False, index=True)
+    path = Column(String(500), nullable=False, unique=True)
+    kind = Column(String(20), nullable=False, index=True)  # see utils.artifacts.ARTIFACT_KINDS
+    size_bytes = Column(BigInteger, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+# Columns added to existing tables, oldest first. create_all only creates
+# missing tables, so init_db adds these (with their indexes) to databases
+# created by an earlier version.
+ADDED_COLUMNS = [
+    ("videos", "stream_path"),
+    ("videos", "render_profiles"),
+    ("videos", "preview_path"),
+    ("videos", "storyboard_path"),
+    ("videos", "profile_path"),
+    ("videos", "profile_report_path"),
+    ("videos", "memory_report_path"),
+    ("videos", "peak_memory_bytes"),
+    ("videos", "encoding_profile"),
+    ("videos", "priority"),
+    ("videos", "tenant_id"),
+    ("videos", "subtitle_mode"),
+    ("videos", "srt_path"),
+    ("videos", "vtt_path"),
+    ("videos", "idempotency_key"),
+    ("videos", "request_hash"),
+    ("videos", "degradations"),
+]
+# Values added to native enum types (PostgreSQL; SQLite stores them as strings)
+ADDED_ENUM_VALUES = [
+    ("videos", "status", VideoStatus.CANCELLED),
+]
+
+
+def _upgrade_schema():
+    """Add the columns of ADDED_COLUMNS that an existing database lacks"""
+    inspector = inspect(engine)
+    present = {}
+    with engine.begin() as conn:
+        for table_name, column_name in ADDED_COLUMNS:
+            columns = present.setdefault(table_name, {c["name"] for c in inspector.get_columns(table_name)})
+            if column_name in columns:
+                continue
+            table = Base.metadata.tables[table_name]
+            column = table.c[column_name]
+            conn.execute(text(
+                f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column.type.compile(dialect=engine.dialect)}"
+            ))
+            columns.add(column_name)
+            for index in table.indexes:
+                if column_name in index.columns:
+                    index.create(conn, checkfirst=True)
+            # SQLite cannot add constraints to a table; a unique index enforces the same
+            for constraint in table.constraints:
+                if (isinstance(constraint, UniqueConstraint) and column_name in constraint.columns
+                        and all(c.name in columns for c in constraint.columns)):
+                    conn.execute(text(
+                        f"CREATE UNIQUE INDEX {constraint.name} ON {table_name} "
+                        f"({', '.join(c.name for c in constraint.columns)})"
+                    ))
+            logger.info(f"Added column {table_name}.{column_name}")
+    
+    if engine.dialect.name == "postgresql":
+        # ALTER TYPE ... ADD VALUE cannot run in a transaction block before PostgreSQL 12
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for table_name, column_name, value in ADDED_ENUM_VALUES:
+                enum_type = Base.metadata.tables[table_name].c[column_name].type
+                conn.execute(text(f"ALTER TYPE {enum_type.name} ADD VALUE IF NOT EXISTS '{value.name}'"))
+
+
 def init_db():
-    """Initialize database tables"""
+    """Initialize database tables and upgrade existing ones"""
     Base.metadata.create_all(bind=engine)
+    _upgrade_schema()
 
 
 def get_db():
@@ -2,17 +2,24 @@
 Faceless Video SaaS - Main FastAPI Application
 """
 import os
+import json
+import time
 import uuid
+import shutil
 import asyncio
-from datetime import datetime
+import hashlib
+from datetime import datetime, timedelta
 from contextlib import asynccontextmanager
-from typing import Optional
+from typing import Optional, List
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, UploadFile, File
+from fastapi import FastAPI, HTTPException, Depends, Header, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
-from sqlalchemy.orm import Session
+from fastapi.responses import FileResponse, JSONResponse, Response
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, selectinload
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 # Import models and database
 from models import (
@@ -21,24 +28,58 @@ from models import (
     VideoListResponse,
     HealthResponse,
     ErrorResponse,
-    VideoStatus
+    VideoStatus,
+    SubtitleMode,
+    SpanResponse,
+    TimelineResponse,
+    VideoStatusBatchResponse
 )
-from database import init_db, get_db, VideoDB
+from database import init_db, get_db, VideoDB, VideoRenditionDB, VideoSpanDB, STATUS_COLUMNS, status_to_dict
 
-# Import services
-from services.script_service import script_service
-from services.tts_service import tts_service
-from services.stock_service import stock_service
-from services.video_service import video_service
+# Import services (built lazily by the registry)
+from services.registry import registry
+from services.script_service import SCRIPT_STREAMING
+from services.video_service import RENDER_PROFILES, DEFAULT_RENDER_PROFILES, THUMBNAIL_MODE, STORYBOARD_ENABLED
 from utils.subtitle_generator import subtitle_generator
+from utils.metrics import (
+    track_stage,
+    PIPELINE_JOB_SECONDS,
+    JOBS_BY_STATUS,
+    FALLBACK_VIDEO_TOTAL,
+    ENCODING_TIER_TOTAL
+)
+from utils.tracing import tracer, to_otlp
+from utils.profiling import job_profiler, PROFILE_JOBS
+from utils.loop_monitor import loop_monitor, LOOP_MONITOR_ENABLED
+from utils.encoding_policy import encoding_policy
+from utils.admission import admission, QueueFullError, DEFAULT_TENANT
+from utils.artifacts import artifact_store
+from utils.deadline import deadlines
+from utils.stage_graph import StageGraph
 
 import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-MEDIA_DIR = "/app/media"
+MEDIA_DIR = os.getenv("MEDIA_DIR", "/app/media")
 os.makedirs(MEDIA_DIR, exist_ok=True)
 
+# Jobs that have not finished yet, i.e. still need a render
+ACTIVE_STATUSES = [
+    VideoStatus.PENDING,
+    VideoStatus.GENERATING_SCRIPT,
+    VideoStatus.GENERATING_VOICE,
+    VideoStatus.FETCHING_CLIPS,
+    VideoStatus.RENDERING
+]
+
+# How long an Idempotency-Key replays the job it created
+IDEMPOTENCY_KEY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24"))
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+# Most jobs one batched status request may ask for
+MAX_STATUS_BATCH = int(os.getenv("MAX_STATUS_BATCH", "100"))
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -47,9 +88,17 @@ async def lifespan(app: FastAPI):
     logger.info("Starting up Faceless Video API...")
     init_db()
     logger.info("Database initialized")
+    await registry.startup()
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    artifact_store.start()
     yield
     # Shutdown
     logger.info("Shutting down...")
+    await admission.shutdown()
+    await artifact_store.stop()
+    await loop_monitor.stop()
+    await registry.shutdown()
 
 
 # Create FastAPI app
@@ -67,8 +116,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Read by the dashboard to poll GET /api/videos/status conditionally
+    expose_headers=["ETag"],
 )
-from fastapi.responses import Response
 
 @app.options("/{full_path:path}")
 async def preflight_handler(full_path: str):
@@ -91,6 +141,20 @@ async def health_check():
     )
 
 
+# ============================================================================
+# Metrics
+# ============================================================================
+
+@app.get("/metrics")
+async def metrics(db: Session = Depends(get_db)):
+    """Prometheus metrics endpoint"""
+    counts = dict(db.query(VideoDB.status, func.count(VideoDB.id)).group_by(VideoDB.status).all())
+    for status in VideoStatus:
+        JOBS_BY_STATUS.labels(status=status.value).set(counts.get(status, 0))
+    
+    return Response(content=generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+
 # ============================================================================
 # Video Generation Endpoints
 # ============================================================================
@@ -98,7 +162,9 @@ async def health_check():
 @app.post("/api/videos", response_model=VideoResponse)
 async def create_video(
     request: VideoCreateRequest,
-    background_tasks: BackgroundTasks,
+    response: Response,
+    x_tenant_id: Optional[str] = Header(default=None),
+    idempotency_key: Optional[str] = Header(default=None),
     db: Session = Depends(get_db)
 ):
     """
@@ -109,67 +175,189 @@ async def create_video(
     2. Converts script to audio using gTTS
     3. Fetches stock videos from Pexels/Pixabay
     4. Renders final video with FFmpeg
+    
+    Jobs beyond MAX_INFLIGHT_JOBS wait in a bounded queue; when that is
+    full the request is rejected with 429 and a Retry-After header. Queued
+    jobs start by priority, then round-robin across tenants (X-Tenant-ID).
+    
+    Clients that retry should send an Idempotency-Key header: a repeat of
+    the same request with the same key (per tenant, within
+    IDEMPOTENCY_KEY_TTL_HOURS) returns the original job instead of starting
+    another one, marked with an Idempotent-Replayed: true header. Reusing a
+    key with a different request body is rejected with 422.
     """
+    tenant_id = (x_tenant_id or DEFAULT_TENANT).strip()[:100] or DEFAULT_TENANT
+    
+    request_hash = None
+    if idempotency_key is not None:
+        idempotency_key = idempotency_key.strip()
+        if not idempotency_key or len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Idempotency-Key must be 1-{MAX_IDEMPOTENCY_KEY_LENGTH} characters"
+            )
+        request_hash = hashlib.sha256(request.model_dump_json().encode()).hexdigest()
+        existing = _find_idempotent_job(db, tenant_id, idempotency_key, request_hash)
+        if existing:
+            response.headers["Idempotent-Replayed"] = "true"
+            return await get_video(existing.id, db)
+    
     try:
         # Generate unique ID
         video_id = str(uuid.uuid4())
+        render_profiles = list(dict.fromkeys(p.value for p in request.render_profiles))
         
         # Create database entry
         video_db = VideoDB(
             id=video_id,
             topic=request.topic,
             status=VideoStatus.PENDING,
-            progress=0
+            progress=0,
+            render_profiles=','.join(render_profiles),
+            priority=request.priority.value,
+            tenant_id=tenant_id,
+            subtitle_mode=request.subtitle_mode.value,
+            idempotency_key=idempotency_key,
+            request_hash=request_hash
         )
         db.add(video_db)
-        db.commit()
+        try:
+            db.commit()
+        except IntegrityError:
+            # A concurrent retry with the same key created the job first
+            db.rollback()
+            existing = _find_idempotent_job(db, tenant_id, idempotency_key, request_hash)
+            if not existing:
+                raise
+            response.headers["Idempotent-Replayed"] = "true"
+            return await get_video(existing.id, db)
         
         logger.info(f"Created video job: {video_id}")
         
-        # Start background processing
-        background_tasks.add_task(
-            process_video,
-            video_id=video_id,
-            topic=request.topic,
-            duration=request.duration
-        )
+        # Start processing now, or queue it until a slot frees up
+        try:
+            admission.submit(video_id, lambda: process_video(
+                video_id=video_id,
+                topic=request.topic,
+                duration=request.duration,
+                render_profiles=render_profiles,
+                profile=request.profile,
+                subtitle_mode=request.subtitle_mode.value
+            ), priority=request.priority.value, tenant=tenant_id)
+        except QueueFullError as e:
+            # Never started: drop the job, so a retry with the same Idempotency-Key is admitted afresh
+            db.delete(video_db)
+            db.commit()
+            raise HTTPException(
+                status_code=429,
+                detail="Too many videos in progress, try again later",
+                headers={"Retry-After": str(e.retry_after)}
+            )
         
         return VideoResponse(
             id=video_id,
             topic=request.topic,
             status=VideoStatus.PENDING,
             progress=0,
+            priority=request.priority,
+            tenant_id=tenant_id,
+            subtitle_mode=request.subtitle_mode,
+            queue_position=admission.queue_position(video_id),
+            estimated_start=admission.estimated_start(video_id),
             created_at=datetime.utcnow()
         )
-        
+    
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error creating video: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/api/videos/{video_id}", response_model=VideoResponse)
-async def get_video(video_id: str, db: Session = Depends(get_db)):
-    """Get video status and details"""
-    video = db.query(VideoDB).filter(VideoDB.id == video_id).first()
+# Declared before /api/videos/{video_id} so "status" is not taken for an ID
+@app.get("/api/videos/status", response_model=VideoStatusBatchResponse)
+async def get_video_statuses(
+    ids: str,
+    if_none_match: Optional[str] = Header(default=None),
+    db: Session = Depends(get_db)
+):
+    """
+    Status, progress and media URLs of many jobs in one request
     
-    if not video:
-        raise HTTPException(status_code=404, detail="Video not found")
+    ids is a comma-separated list of up to MAX_STATUS_BATCH job IDs. The
+    records are read in one primary-key query without the script. The
+    response carries an ETag; send it back as If-None-Match and an
+    unchanged batch is answered with 304 and no body.
+    """
+    video_ids = list(dict.fromkeys(i.strip() for i in ids.split(',') if i.strip()))
+    if not video_ids:
+        raise HTTPException(status_code=400, detail="ids must list at least one video ID")
+    if len(video_ids) > MAX_STATUS_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_STATUS_BATCH} IDs per request")
     
+    rows = {row.id: row for row in db.query(*STATUS_COLUMNS).filter(VideoDB.id.in_(video_ids))}
+    videos = []
+    for video_id in video_ids:
+        if video_id in rows:
+            record = status_to_dict(rows[video_id])
+            record["queue_position"] = admission.queue_position(video_id)
+            videos.append(record)
+    content = {"videos": videos, "missing": [i for i in video_ids if i not in rows]}
+    
+    # Queue positions change without a DB write, so the tag covers the whole body
+    etag = 'W/"' + hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+        return Response(status_code=304, headers=headers)
+    
+    return JSONResponse(content=content, headers=headers)
+
+
+def _video_response(video: VideoDB) -> VideoResponse:
+    """API view of a job; to_dict runs once as it reads the renditions"""
+    data = video.to_dict()
     return VideoResponse(
         id=video.id,
         topic=video.topic,
         status=VideoStatus(video.status) if video.status else VideoStatus.PENDING,
         progress=video.progress,
         script=video.script,
-        audio_url=video.to_dict().get("audio_url"),
-        video_url=video.to_dict().get("video_url"),
-        thumbnail_url=video.to_dict().get("thumbnail_url"),
+        audio_url=data.get("audio_url"),
+        video_url=data.get("video_url"),
+        thumbnail_url=data.get("thumbnail_url"),
+        storyboard_url=data.get("storyboard_url"),
+        preview_url=data.get("preview_url"),
+        stream_url=data.get("stream_url"),
+        renditions=data.get("renditions", {}),
+        profile_url=data.get("profile_url"),
+        profile_report_url=data.get("profile_report_url"),
+        memory_report_url=data.get("memory_report_url"),
+        peak_memory_bytes=data.get("peak_memory_bytes"),
+        encoding=data.get("encoding"),
+        degradations=data.get("degradations", []),
+        priority=data.get("priority"),
+        tenant_id=data.get("tenant_id"),
+        subtitle_mode=data.get("subtitle_mode"),
+        subtitle_urls=data.get("subtitle_urls", {}),
+        queue_position=admission.queue_position(video.id),
+        estimated_start=admission.estimated_start(video.id),
         created_at=video.created_at,
         updated_at=video.updated_at,
         error_message=video.error_message
     )
 
 
+@app.get("/api/videos/{video_id}", response_model=VideoResponse)
+async def get_video(video_id: str, db: Session = Depends(get_db)):
+    """Get video status and details"""
+    video = db.query(VideoDB).filter(VideoDB.id == video_id).first()
+    
+    if not video:
+        raise HTTPException(status_code=404, detail="Video not found")
+    
+    return _video_response(video)
+
+
 @app.get("/api/videos", response_model=VideoListResponse)
 async def list_videos(
     skip: int = 0,
@@ -177,23 +365,18 @@ async def list_videos(
     db: Session = Depends(get_db)
 ):
     """List all videos with pagination"""
-    videos = db.query(VideoDB).order_by(VideoDB.created_at.desc()).offset(skip).limit(limit).all()
+    videos = (
+        db.query(VideoDB)
+        .options(selectinload(VideoDB.renditions))
+        .order_by(VideoDB.created_at.desc())
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
     total = db.query(VideoDB).count()
     
     return VideoListResponse(
-        videos=[VideoResponse(
-            id=v.id,
-            topic=v.topic,
-            status=VideoStatus(v.status) if v.status else VideoStatus.PENDING,
-            progress=v.progress,
-            script=v.script,
-            audio_url=v.to_dict().get("audio_url"),
-            video_url=v.to_dict().get("video_url"),
-            thumbnail_url=v.to_dict().get("thumbnail_url"),
-            created_at=v.created_at,
-            updated_at=v.updated_at,
-            error_message=v.error_message
-        ) for v in videos],
+        videos=[_video_response(v) for v in videos],
         total=total
     )
 
@@ -206,15 +389,27 @@ async def delete_video(video_id: str, db: Session = Depends(get_db)):
     if not video:
         raise HTTPException(status_code=404, detail="Video not found")
     
-    # Delete files
-    for path_attr in ['audio_path', 'video_path', 'thumbnail_path']:
-        path = getattr(video, path_attr, None)
+    # Drop the job if it is still queued, or stop its pipeline if it is running
+    await admission.cancel(video_id)
+    registry.video_service.cancel_render(video_id)
+    db.refresh(video)
+    
+    # Delete files: everything in the artifact index, plus paths linked from the job
+    # (covers jobs created before the index existed)
+    await asyncio.to_thread(artifact_store.cleanup, video_id)
+    paths = [getattr(video, attr, None) for attr in ['audio_path', 'video_path', 'thumbnail_path', 'storyboard_path', 'preview_path',
+                                 'profile_path', 'profile_report_path', 'memory_report_path', 'srt_path', 'vtt_path']]
+    paths += [r.path for r in video.renditions]
+    for path in set(paths):
         if path and os.path.exists(path):
             try:
                 os.remove(path)
             except Exception as e:
                 logger.warning(f"Failed to delete file {path}: {e}")
     
+    if video.stream_path:
+        shutil.rmtree(os.path.dirname(video.stream_path), ignore_errors=True)
+    
     # Delete database entry
     db.delete(video)
     db.commit()
@@ -222,6 +417,69 @@ async def delete_video(video_id: str, db: Session = Depends(get_db)):
     return {"message": "Video deleted successfully"}
 
 
+@app.post("/api/videos/{video_id}/cancel", response_model=VideoResponse)
+async def cancel_video(video_id: str, db: Session = Depends(get_db)):
+    """
+    Cancel a queued or running video job
+    
+    A queued job is dropped. A running pipeline is stopped where it is:
+    pending provider requests are aborted and its FFmpeg processes are
+    killed, and its scratch files are removed before this returns, so the
+    render slot is free for the next job. Files already delivered (e.g. the
+    preview) are kept until the job is deleted.
+    """
+    video = db.query(VideoDB).filter(VideoDB.id == video_id).first()
+    
+    if not video:
+        raise HTTPException(status_code=404, detail="Video not found")
+    if video.status not in ACTIVE_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Video is already {video.status.value}")
+    
+    await admission.cancel(video_id)
+    registry.video_service.cancel_render(video_id)
+    
+    # The pipeline marks itself cancelled; a job that never started is marked here
+    db.refresh(video)
+    if video.status in ACTIVE_STATUSES:
+        video.status = VideoStatus.CANCELLED
+        db.commit()
+    logger.info(f"[{video_id}] Job cancelled")
+    
+    return await get_video(video_id, db)
+
+
+@app.get("/api/videos/{video_id}/timeline", response_model=TimelineResponse)
+async def get_video_timeline(
+    video_id: str,
+    format: str = "json",
+    db: Session = Depends(get_db)
+):
+    """
+    Get the span timeline of a video job
+    
+    Use format=otlp for an OpenTelemetry (OTLP/JSON) export of the same spans.
+    """
+    if not db.query(VideoDB.id).filter(VideoDB.id == video_id).first():
+        raise HTTPException(status_code=404, detail="Video not found")
+    
+    spans = [
+        s.to_dict() for s in
+        db.query(VideoSpanDB).filter(VideoSpanDB.video_id == video_id).order_by(VideoSpanDB.start_time).all()
+    ]
+    if not spans:
+        # Job still running: serve the live trace
+        spans = [s.to_dict() for s in tracer.active_spans(video_id)]
+    
+    if format == "otlp":
+        return JSONResponse(content=to_otlp(spans))
+    
+    return TimelineResponse(
+        video_id=video_id,
+        trace_id=spans[0]["trace_id"] if spans else None,
+        spans=[SpanResponse(**span) for span in spans]
+    )
+
+
 @app.get("/api/videos/{video_id}/download")
 async def download_video(video_id: str, db: Session = Depends(get_db)):
     """Download the final video file"""
@@ -247,22 +505,60 @@ async def download_video(video_id: str, db: Session = Depends(get_db)):
 # Background Video Processing
 # ============================================================================
 
-async def process_video(video_id: str, topic: str, duration: int = 60):
+async def process_video(
+    video_id: str,
+    topic: str,
+    duration: int = 60,
+    render_profiles: Optional[List[str]] = None,
+    profile: bool = False,
+    subtitle_mode: str = SubtitleMode.BURNED.value
+):
     """
     Background task to process video generation
     
-    Pipeline:
+    Pipeline (a stage graph: steps 2 and 3 run concurrently):
     1. Generate script (HuggingFace)
-    2. Generate audio (gTTS)
+    2. Generate audio (gTTS), then subtitles timed to it
     3. Fetch stock videos (Pexels/Pixabay)
-    4. Create subtitles
-    5. Render final video (FFmpeg)
-    6. Generate thumbnail
+    4. Render final video (FFmpeg), once 2 and 3 are done
+    5. Generate thumbnail
+    
+    The run is traced: every stage, provider call and FFmpeg command is
+    recorded as a span and persisted for GET /api/videos/{id}/timeline.
+    
+    With profile=True (or PROFILE_JOBS=true) the run is also profiled with
+    cProfile and tracemalloc, and the reports are linked from the job.
     """
+    trace = None
+    profile_result = None
+    try:
+        with job_profiler.profile(video_id, enabled=profile or PROFILE_JOBS) as profile_result:
+            with tracer.job(video_id) as trace:
+                with tracer.span("process_video", video_id=video_id, topic=topic, duration=duration):
+                    with deadlines.job(video_id):
+                        await _run_pipeline(video_id, topic, duration, render_profiles, subtitle_mode)
+    finally:
+        # Also when the job is cancelled, so the timeline shows where it stopped
+        if trace is not None:
+            await _save_trace(trace)
+        if profile_result:
+            await asyncio.to_thread(_save_profile, video_id, profile_result)
+
+
+async def _run_pipeline(
+    video_id: str,
+    topic: str,
+    duration: int,
+    render_profiles: Optional[List[str]],
+    subtitle_mode: str = SubtitleMode.BURNED.value
+):
+    """Run the pipeline steps of process_video and record the outcome on the job"""
     from database import SessionLocal
     
     db = SessionLocal()
     video = None
+    outcome = "failed"
+    job_start = time.perf_counter()
     
     try:
         video = db.query(VideoDB).filter(VideoDB.id == video_id).first()
@@ -270,107 +566,320 @@ async def process_video(video_id: str, topic: str, duration: int = 60):
             logger.error(f"Video {video_id} not found")
             return
         
-        # Step 1: Generate Script
-        logger.info(f"[{video_id}] Step 1: Generating script...")
-        video.status = VideoStatus.GENERATING_SCRIPT
-        video.progress = 10
-        db.commit()
+        primary = RENDER_PROFILES[(render_profiles or DEFAULT_RENDER_PROFILES)[0]]
         
-        script_result = await script_service.generate_script(topic, duration)
-        video.script = script_result["full_script"]
-        scenes = script_result["scenes"]
-        db.commit()
+        def report(status: Optional[VideoStatus], progress: int):
+            # Concurrent stages report in any order, so progress only moves forward
+            if status:
+                video.status = status
+            video.progress = max(video.progress or 0, progress)
+            db.commit()
         
-        logger.info(f"[{video_id}] Script generated: {script_result['word_count']} words")
+        # Scenes go to the clip fetcher as the script is written; None ends the script
+        scene_queue: asyncio.Queue = asyncio.Queue()
         
-        # Step 2: Generate Audio
-        logger.info(f"[{video_id}] Step 2: Generating audio...")
-        video.status = VideoStatus.GENERATING_VOICE
-        video.progress = 25
-        db.commit()
+        async def written_scenes():
+            while (scene := await scene_queue.get()) is not None:
+                yield scene
+        
+        async def generate_script(results):
+            logger.info(f"[{video_id}] Generating script...")
+            report(VideoStatus.GENERATING_SCRIPT, 10)
+            if SCRIPT_STREAMING:
+                script_result = await registry.script_service.stream_script(
+                    topic, duration, on_scene=scene_queue.put
+                )
+            else:
+                script_result = await registry.script_service.generate_script(topic, duration)
+                for scene in script_result["scenes"]:
+                    scene_queue.put_nowait(scene)
+            scene_queue.put_nowait(None)
+            video.script = script_result["full_script"]
+            db.commit()
+            logger.info(f"[{video_id}] Script generated: {script_result['word_count']} words")
+            return script_result
         
-        audio_path = await tts_service.generate_audio_for_scenes(scenes, video_id)
-        if audio_path:
+        async def generate_audio(results):
+            logger.info(f"[{video_id}] Generating audio...")
+            report(VideoStatus.GENERATING_VOICE, 25)
+            audio_path = await registry.tts_service.generate_audio_for_scenes(results["script"]["scenes"], video_id)
+            if not audio_path:
+                logger.error(f"[{video_id}] Failed to generate audio")
+                raise Exception("Audio generation failed")
             video.audio_path = audio_path
             db.commit()
+            if "clips" not in results:
+                # The rest of the wait is for stock clips
+                report(VideoStatus.FETCHING_CLIPS, 45)
             logger.info(f"[{video_id}] Audio generated")
-        else:
-            logger.error(f"[{video_id}] Failed to generate audio")
-            raise Exception("Audio generation failed")
-        
-        # Step 3: Fetch Stock Videos
-        logger.info(f"[{video_id}] Step 3: Fetching stock videos...")
-        video.status = VideoStatus.FETCHING_CLIPS
-        video.progress = 45
-        db.commit()
-        
-        video_clips = await stock_service.fetch_videos_for_scenes(scenes, video_id)
-        
-        if not video_clips:
-            logger.warning(f"[{video_id}] No stock videos found, using fallback")
-            fallback = await stock_service.get_fallback_video(video_id)
-            if fallback:
-                video_clips = [{"local_path": fallback, "duration": 10}]
+            return audio_path
         
-        logger.info(f"[{video_id}] Fetched {len(video_clips)} video clips")
+        async def fetch_clips(results):
+            logger.info(f"[{video_id}] Fetching stock videos...")
+            video_clips = await registry.stock_service.fetch_videos_for_scenes(
+                written_scenes(), video_id, target_size=(primary["width"], primary["height"])
+            )
+            
+            if not video_clips:
+                logger.warning(f"[{video_id}] No stock videos found, using fallback")
+                FALLBACK_VIDEO_TOTAL.inc()
+                fallback = await registry.video_service.get_fallback_video(video_id)
+                if fallback:
+                    video_clips = [{"local_path": fallback, "duration": 10}]
+            
+            report(None, 45)
+            logger.info(f"[{video_id}] Fetched {len(video_clips)} video clips")
+            return video_clips
         
-        # Step 4: Generate Subtitles
-        logger.info(f"[{video_id}] Step 4: Generating subtitles...")
-        video.progress = 60
-        db.commit()
+        async def generate_subtitles(results):
+            logger.info(f"[{video_id}] Generating subtitles...")
+            # Decodes the narration for alignment, so keep it off the event loop
+            subtitle_path = await asyncio.to_thread(
+                subtitle_generator.generate_srt, video.script, video_id, audio_path=results["tts"]
+            )
+            if subtitle_mode == SubtitleMode.SIDECAR.value:
+                sidecars = await asyncio.to_thread(subtitle_generator.write_sidecars, subtitle_path, video_id)
+                video.srt_path = sidecars.get("srt")
+                video.vtt_path = sidecars.get("vtt")
+            report(None, 60)
+            logger.info(f"[{video_id}] Subtitles generated")
+            return subtitle_path
         
-        subtitle_path = subtitle_generator.generate_srt(video.script, video_id)
-        logger.info(f"[{video_id}] Subtitles generated")
+        async def render(results):
+            logger.info(f"[{video_id}] Rendering video...")
+            video.status = VideoStatus.RENDERING
+            video.progress = 75
+            
+            # Trade encode quality for throughput when the queue is long
+            queue_depth = db.query(func.count(VideoDB.id)).filter(VideoDB.status.in_(ACTIVE_STATUSES)).scalar()
+            # ...and for speed when this job is running out of time
+            encoding = encoding_policy.choose(
+                queue_depth,
+                render_profiles or DEFAULT_RENDER_PROFILES,
+                RENDER_PROFILES,
+                budget_seconds=deadlines.stage_budget("render")
+            )
+            if encoding["deadline_limited"]:
+                deadlines.degrade("render", f"encoding tier {encoding['tier']}")
+            video.encoding_profile = json.dumps(encoding)
+            ENCODING_TIER_TOTAL.labels(tier=encoding["tier"]).inc()
+            tracer.set_attribute("encoding_tier", encoding["tier"])
+            db.commit()
+            logger.info(f"[{video_id}] Encoding tier {encoding['tier']} (queue depth {queue_depth})")
+            
+            async def publish_preview(preview_path: str):
+                try:
+                    video.preview_path = preview_path
+                    video.progress = 80
+                    db.commit()
+                    logger.info(f"[{video_id}] Preview ready")
+                except Exception as e:
+                    db.rollback()
+                    logger.warning(f"[{video_id}] Failed to publish preview: {e}")
+            
+            render_result = await registry.video_service.create_final_video(
+                video_id=video_id,
+                video_clips=results["clips"],
+                audio_path=results["tts"],
+                subtitle_path=results["subtitles"],
+                target_duration=duration,
+                render_profiles=encoding["render_profiles"],
+                on_preview=publish_preview,
+                subtitle_mode=subtitle_mode,
+                encoding=encoding
+            )
+            
+            if not render_result:
+                if _job_deleted(db, video_id):
+                    # Cancelled by deleting the job; nothing left to record
+                    return None
+                raise Exception("Video rendering failed")
+            
+            video.video_path = render_result["video_path"]
+            video.stream_path = render_result.get("stream_path")
+            for name, path in render_result.get("renditions", {}).items():
+                video.renditions.append(VideoRenditionDB(
+                    name=name,
+                    width=RENDER_PROFILES[name]["width"],
+                    height=RENDER_PROFILES[name]["height"],
+                    path=path
+                ))
+            logger.info(f"[{video_id}] Video rendered successfully")
+            return render_result
         
-        # Step 5: Render Video
-        logger.info(f"[{video_id}] Step 5: Rendering video...")
-        video.status = VideoStatus.RENDERING
-        video.progress = 75
-        db.commit()
+        async def generate_thumbnail(results):
+            if not results["render"]:
+                return None
+            logger.info(f"[{video_id}] Generating thumbnail...")
+            report(None, 90)
+            final_video_path = results["render"]["video_path"]
+            if deadlines.job_exhausted() and (THUMBNAIL_MODE != "fixed" or STORYBOARD_ENABLED):
+                deadlines.degrade("thumbnail", "fixed frame, no storyboard")
+                thumbnails = await registry.video_service.generate_thumbnail(
+                    final_video_path, video_id, mode="fixed", storyboard=False
+                )
+            else:
+                thumbnails = await registry.video_service.generate_thumbnail(final_video_path, video_id)
+            if thumbnails["thumbnail_path"]:
+                video.thumbnail_path = thumbnails["thumbnail_path"]
+            if thumbnails["storyboard_path"]:
+                video.storyboard_path = thumbnails["storyboard_path"]
+            return thumbnails
         
-        final_video_path = await video_service.create_final_video(
-            video_id=video_id,
-            video_clips=video_clips,
-            audio_path=audio_path,
-            subtitle_path=subtitle_path,
-            target_duration=duration
-        )
+        # Stock clips are fetched scene by scene while the script is written;
+        # narration needs the whole script and captions are timed to it; the
+        # render needs clips, narration and captions
+        graph = StageGraph(video_id)
+        graph.add("script", generate_script)
+        graph.add("tts", generate_audio, after=["script"])
+        graph.add("clips", fetch_clips)
+        graph.add("subtitles", generate_subtitles, after=["tts"])
+        graph.add("render", render, after=["clips", "subtitles"])
+        graph.add("thumbnail", generate_thumbnail, after=["render"])
         
-        if final_video_path:
-            video.video_path = final_video_path
-            logger.info(f"[{video_id}] Video rendered successfully")
-        else:
-            raise Exception("Video rendering failed")
-        
-        # Step 6: Generate Thumbnail
-        logger.info(f"[{video_id}] Step 6: Generating thumbnail...")
-        video.progress = 90
-        db.commit()
+        try:
+            results = await graph.run()
+        finally:
+            tracer.set_attribute("stage_timings", graph.timings)
         
-        thumbnail_path = await video_service.generate_thumbnail(final_video_path, video_id)
-        if thumbnail_path:
-            video.thumbnail_path = thumbnail_path
+        if not results["render"]:
+            logger.info(f"[{video_id}] Render cancelled, stopping pipeline")
+            outcome = "cancelled"
+            return
         
         # Complete
         video.status = VideoStatus.COMPLETED
         video.progress = 100
+        video.degradations = json.dumps(deadlines.degradations()) if deadlines.degradations() else None
         db.commit()
         
+        outcome = "completed"
         logger.info(f"[{video_id}] Video processing completed!")
-        
-        # Cleanup temp files
-        await video_service.cleanup_temp_files(video_id)
-        
+    
+    except asyncio.CancelledError:
+        # Cancelled (or shutting down): stop here, but record it if the job still exists
+        outcome = "cancelled"
+        logger.info(f"[{video_id}] Pipeline cancelled")
+        db.rollback()
+        if video and not _job_deleted(db, video_id):
+            video.status = VideoStatus.CANCELLED
+            db.commit()
+        raise
     except Exception as e:
         logger.error(f"[{video_id}] Error processing video: {str(e)}")
         if video:
             video.status = VideoStatus.FAILED
             video.error_message = str(e)
+            video.degradations = json.dumps(deadlines.degradations()) if deadlines.degradations() else None
+            db.commit()
+    finally:
+        # Cleanup temp files, whatever the outcome
+        if video:
+            with track_stage("cleanup"):
+                await registry.video_service.cleanup_temp_files(video_id)
+        PIPELINE_JOB_SECONDS.labels(outcome=outcome).observe(time.perf_counter() - job_start)
+        tracer.set_attribute("outcome", outcome)
+        db.close()
+
+
+async def _save_trace(trace):
+    """Persist a finished job trace and push it to the OTLP collector if configured"""
+    from database import SessionLocal
+    
+    db = SessionLocal()
+    try:
+        if not _job_deleted(db, trace.video_id):
+            for span in trace.spans:
+                db.add(VideoSpanDB(
+                    video_id=trace.video_id,
+                    trace_id=span.trace_id,
+                    span_id=span.span_id,
+                    parent_id=span.parent_id,
+                    name=span.name,
+                    start_time=span.start_time,
+                    end_time=span.end_time,
+                    status=span.status,
+                    attributes=json.dumps(span.attributes, default=str)
+                ))
             db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"[{trace.video_id}] Failed to save trace: {e}")
+    finally:
+        db.close()
+    
+    await tracer.export(trace)
+
+
+def _save_profile(video_id: str, profile_result: dict):
+    """Link the profile and memory reports from the job record"""
+    from database import SessionLocal
+    
+    db = SessionLocal()
+    try:
+        video = db.query(VideoDB).filter(VideoDB.id == video_id).first()
+        if not video:
+            # Job was deleted while running; don't leave orphaned reports behind
+            for key in ("profile_path", "profile_report_path", "memory_report_path"):
+                if os.path.exists(profile_result[key]):
+                    os.remove(profile_result[key])
+            return
+        
+        video.profile_path = profile_result["profile_path"]
+        video.profile_report_path = profile_result["profile_report_path"]
+        video.memory_report_path = profile_result["memory_report_path"]
+        video.peak_memory_bytes = profile_result["peak_memory_bytes"]
+        db.commit()
+        artifact_store.record_many(
+            video_id, [(profile_result[key], "report") for key in ("profile_path", "profile_report_path", "memory_report_path")]
+        )
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"[{video_id}] Failed to save profile: {e}")
     finally:
         db.close()
 
 
+def _find_idempotent_job(
+    db: Session,
+    tenant_id: str,
+    idempotency_key: str,
+    request_hash: str
+) -> Optional[VideoDB]:
+    """
+    The job a tenant created with this Idempotency-Key, if still retained
+    
+    A key past the retention window is released (cleared from its job) so
+    it can start a new one. Raises 422 if the key was used for a different
+    request.
+    """
+    video = db.query(VideoDB).filter(
+        VideoDB.tenant_id == tenant_id,
+        VideoDB.idempotency_key == idempotency_key
+    ).first()
+    if not video:
+        return None
+    
+    if video.created_at < datetime.utcnow() - timedelta(hours=IDEMPOTENCY_KEY_TTL_HOURS):
+        video.idempotency_key = None
+        db.commit()
+        return None
+    
+    if video.request_hash != request_hash:
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used with a different request"
+        )
+    
+    logger.info(f"Idempotency-Key replay for job {video.id}")
+    return video
+
+
+def _job_deleted(db: Session, video_id: str) -> bool:
+    """Whether the job row was removed while the pipeline was running"""
+    return db.query(VideoDB.id).filter(VideoDB.id == video_id).first() is None
+
+
 # ============================================================================
 # Error Handlers
 # ============================================================================
@@ -383,7 +892,8 @@ async def http_exception_handler(request, exc):
         content=ErrorResponse(
             error=exc.detail,
             code=f"HTTP_{exc.status_code}"
-        ).dict()
+        ).dict(),
+        headers=getattr(exc, "headers", None)
     )
 
 
@@ -2,7 +2,7 @@
 Pydantic models for request/response validation
 """
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from datetime import datetime
 from enum import Enum
 
@@ -15,19 +15,52 @@ class VideoStatus(str, Enum):
     RENDERING = "rendering"
     COMPLETED = "completed"
     FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class RenderProfile(str, Enum):
+    FHD = "1080p"
+    HD = "720p"
+    SD = "480p"
+
+
+class JobPriority(str, Enum):
+    INTERACTIVE = "interactive"
+    BULK = "bulk"
+
+
+class SubtitleMode(str, Enum):
+    BURNED = "burned"
+    EMBEDDED = "embedded"
+    SIDECAR = "sidecar"
 
 
 class VideoCreateRequest(BaseModel):
     topic: str = Field(..., min_length=3, max_length=200, description="Video topic")
     duration: int = Field(default=60, ge=30, le=180, description="Video duration in seconds")
     style: Optional[str] = Field(default="engaging", description="Video style")
+    render_profiles: List[RenderProfile] = Field(
+        default=[RenderProfile.FHD],
+        min_length=1,
+        description="Renditions to encode in one pass; the first one is the primary download"
+    )
+    profile: bool = Field(default=False, description="Profile this job (cProfile + tracemalloc)")
+    priority: JobPriority = Field(
+        default=JobPriority.INTERACTIVE,
+        description="Scheduling class; interactive jobs start before queued bulk jobs"
+    )
+    subtitle_mode: SubtitleMode = Field(
+        default=SubtitleMode.BURNED,
+        description="burned into the picture, embedded as a mov_text track, or sidecar SRT/VTT files"
+    )
     
     class Config:
         json_schema_extra = {
             "example": {
                 "topic": "10 Amazing Facts About Space",
                 "duration": 60,
-                "style": "engaging"
+                "style": "engaging",
+                "render_profiles": ["1080p", "720p", "480p"]
             }
         }
 
@@ -41,6 +74,22 @@ class VideoResponse(BaseModel):
     audio_url: Optional[str] = None
     video_url: Optional[str] = None
     thumbnail_url: Optional[str] = None
+    storyboard_url: Optional[str] = None
+    preview_url: Optional[str] = None
+    stream_url: Optional[str] = None
+    renditions: Dict[str, str] = Field(default_factory=dict)
+    profile_url: Optional[str] = None
+    profile_report_url: Optional[str] = None
+    memory_report_url: Optional[str] = None
+    peak_memory_bytes: Optional[int] = None
+    encoding: Optional[Dict[str, Any]] = None
+    degradations: List[str] = Field(default_factory=list, description="Cheaper results settled for to meet the job deadline")
+    priority: Optional[JobPriority] = None
+    tenant_id: Optional[str] = None
+    subtitle_mode: Optional[SubtitleMode] = None
+    subtitle_urls: Dict[str, str] = Field(default_factory=dict, description="Sidecar subtitle files by format")
+    queue_position: Optional[int] = Field(default=None, description="Position in the job queue (0 = running)")
+    estimated_start: Optional[datetime] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
     error_message: Optional[str] = None
@@ -54,6 +103,43 @@ class VideoListResponse(BaseModel):
     total: int
 
 
+class SpanResponse(BaseModel):
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    name: str
+    start_time: float
+    end_time: Optional[float] = None
+    duration_ms: Optional[float] = None
+    status: str = "ok"
+    attributes: Dict[str, Any] = Field(default_factory=dict)
+
+
+class VideoStatusRecord(BaseModel):
+    """Compact job status for polling many jobs at once (no script)"""
+    id: str
+    status: VideoStatus
+    progress: int = Field(default=0, ge=0, le=100)
+    video_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    preview_url: Optional[str] = None
+    stream_url: Optional[str] = None
+    queue_position: Optional[int] = None
+    updated_at: Optional[datetime] = None
+    error_message: Optional[str] = None
+
+
+class VideoStatusBatchResponse(BaseModel):
+    videos: List[VideoStatusRecord]
+    missing: List[str] = Field(default_factory=list, description="Requested IDs with no job")
+
+
+class TimelineResponse(BaseModel):
+    video_id: str
+    trace_id: Optional[str] = None
+    spans: List[SpanResponse]
+
+
 class HealthResponse(BaseModel):
     status: str
     version: str
@@ -0,0 +1,96 @@
+"""
+Lazy service registry
+
+Services are built on first use (or all at once in the app lifespan) instead
+of at import time, so importing main stays cheap. All of them share one
+pooled httpx.AsyncClient, which is closed on shutdown.
+
+Usage:
+    from services.registry import registry
+    script = await registry.script_service.generate_script(topic)
+"""
+import os
+import importlib
+import logging
+from typing import Any, Callable, Dict
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Shared HTTP client pool; per-request timeouts are set by the services
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_TIMEOUT = 30.0
+
+
+class ServiceRegistry:
+    """Build service singletons on demand and own the shared HTTP client"""
+    
+    def __init__(self):
+        self._factories: Dict[str, Callable[["ServiceRegistry"], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._http_client = None
+    
+    def register(self, name: str, factory: Callable[["ServiceRegistry"], Any]):
+        """Register a factory; it receives the registry and runs on first use"""
+        self._factories[name] = factory
+    
+    def get(self, name: str) -> Any:
+        """Return the service, building it on first use"""
+        if name not in self._instances:
+            if name not in self._factories:
+                raise KeyError(f"Unknown service: {name}")
+            self._instances[name] = self._factories[name](self)
+        return self._instances[name]
+    
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith('_') or name not in self._factories:
+            raise AttributeError(name)
+        return self.get(name)
+    
+    @property
+    def http_client(self):
+        """The pooled httpx.AsyncClient shared by every service"""
+        if self._http_client is None or self._http_client.is_closed:
+            import httpx
+            
+            self._http_client = httpx.AsyncClient(
+                timeout=HTTP_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE
+                )
+            )
+        return self._http_client
+    
+    async def startup(self):
+        """Build every registered service and run its async startup hook, if any"""
+        for name in self._factories:
+            service = self.get(name)
+            startup = getattr(service, "startup", None)
+            if startup is not None:
+                await startup()
+        logger.info(f"Services ready: {', '.join(self._instances)}")
+    
+    async def shutdown(self):
+        """Close the shared HTTP client and drop the built services"""
+        if self._http_client is not None and not self._http_client.is_closed:
+            await self._http_client.aclose()
+        self._http_client = None
+        self._instances.clear()
+
+
+def _lazy(module_name: str, class_name: str, uses_http: bool = False):
+    """Factory that imports the service module only when the service is built"""
+    def factory(registry: ServiceRegistry):
+        service_class = getattr(importlib.import_module(module_name), class_name)
+        return service_class(registry.http_client) if uses_http else service_class()
+    return factory
+
+
+# Singleton instance
+registry = ServiceRegistry()
+registry.register("script_service", _lazy("services.script_service", "ScriptService", uses_http=True))
+registry.register("tts_service", _lazy("services.tts_service", "TTSService"))
+registry.register("stock_service", _lazy("services.stock_service", "StockService", uses_http=True))
+registry.register("video_service", _lazy("services.video_service", "VideoService"))
@@ -2,28 +2,48 @@
 Script generation service using HuggingFace Inference API (Free Tier)
 """
 import os
+import re
+import json
 import httpx
 import asyncio
-from typing import Optional, List
+from typing import Awaitable, Callable, Optional, List
 import logging
 
+from utils.metrics import track_provider_call, FALLBACK_SCRIPT_TOTAL
+from utils.tracing import tracer
+from utils.deadline import deadlines
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # HuggingFace Inference API (Free tier - rate limited)
-HF_API_URL = "https://api-inference.huggingface.co/models/mistralai/Mistral-7B-Instruct-v0.2"
+HF_API_URL = os.getenv(
+    "HF_API_URL",
+    "https://api-inference.huggingface.co/models/mistralai/Mistral-7B-Instruct-v0.2"
+)
 HF_TOKEN = os.getenv("HUGGINGFACE_TOKEN", "")
 
 # Fallback to a smaller model if rate limited
 FALLBACK_MODEL = "https://api-inference.huggingface.co/models/google/flan-t5-large"
 
+# Stream tokens and hand out scenes as they are written (stream_script)
+SCRIPT_STREAMING = os.getenv("SCRIPT_STREAMING", "true").lower() == "true"
+
+GENERATION_PARAMETERS = {
+    "max_new_tokens": 500,
+    "temperature": 0.8,
+    "top_p": 0.95,
+    "return_full_text": False
+}
+
 
 class ScriptService:
     """Service for generating video scripts using free AI models"""
     
-    def __init__(self):
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
         self.headers = {"Authorization": f"Bearer {HF_TOKEN}"} if HF_TOKEN else {}
-        self.client = httpx.AsyncClient(timeout=60.0)
+        # Shared pooled client from the service registry
+        self.client = client or httpx.AsyncClient()
     
     async def generate_script(
         self, 
@@ -42,47 +62,28 @@ class ScriptService:
         Returns:
             dict with full_script and scenes
         """
-        # Calculate word count (approx 130-150 words per minute for narration)
-        target_words = int((duration / 60) * 140)
-        
-        prompt = f"""<s>[INST] Write an engaging, viral short-form video script about "{topic}".
-
-Requirements:
-- Target length: {target_words} words (about {duration} seconds when spoken)
-- Style: Attention-grabbing, conversational, perfect for TikTok/YouTube Shorts
-- Structure: Hook in first 3 seconds, 3-5 key points, strong call-to-action at end
-- Format: Return ONLY the script text, no stage directions or formatting
-
-Make it exciting and shareable! [/INST]</s>"""
+        prompt = self._build_prompt(topic, duration)
         
         for attempt in range(max_retries):
+            if attempt > 0 and deadlines.exhausted():
+                # Out of script budget: the template keeps the job on time
+                logger.warning("Script budget used up, not retrying")
+                deadlines.degrade("script", "fallback script (deadline)")
+                break
             try:
                 logger.info(f"Generating script for topic: {topic} (attempt {attempt + 1})")
                 
-                response = await self.client.post(
-                    HF_API_URL,
-                    headers=self.headers,
-                    json={
-                        "inputs": prompt,
-                        "parameters": {
-                            "max_new_tokens": 500,
-                            "temperature": 0.8,
-                            "top_p": 0.95,
-                            "return_full_text": False
-                        }
-                    }
-                )
+                with track_provider_call("huggingface", attempt=attempt + 1) as call:
+                    response = await self.client.post(
+                        HF_API_URL,
+                        headers=self.headers,
+                        timeout=deadlines.timeout(60.0),
+                        json={"inputs": prompt, "parameters": GENERATION_PARAMETERS}
+                    )
+                    call["status_code"] = response.status_code
                 
                 if response.status_code == 200:
-                    result = response.json()
-                    
-                    # Extract generated text
-                    if isinstance(result, list) and len(result) > 0:
-                        generated_text = result[0].get("generated_text", "")
-                    elif isinstance(result, dict):
-                        generated_text = result.get("generated_text", "")
-                    else:
-                        generated_text = str(result)
+                    generated_text = self._extract_text(response.json())
                     
                     # Clean up the script
                     script = self._clean_script(generated_text)
@@ -131,7 +132,130 @@ Make it exciting and shareable! [/INST]</s>"""
         
         # If all retries failed, use fallback template
         logger.warning("Using fallback script template")
-        return self._fallback_script(topic, duration)
+        if not deadlines.exhausted():
+            deadlines.degrade("script", "fallback script (generation failed)")
+        FALLBACK_SCRIPT_TOTAL.inc()
+        with tracer.span("script.fallback", attempts=max_retries):
+            return self._fallback_script(topic, duration)
+    
+    async def stream_script(
+        self,
+        topic: str,
+        duration: int = 60,
+        on_scene: Optional[Callable[[dict], Awaitable[None]]] = None
+    ) -> dict:
+        """
+        Generate a script from the model's token stream
+        
+        A scene is complete once its sentences are followed by more text, so
+        on_scene is called with each scene while the later ones are still
+        being generated. If the stream fails before the first scene, this
+        falls back to generate_script (retries, then the template); if it
+        breaks off later, the scenes already handed out are the script.
+        
+        Args:
+            topic: Video topic
+            duration: Target duration in seconds
+            on_scene: Awaited with each scene dict, in order, exactly once
+            
+        Returns:
+            dict with full_script and scenes, as generate_script
+        """
+        emitted: List[dict] = []
+        
+        async def emit(scenes: List[dict]):
+            for scene in scenes[len(emitted):]:
+                emitted.append(scene)
+                if on_scene:
+                    await on_scene(scene)
+        
+        generated_text = ""
+        finished = False
+        try:
+            logger.info(f"Streaming script for topic: {topic}")
+            with track_provider_call("huggingface", attempt=1) as call:
+                async with self.client.stream(
+                    "POST",
+                    HF_API_URL,
+                    headers=self.headers,
+                    timeout=deadlines.timeout(60.0),
+                    json={"inputs": self._build_prompt(topic, duration), "parameters": GENERATION_PARAMETERS, "stream": True}
+                ) as response:
+                    call["status_code"] = response.status_code
+                    if response.status_code != 200:
+                        await response.aread()
+                        raise Exception(f"API error: {response.status_code} - {response.text}")
+                    
+                    if not response.headers.get("content-type", "").startswith("text/event-stream"):
+                        # The endpoint ignored "stream" and answered in one piece
+                        generated_text = self._extract_text(json.loads(await response.aread()))
+                    else:
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            event = json.loads(line[len("data:"):])
+                            if event.get("error"):
+                                raise Exception(f"Stream error: {event['error']}")
+                            token = event.get("token") or {}
+                            if token.get("special"):
+                                continue
+                            generated_text += token.get("text", "")
+                            await emit(self._complete_scenes(generated_text))
+                    finished = True
+        except Exception as e:
+            logger.error(f"Error streaming script: {str(e)}")
+        
+        if finished:
+            script = self._clean_script(generated_text)
+            await emit(self._split_into_scenes(script))
+        elif emitted:
+            # Broke off mid-script: the scenes already being fetched are the script
+            deadlines.degrade("script", f"partial script ({len(emitted)} scenes, stream interrupted)")
+            script = ' '.join(scene["text"] for scene in emitted)
+        else:
+            result = await self.generate_script(topic, duration)
+            await emit(result["scenes"])
+            return result
+        
+        logger.info(f"Successfully streamed script with {len(emitted)} scenes")
+        return {
+            "full_script": script,
+            "scenes": emitted,
+            "word_count": len(script.split()),
+            "estimated_duration": len(script.split()) / 2.3
+        }
+    
+    def _complete_scenes(self, generated_text: str, sentences_per_scene: int = 2) -> List[dict]:
+        """Scenes of a partial script whose sentences can no longer change"""
+        sentences = [s for s in re.split(r'(?<=[.!?])\s+', self._clean_script(generated_text)) if s.strip()]
+        # The last sentence may still be growing
+        complete = len(sentences) - 1
+        return self._split_into_scenes(
+            ' '.join(sentences[:complete - complete % sentences_per_scene]), sentences_per_scene
+        )
+    
+    def _build_prompt(self, topic: str, duration: int) -> str:
+        """Instruction prompt for a script of about `duration` seconds"""
+        # Calculate word count (approx 130-150 words per minute for narration)
+        target_words = int((duration / 60) * 140)
+        
+        return f"""<s>[INST] Write an engaging, viral short-form video script about "{topic}".
+
+Requirements:
+- Target length: {target_words} words (about {duration} seconds when spoken)
+- Style: Attention-grabbing, conversational, perfect for TikTok/YouTube Shorts
+- Structure: Hook in first 3 seconds, 3-5 key points, strong call-to-action at end
+- Format: Return ONLY the script text, no stage directions or formatting
+
+Make it exciting and shareable! [/INST]</s>"""
+    
+    def _extract_text(self, result) -> str:
+        """Generated text from an Inference API response body"""
+        if isinstance(result, list) and len(result) > 0:
+            return result[0].get("generated_text", "")
+        elif isinstance(result, dict):
+            return result.get("generated_text", "")
+        return str(result)
     
     def _clean_script(self, text: str) -> str:
         """Clean up generated script"""
@@ -244,7 +368,3 @@ If you found this interesting, make sure to follow for more amazing content like
             "estimated_duration": len(script.split()) / 2.3,
             "fallback": True
         }
-
-
-# Singleton instance
-script_service = ScriptService()
@@ -0,0 +1,285 @@
+"""
+Local stock footage library
+
+Clips under STOCK_LIBRARY_DIR (footage we license or have downloaded before)
+are indexed into an SQLite FTS5 table: duration, resolution and codec come
+from ffprobe, tags from a sidecar file next to each clip. StockService
+searches it before calling Pexels/Pixabay, so matched scenes cost no API
+requests and no downloads. The render stream-copies clips into the mux, so
+only H.264/yuv420p clips are returned; others stay indexed but unused until
+transcoded.
+
+Sidecar metadata, optional (the file name is always indexed too):
+    beach_sunset.mp4.json  {"tags": ["beach", "sunset"], "description": "..."}
+    beach_sunset.mp4.txt   beach, sunset, ocean
+"""
+import os
+import re
+import json
+import sqlite3
+import logging
+import subprocess
+from typing import Dict, Iterable, List, Optional
+
+from utils.tracing import tracer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Directory of local clips; the library is disabled when unset
+STOCK_LIBRARY_DIR = os.getenv("STOCK_LIBRARY_DIR", "")
+# The index lives outside the library, which may be a read-only mount, and
+# outside the publicly served MEDIA_DIR (next to the default SQLite database)
+STOCK_LIBRARY_INDEX = os.getenv("STOCK_LIBRARY_INDEX", "./stock_library.sqlite")
+
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".m4v", ".webm", ".mkv"}
+SIDECAR_EXTENSIONS = [".json", ".txt"]
+PROBE_TIMEOUT = 30
+
+# What the mux can stream-copy next to the downloaded stock clips
+STREAM_COPY_CODEC = "h264"
+STREAM_COPY_PIX_FMT = "yuv420p"
+
+# Bumped when the schema changes; an older index is rebuilt from the library
+INDEX_VERSION = 2
+SCHEMA = """
+DROP TABLE IF EXISTS clips;
+DROP TABLE IF EXISTS clip_tags;
+CREATE TABLE clips (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime REAL NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    duration REAL,
+    width INTEGER,
+    height INTEGER,
+    codec TEXT,
+    pix_fmt TEXT
+);
+CREATE VIRTUAL TABLE clip_tags USING fts5(tags, description);
+"""
+
+
+class StockLibrary:
+    """Index a directory of clips and search it by keywords"""
+    
+    def __init__(self, library_dir: str = STOCK_LIBRARY_DIR, index_path: str = STOCK_LIBRARY_INDEX):
+        self.library_dir = library_dir
+        self.index_path = index_path
+    
+    @property
+    def enabled(self) -> bool:
+        return bool(self.library_dir) and os.path.isdir(self.library_dir)
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.index_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+    
+    def _init_schema(self, conn: sqlite3.Connection):
+        """Create the index tables, or rebuild them if they are from an older version"""
+        if conn.execute("PRAGMA user_version").fetchone()[0] != INDEX_VERSION:
+            conn.executescript(SCHEMA)
+            conn.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+    
+    def refresh(self) -> Dict[str, int]:
+        """
+        Bring the index up to date with the library directory
+        
+        Only new or changed files (by mtime and size) are probed; clips that
+        were removed from the directory are dropped from the index. Blocks on
+        ffprobe and SQLite, so run it off the event loop.
+        
+        Returns:
+            Counts of 'indexed', 'unchanged', 'removed' and 'failed' clips,
+            and of 'incompatible' ones (indexed, but search skips them)
+        """
+        counts = {"indexed": 0, "unchanged": 0, "removed": 0, "failed": 0, "incompatible": 0}
+        if not self.enabled:
+            return counts
+        
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        conn = self._connect()
+        try:
+            self._init_schema(conn)
+            known = {
+                row["path"]: (row["id"], row["mtime"], row["size_bytes"])
+                for row in conn.execute("SELECT id, path, mtime, size_bytes FROM clips")
+            }
+            seen = set()
+            
+            for path in self._scan():
+                seen.add(path)
+                stat = os.stat(path)
+                mtime = max([stat.st_mtime] + [os.path.getmtime(p) for p in self._sidecars(path)])
+                existing = known.get(path)
+                if existing and existing[1] == mtime and existing[2] == stat.st_size:
+                    counts["unchanged"] += 1
+                    continue
+                
+                probe = self._probe(path)
+                if not probe:
+                    counts["failed"] += 1
+                    continue
+                
+                tags, description = self._read_sidecar(path)
+                if existing:
+                    self._delete(conn, existing[0])
+                cursor = conn.execute(
+                    "INSERT INTO clips (path, mtime, size_bytes, duration, width, height, codec, pix_fmt) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (path, mtime, stat.st_size, probe["duration"], probe["width"], probe["height"],
+                     probe["codec"], probe["pix_fmt"])
+                )
+                conn.execute(
+                    "INSERT INTO clip_tags (rowid, tags, description) VALUES (?, ?, ?)",
+                    (cursor.lastrowid, ' '.join(tags), description)
+                )
+                counts["indexed"] += 1
+            
+            for path, (clip_id, _, _) in known.items():
+                if path not in seen:
+                    self._delete(conn, clip_id)
+                    counts["removed"] += 1
+            
+            counts["incompatible"] = conn.execute(
+                "SELECT COUNT(*) FROM clips WHERE codec IS NOT ? OR pix_fmt IS NOT ?",
+                (STREAM_COPY_CODEC, STREAM_COPY_PIX_FMT)
+            ).fetchone()[0]
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error indexing stock library: {str(e)}")
+        finally:
+            conn.close()
+        
+        logger.info(f"Stock library {self.library_dir}: {counts}")
+        return counts
+    
+    def search(
+        self,
+        keywords: List[str],
+        orientation: str = "portrait",
+        min_duration: int = 5,
+        exclude: Iterable[str] = ()
+    ) -> Optional[Dict]:
+        """
+        Best-matching local clip for the keywords
+        
+        Any keyword may match (ranked by BM25, so clips matching more and
+        rarer keywords win); the clip must be long enough, have the
+        requested orientation and be H.264/yuv420p. Paths in exclude are
+        skipped, so a job does not reuse the same clip. Opens the SQLite
+        index, so async callers run it with asyncio.to_thread.
+        
+        Returns:
+            Video info dict like the network providers return, with
+            'local_path' instead of a download 'url', or None
+        """
+        if not self.enabled or not os.path.exists(self.index_path):
+            return None
+        
+        terms = [t for t in (re.sub(r'[^\w]', '', k.lower()) for k in keywords) if t]
+        if not terms:
+            return None
+        # Quote each term so user text cannot form FTS query syntax
+        match = ' OR '.join(f'"{t}"' for t in terms)
+        shape = "c.height >= c.width" if orientation == "portrait" else "c.width > c.height"
+        exclude = list(exclude)
+        
+        with tracer.span("stock_library.search", query=' '.join(terms)) as span:
+            conn = self._connect()
+            try:
+                rows = conn.execute(
+                    "SELECT c.path, c.duration, c.width, c.height, c.codec "
+                    "FROM clip_tags JOIN clips c ON c.id = clip_tags.rowid "
+                    f"WHERE clip_tags MATCH ? AND c.duration >= ? AND {shape} "
+                    "AND c.codec = ? AND c.pix_fmt = ? "
+                    "ORDER BY bm25(clip_tags) LIMIT ?",
+                    (match, min_duration, STREAM_COPY_CODEC, STREAM_COPY_PIX_FMT, len(exclude) + 5)
+                ).fetchall()
+            except Exception as e:
+                logger.error(f"Error searching stock library: {str(e)}")
+                return None
+            finally:
+                conn.close()
+            
+            for row in rows:
+                if row["path"] in exclude or not os.path.exists(row["path"]):
+                    continue
+                if span is not None:
+                    span.set_attribute("path", row["path"])
+                return {
+                    "local_path": row["path"],
+                    "duration": row["duration"],
+                    "width": row["width"],
+                    "height": row["height"],
+                    "codec": row["codec"],
+                    "source": "local"
+                }
+            return None
+    
+    def _scan(self) -> List[str]:
+        paths = []
+        for root, _, names in os.walk(self.library_dir):
+            for name in sorted(names):
+                if os.path.splitext(name)[1].lower() in VIDEO_EXTENSIONS:
+                    paths.append(os.path.abspath(os.path.join(root, name)))
+        return paths
+    
+    def _sidecars(self, path: str) -> List[str]:
+        return [path + ext for ext in SIDECAR_EXTENSIONS if os.path.exists(path + ext)]
+    
+    def _read_sidecar(self, path: str):
+        """Tags and description from the sidecar files, plus the file name's words"""
+        name = os.path.splitext(os.path.basename(path))[0]
+        tags = [w for w in re.split(r'[\W_]+', name.lower()) if w and not w.isdigit()]
+        description = ""
+        
+        for sidecar in self._sidecars(path):
+            try:
+                with open(sidecar, encoding='utf-8') as f:
+                    if sidecar.endswith(".json"):
+                        meta = json.load(f)
+                        meta_tags = meta.get("tags", [])
+                        if isinstance(meta_tags, str):
+                            meta_tags = meta_tags.split(',')
+                        tags += [str(t).strip().lower() for t in meta_tags if str(t).strip()]
+                        description = meta.get("description", "") or description
+                    else:
+                        tags += [t.strip().lower() for t in re.split(r'[,\n]', f.read()) if t.strip()]
+            except Exception as e:
+                logger.warning(f"Failed to read sidecar {sidecar}: {e}")
+        
+        return list(dict.fromkeys(tags)), description
+    
+    def _probe(self, path: str) -> Optional[Dict]:
+        """Duration, resolution, codec and pixel format of the first video stream"""
+        cmd = [
+            'ffprobe', '-v', 'error',
+            '-select_streams', 'v:0',
+            '-show_entries', 'stream=codec_name,pix_fmt,width,height:format=duration',
+            '-of', 'json',
+            path
+        ]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=PROBE_TIMEOUT)
+            if result.returncode != 0:
+                logger.warning(f"ffprobe failed for {path}: {result.stderr[:200]}")
+                return None
+            info = json.loads(result.stdout)
+            stream = info["streams"][0]
+            return {
+                "duration": float(info["format"]["duration"]),
+                "width": int(stream["width"]),
+                "height": int(stream["height"]),
+                "codec": stream.get("codec_name"),
+                "pix_fmt": stream.get("pix_fmt")
+            }
+        except Exception as e:
+            logger.warning(f"ffprobe failed for {path}: {e}")
+            return None
+    
+    def _delete(self, conn: sqlite3.Connection, clip_id: int):
+        conn.execute("DELETE FROM clip_tags WHERE rowid = ?", (clip_id,))
+        conn.execute("DELETE FROM clips WHERE id = ?", (clip_id,))
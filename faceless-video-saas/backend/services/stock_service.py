@@ -1,80 +1,123 @@
 """
-Stock video service using Pexels API (Free Tier)
+Stock video service: local footage library first, then Pexels/Pixabay (Free Tier)
 """
 import os
 import httpx
 import asyncio
-from typing import List, Optional, Dict
+from typing import AsyncIterable, AsyncIterator, List, Optional, Dict, Tuple, Union
 import logging
 
+from utils.metrics import track_provider_call, STOCK_CLIPS_TOTAL, STOCK_DOWNLOAD_BYTES_TOTAL
+from utils.scratch import scratch
+from utils.clip_selector import clip_selector, DEFAULT_TARGET_SIZE
+from utils.deadline import deadlines
+from services.stock_library import StockLibrary
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Pexels API (Free tier: 200 requests/hour)
 PEXELS_API_KEY = os.getenv("PEXELS_API_KEY", "")
-PEXELS_API_URL = "https://api.pexels.com/videos/search"
+PEXELS_API_URL = os.getenv("PEXELS_API_URL", "https://api.pexels.com/videos/search")
 
 # Pixabay API (Free tier: 100 requests/minute) - Fallback
 PIXABAY_API_KEY = os.getenv("PIXABAY_API_KEY", "")
-PIXABAY_API_URL = "https://pixabay.com/api/videos/"
+PIXABAY_API_URL = os.getenv("PIXABAY_API_URL", "https://pixabay.com/api/videos/")
+
+MEDIA_DIR = os.getenv("MEDIA_DIR", "/app/media")
 
-MEDIA_DIR = "/app/media"
+# Downloads are written in chunks of this size, each in a worker thread
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
 
 
 class StockService:
     """Service for fetching free stock videos"""
     
-    def __init__(self):
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
         self.pexels_headers = {"Authorization": PEXELS_API_KEY} if PEXELS_API_KEY else {}
-        self.client = httpx.AsyncClient(timeout=30.0)
+        # Shared pooled client from the service registry
+        self.client = client or httpx.AsyncClient()
+        self.library = StockLibrary()
         os.makedirs(MEDIA_DIR, exist_ok=True)
     
+    async def startup(self):
+        """Called by the service registry at app startup: index the local library"""
+        if self.library.enabled:
+            # ffprobe runs per new clip, so keep it off the event loop
+            await asyncio.to_thread(self.library.refresh)
+    
     async def fetch_videos_for_scenes(
         self, 
-        scenes: List[Dict], 
+        scenes: Union[List[Dict], AsyncIterable[Dict]], 
         video_id: str,
         orientation: str = "portrait",
-        min_duration: int = 5
+        min_duration: int = 5,
+        target_size: Tuple[int, int] = DEFAULT_TARGET_SIZE
     ) -> List[Dict]:
         """
         Fetch stock videos for each scene
         
+        Each scene is looked up in the local library first; only scenes
+        without a local match call Pexels/Pixabay and download a clip. From
+        the search results the clip selector picks the smallest rendition
+        that covers the scene and fills the output frame.
+        
         Args:
-            scenes: List of scene dicts with 'keywords' key
+            scenes: Scene dicts with 'keywords' key; an async iterable (e.g.
+                scenes of a script still being streamed) is consumed as the
+                scenes arrive
             video_id: Unique video ID
             orientation: 'portrait' (9:16) or 'landscape'
             min_duration: Minimum video duration in seconds
+            target_size: Output (width, height) the clips are scaled into
             
         Returns:
             List of video info dicts with local paths
         """
         videos = []
         
-        for i, scene in enumerate(scenes):
+        async for i, scene in _aenumerate(scenes):
+            if videos and deadlines.exhausted():
+                # Out of clip budget: the clips found so far are looped over the narration
+                deadlines.degrade("clips", f"{len(videos)} scene clips, stopped at scene {i+1}")
+                break
+            
             keywords = scene.get('keywords', ['video'])
             query = ' '.join(keywords[:2])  # Use top 2 keywords
             
+            # Local footage needs no API request and no download
+            local = await asyncio.to_thread(
+                self.library.search, keywords, orientation, min_duration, exclude=[v["local_path"] for v in videos]
+            )
+            if local:
+                logger.info(f"Using local clip for scene {i+1}: {local['local_path']}")
+                STOCK_CLIPS_TOTAL.labels(source="local").inc()
+                videos.append({"scene_number": i + 1, "query": query, **local})
+                continue
+            
             logger.info(f"Fetching video for scene {i+1}: {query}")
+            scene_duration = max(scene.get('duration') or 0, min_duration)
             
             # Try Pexels first
             video_info = await self._fetch_from_pexels(
-                query, orientation, min_duration
+                query, orientation, min_duration, scene_duration, target_size
             )
             
             # Fallback to Pixabay if Pexels fails
             if not video_info:
                 video_info = await self._fetch_from_pixabay(
-                    query, orientation, min_duration
+                    query, orientation, min_duration, scene_duration, target_size
                 )
             
             if video_info:
                 # Download the video
                 local_path = await self._download_video(
                     video_info['url'], 
-                    f"{video_id}_scene_{i+1}.mp4"
+                    scratch.path(video_id, f"scene_{i+1}.mp4")
                 )
                 
                 if local_path:
+                    STOCK_CLIPS_TOTAL.labels(source=video_info.get('source', 'unknown')).inc()
                     videos.append({
                         "scene_number": i + 1,
                         "query": query,
@@ -87,6 +130,7 @@ class StockService:
                 else:
                     logger.warning(f"Failed to download video for scene {i+1}")
             else:
+                STOCK_CLIPS_TOTAL.labels(source="none").inc()
                 logger.warning(f"No video found for scene {i+1}: {query}")
             
             # Rate limiting - be nice to APIs
@@ -98,7 +142,9 @@ class StockService:
         self, 
         query: str, 
         orientation: str,
-        min_duration: int
+        min_duration: int,
+        scene_duration: float,
+        target_size: Tuple[int, int] = DEFAULT_TARGET_SIZE
     ) -> Optional[Dict]:
         """Fetch video from Pexels API"""
         if not PEXELS_API_KEY:
@@ -113,38 +159,33 @@ class StockService:
                 "min_duration": min_duration
             }
             
-            response = await self.client.get(
-                PEXELS_API_URL,
-                headers=self.pexels_headers,
-                params=params
-            )
+            with track_provider_call("pexels", query=query) as call:
+                response = await self.client.get(
+                    PEXELS_API_URL,
+                    headers=self.pexels_headers,
+                    params=params,
+                    timeout=deadlines.timeout(30.0)
+                )
+                call["status_code"] = response.status_code
             
             if response.status_code == 200:
                 data = response.json()
-                videos = data.get('videos', [])
                 
-                if videos:
-                    # Get the first video with appropriate resolution
-                    video = videos[0]
-                    video_files = video.get('video_files', [])
-                    
-                    # Find best quality file (prefer HD, but not too large)
-                    best_file = None
-                    for vf in video_files:
-                        if vf.get('quality') in ['hd', 'sd']:
-                            if not best_file or vf.get('width', 0) > best_file.get('width', 0):
-                                if vf.get('width', 0) <= 1920:  # Don't go too high res
-                                    best_file = vf
-                    
-                    if best_file:
-                        return {
-                            "url": best_file['link'],
-                            "duration": video.get('duration', 10),
-                            "width": best_file.get('width', 1080),
-                            "height": best_file.get('height', 1920),
-                            "source": "pexels"
-                        }
-                        
+                # Every file of every result is a candidate
+                candidates = [
+                    {
+                        "url": vf.get('link'),
+                        "duration": video.get('duration', 10),
+                        "width": vf.get('width'),
+                        "height": vf.get('height'),
+                        "size_bytes": vf.get('size'),
+                        "source": "pexels"
+                    }
+                    for video in data.get('videos', [])
+                    for vf in video.get('video_files', [])
+                ]
+                return clip_selector.select(candidates, scene_duration, target_size)
+                
             elif response.status_code == 429:
                 logger.warning("Pexels rate limit hit")
             else:
@@ -159,7 +200,9 @@ class StockService:
         self, 
         query: str, 
         orientation: str,
-        min_duration: int
+        min_duration: int,
+        scene_duration: float,
+        target_size: Tuple[int, int] = DEFAULT_TARGET_SIZE
     ) -> Optional[Dict]:
         """Fetch video from Pixabay API (fallback)"""
         if not PIXABAY_API_KEY:
@@ -174,34 +217,28 @@ class StockService:
                 "per_page": 5
             }
             
-            response = await self.client.get(PIXABAY_API_URL, params=params)
+            with track_provider_call("pixabay", query=query) as call:
+                response = await self.client.get(PIXABAY_API_URL, params=params, timeout=deadlines.timeout(30.0))
+                call["status_code"] = response.status_code
             
             if response.status_code == 200:
                 data = response.json()
-                hits = data.get('hits', [])
                 
-                if hits:
-                    video = hits[0]
-                    
-                    # Pixabay provides different sizes
-                    videos = video.get('videos', {})
-                    
-                    # Prefer medium size for processing speed
-                    size_key = 'medium'
-                    if size_key not in videos:
-                        size_key = 'small' if 'small' in videos else 'large'
-                    
-                    video_data = videos.get(size_key, {})
-                    
-                    if video_data:
-                        return {
-                            "url": video_data['url'],
-                            "duration": video.get('duration', 10),
-                            "width": video_data.get('width', 1080),
-                            "height": video_data.get('height', 1920),
-                            "source": "pixabay"
-                        }
-                        
+                # Pixabay provides different sizes (large/medium/small/tiny) per hit
+                candidates = [
+                    {
+                        "url": video_data.get('url'),
+                        "duration": hit.get('duration', 10),
+                        "width": video_data.get('width'),
+                        "height": video_data.get('height'),
+                        "size_bytes": video_data.get('size'),
+                        "source": "pixabay"
+                    }
+                    for hit in data.get('hits', [])
+                    for video_data in hit.get('videos', {}).values()
+                ]
+                return clip_selector.select(candidates, scene_duration, target_size)
+                
             elif response.status_code == 429:
                 logger.warning("Pixabay rate limit hit")
             else:
@@ -212,74 +249,48 @@ class StockService:
         
         return None
     
-    async def _download_video(self, url: str, filename: str) -> Optional[str]:
-        """Download video from URL to local storage"""
+    async def _download_video(self, url: str, local_path: str) -> Optional[str]:
+        """Download video from URL to a local path"""
         try:
-            local_path = os.path.join(MEDIA_DIR, filename)
-            
             # Download with streaming for large files
-            async with self.client.stream("GET", url, timeout=60.0) as response:
-                if response.status_code == 200:
-                    with open(local_path, 'wb') as f:
-                        async for chunk in response.aiter_bytes(chunk_size=8192):
-                            f.write(chunk)
-                    
-                    # Verify file
-                    if os.path.exists(local_path) and os.path.getsize(local_path) > 1000:
-                        logger.info(f"Downloaded video: {local_path}")
-                        return local_path
-                    else:
-                        logger.error("Downloaded file is too small or missing")
-                        if os.path.exists(local_path):
-                            os.remove(local_path)
+            with track_provider_call("stock_download", url=url, filename=os.path.basename(local_path)) as call:
+                async with self.client.stream("GET", url, timeout=deadlines.timeout(60.0)) as response:
+                    call["status_code"] = response.status_code
+                    if response.status_code == 200:
+                        # Disk writes block, so they run off the event loop
+                        f = await asyncio.to_thread(open, local_path, 'wb')
+                        try:
+                            async for chunk in response.aiter_bytes(chunk_size=DOWNLOAD_CHUNK_BYTES):
+                                await asyncio.to_thread(f.write, chunk)
+                        finally:
+                            await asyncio.to_thread(f.close)
+            
+            if response.status_code == 200:
+                # Verify file
+                if os.path.exists(local_path) and os.path.getsize(local_path) > 1000:
+                    STOCK_DOWNLOAD_BYTES_TOTAL.inc(os.path.getsize(local_path))
+                    logger.info(f"Downloaded video: {local_path}")
+                    return local_path
                 else:
-                    logger.error(f"Download failed: {response.status_code}")
+                    logger.error("Downloaded file is too small or missing")
+                    if os.path.exists(local_path):
+                        os.remove(local_path)
+            else:
+                logger.error(f"Download failed: {response.status_code}")
                     
         except Exception as e:
             logger.error(f"Error downloading video: {str(e)}")
         
         return None
-    
-    async def get_fallback_video(self, video_id: str) -> Optional[str]:
-        """
-        Get a fallback video (solid color or pattern) if stock fetch fails
-        """
-        try:
-            # Create a simple colored video using FFmpeg
-            output_path = os.path.join(MEDIA_DIR, f"{video_id}_fallback.mp4")
-            
-            import subprocess
-            
-            cmd = [
-                'ffmpeg', '-y',
-                '-f', 'lavfi',
-                '-i', 'color=c=0x1a1a2e:s=1080x1920:d=10',
-                '-f', 'lavfi',
-                '-i', 'anoisesrc=a=0.1:c=pink',
-                '-shortest',
-                '-c:v', 'libx264',
-                '-preset', 'ultrafast',
-                '-crf', '28',
-                '-c:a', 'aac',
-                '-b:a', '128k',
-                output_path
-            ]
-            
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-            
-            if result.returncode == 0 and os.path.exists(output_path):
-                return output_path
-                
-        except Exception as e:
-            logger.error(f"Error creating fallback video: {str(e)}")
-        
-        return None
 
 
-# Singleton instance
-stock_service = StockService()
+async def _aenumerate(scenes: Union[List[Dict], AsyncIterable[Dict]]) -> AsyncIterator[Tuple[int, Dict]]:
+    """enumerate() over a list or an async iterable of scenes"""
+    if isinstance(scenes, AsyncIterable):
+        i = 0
+        async for scene in scenes:
+            yield i, scene
+            i += 1
+    else:
+        for i, scene in enumerate(scenes):
+            yield i, scene
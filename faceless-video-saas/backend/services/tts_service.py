@@ -2,14 +2,19 @@
 Text-to-Speech service using gTTS (Google Text-to-Speech) - FREE
 """
 import os
+import asyncio
 from gtts import gTTS
 from typing import Optional
 import logging
 
+from utils.metrics import track_provider_call
+from utils.artifacts import artifact_store
+from utils.deadline import deadlines
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-MEDIA_DIR = "/app/media"
+MEDIA_DIR = os.getenv("MEDIA_DIR", "/app/media")
 
 
 class TTSService:
@@ -46,25 +51,38 @@ class TTSService:
             # Generate audio file path
             audio_path = os.path.join(MEDIA_DIR, f"{video_id}_audio.mp3")
             
+            # Bounded by what is left of the TTS stage's budget
+            timeout = deadlines.timeout(120.0)
+            
             # Create gTTS object
             tts = gTTS(
                 text=clean_text,
                 lang=lang,
                 slow=slow,
-                lang_check=False  # Skip language check for speed
+                lang_check=False,  # Skip language check for speed
+                timeout=timeout
             )
             
-            # Save audio file
-            tts.save(audio_path)
+            # Save audio file; gTTS blocks on HTTP, so run it off the event
+            # loop (stock clips are fetched at the same time). Its timeout is
+            # per request and the thread cannot be stopped, so the job stops
+            # waiting for it once the whole save is over budget
+            with track_provider_call("google_tts", characters=len(clean_text)) as call:
+                await asyncio.wait_for(asyncio.to_thread(tts.save, audio_path), timeout=timeout)
+                call["status_code"] = 200
             
             # Verify file was created
             if os.path.exists(audio_path) and os.path.getsize(audio_path) > 0:
                 logger.info(f"Audio generated successfully: {audio_path}")
+                await asyncio.to_thread(artifact_store.record, video_id, audio_path, "audio")
                 return audio_path
             else:
                 logger.error("Audio file not created or empty")
                 return None
                 
+        except asyncio.TimeoutError:
+            logger.error(f"Audio generation timed out for video {video_id}")
+            return None
         except Exception as e:
             logger.error(f"Error generating audio: {str(e)}")
             return None
@@ -114,7 +132,3 @@ class TTSService:
         except Exception as e:
             logger.error(f"Error generating scene audio: {str(e)}")
             return None
-
-
-# Singleton instance
-tts_service = TTSService()
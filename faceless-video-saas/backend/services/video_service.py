@@ -2,15 +2,58 @@
 Video processing service using FFmpeg
 """
 import os
-import subprocess
+import time
+import shutil
+import hashlib
 import logging
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Set, Callable, Awaitable
 import asyncio
 
+from utils.metrics import FFMPEG_SECONDS
+from utils.encoding_policy import encoding_policy
+from utils.artifacts import artifact_store, TEMP_KINDS
+from utils.scratch import scratch
+from utils.tracing import tracer
+from utils.deadline import deadlines
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-MEDIA_DIR = "/app/media"
+MEDIA_DIR = os.getenv("MEDIA_DIR", "/app/media")
+
+# HLS packaging (segments are cut during the final encode, no extra pass)
+HLS_ENABLED = os.getenv("HLS_ENABLED", "true").lower() == "true"
+HLS_SEGMENT_SECONDS = int(os.getenv("HLS_SEGMENT_SECONDS", "4"))
+HLS_SEGMENT_TYPE = os.getenv("HLS_SEGMENT_TYPE", "fmp4")  # 'fmp4' or 'mpegts'
+
+# Render profiles a job can ask for; all of them come out of one decode
+RENDER_PROFILES = {
+    "1080p": {"width": 1080, "height": 1920, "crf": 23, "audio_bitrate": "128k"},
+    "720p": {"width": 720, "height": 1280, "crf": 23, "audio_bitrate": "128k"},
+    "480p": {"width": 480, "height": 854, "crf": 26, "audio_bitrate": "96k"},
+}
+DEFAULT_RENDER_PROFILES = ["1080p"]
+
+# How captions are delivered: drawn into the picture, as a mov_text track in
+# the MP4 renditions, or as separate SRT/VTT files (the last two skip the
+# subtitles filter entirely)
+SUBTITLE_MODES = ["burned", "embedded", "sidecar"]
+
+# Two-phase render: a cheap preview first, then the full-quality encode
+PREVIEW_WIDTH = 360
+PREVIEW_HEIGHT = 640
+# Niceness applied to the full-quality FFmpeg processes (0 = normal priority)
+FINAL_RENDER_NICENESS = int(os.getenv("FINAL_RENDER_NICENESS", "10"))
+
+# Thumbnails: 'fixed' grabs one frame, 'scored' picks the best of several
+THUMBNAIL_MODE = os.getenv("THUMBNAIL_MODE", "fixed")
+THUMBNAIL_CANDIDATES = int(os.getenv("THUMBNAIL_CANDIDATES", "6"))
+
+# Storyboard sprite for scrub previews: a grid of tiles spread evenly over the video
+STORYBOARD_ENABLED = os.getenv("STORYBOARD_ENABLED", "false").lower() == "true"
+STORYBOARD_COLUMNS = 5
+STORYBOARD_ROWS = 5
+STORYBOARD_TILE_WIDTH = 180
 
 
 class VideoService:
@@ -18,19 +61,26 @@ class VideoService:
     
     def __init__(self):
         os.makedirs(MEDIA_DIR, exist_ok=True)
-        self._verify_ffmpeg()
+        # FFmpeg processes per job, so a render can be cancelled
+        self._processes: Dict[str, Set[asyncio.subprocess.Process]] = {}
+        self._rendering: Set[str] = set()
+        self._cancelled: Set[str] = set()
+    
+    async def startup(self):
+        """Called by the service registry at app startup"""
+        await self._verify_ffmpeg()
     
-    def _verify_ffmpeg(self):
+    async def _verify_ffmpeg(self):
         """Verify FFmpeg is installed"""
         try:
-            result = subprocess.run(
-                ['ffmpeg', '-version'],
-                capture_output=True,
-                text=True,
-                timeout=5
+            process = await asyncio.create_subprocess_exec(
+                'ffmpeg', '-version',
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL
             )
-            if result.returncode == 0:
-                version = result.stdout.split('\n')[0]
+            stdout, _ = await asyncio.wait_for(process.communicate(), timeout=5)
+            if process.returncode == 0:
+                version = stdout.decode(errors='replace').split('\n')[0]
                 logger.info(f"FFmpeg verified: {version}")
             else:
                 logger.error("FFmpeg not found or not working")
@@ -43,121 +93,188 @@ class VideoService:
         video_clips: List[Dict],
         audio_path: str,
         subtitle_path: str,
-        target_duration: int = 60
-    ) -> Optional[str]:
+        target_duration: int = 60,
+        hls: bool = HLS_ENABLED,
+        render_profiles: Optional[List[str]] = None,
+        on_preview: Optional[Callable[[str], Awaitable[None]]] = None,
+        encoding: Optional[Dict] = None,
+        subtitle_mode: str = "burned"
+    ) -> Optional[Dict]:
         """
         Create final video by combining clips, audio, and subtitles
         
+        Intermediates stay in the job's scratch directory: the clips are
+        concatenated and muxed with the audio in one FFmpeg pass, and the
+        captions are drawn inside the final encode rather than in a
+        separate burn-in pass, so only the deliverables are written to
+        MEDIA_DIR.
+        
         Args:
             video_id: Unique video ID
             video_clips: List of video clip paths
             audio_path: Path to audio file
             subtitle_path: Path to subtitle file
             target_duration: Target video duration
-            
+            hls: Also package the final encode as an HLS playlist
+            render_profiles: Render profile names, primary rendition first
+            on_preview: Awaited with the preview path as soon as it exists;
+                the full-quality encode then runs at lower CPU priority
+            encoding: Final encode settings from the encoding policy
+                ('preset', 'crf_offset'); defaults to preset fast
+            subtitle_mode: One of SUBTITLE_MODES; only 'burned' draws the
+                captions into the preview and the renditions, 'embedded'
+                adds them as a soft track, 'sidecar' leaves them out
+        
         Returns:
-            Path to final video file
+            Dict with 'video_path' (primary MP4), 'stream_path' (HLS playlist
+            or None) and 'renditions' (profile name -> MP4 path)
         """
+        self._rendering.add(video_id)
         try:
             logger.info(f"Creating final video: {video_id}")
             
-            # Step 1: Concatenate video clips
-            concat_video = await self._concatenate_clips(video_clips, video_id)
-            if not concat_video:
-                logger.error("Failed to concatenate clips")
-                return None
-            
-            # Step 2: Add audio
-            video_with_audio = await self._add_audio(concat_video, audio_path, video_id)
+            # Step 1: Concatenate video clips and add audio
+            video_with_audio = await self._mux_clips_with_audio(video_clips, audio_path, video_id, target_duration)
             if not video_with_audio:
-                logger.error("Failed to add audio")
+                logger.error("Failed to concatenate clips with audio")
                 return None
             
-            # Step 3: Add subtitles
-            final_video = await self._burn_subtitles(
-                video_with_audio, 
-                subtitle_path, 
-                video_id
-            )
-            if not final_video:
-                logger.error("Failed to add subtitles")
-                # Return video without subtitles as fallback
-                final_video = video_with_audio
+            burned_subtitles = subtitle_path if subtitle_mode == "burned" else None
+            subtitle_track = subtitle_path if subtitle_mode == "embedded" else None
             
-            # Step 4: Convert to 9:16 format and optimize
-            optimized_video = await self._optimize_video(final_video, video_id)
-            if optimized_video:
-                final_video = optimized_video
+            # Step 2: Fast low-resolution preview, published before the full encode
+            if deadlines.job_exhausted():
+                deadlines.degrade("render", "no preview")
+                preview_path = None
+            else:
+                preview_path = await self._render_preview(video_with_audio, burned_subtitles, video_id)
+            if preview_path and on_preview:
+                await on_preview(preview_path)
+            
+            if self.is_cancelled(video_id):
+                logger.info(f"Render cancelled: {video_id}")
+                return None
             
-            logger.info(f"Final video created: {final_video}")
-            return final_video
+            # Step 3: Convert to 9:16 format, add subtitles and optimize
+            profiles = render_profiles or DEFAULT_RENDER_PROFILES
+            hls_dir = self.get_hls_dir(video_id) if hls else None
+            encode_start = time.perf_counter()
+            if deadlines.job_exhausted():
+                # Too late for a full encode: the muxed track is delivered below
+                renditions = {}
+            else:
+                renditions = await self._optimize_video(
+                    video_with_audio, video_id, hls_dir, profiles, encoding, burned_subtitles, subtitle_track
+                )
+            if (
+                not renditions
+                and (burned_subtitles or subtitle_track)
+                and os.path.exists(subtitle_path)
+                and not self.is_cancelled(video_id)
+                and not deadlines.job_exhausted()
+            ):
+                logger.error("Final encode with subtitles failed, retrying without them")
+                deadlines.degrade("render", "subtitles left out of the final encode")
+                renditions = await self._optimize_video(video_with_audio, video_id, hls_dir, profiles, encoding)
+            if renditions and encoding:
+                encoding_policy.observe(
+                    encoding,
+                    time.perf_counter() - encode_start,
+                    RENDER_PROFILES.get(profiles[0], {}).get("height", 1920)
+                )
+            stream_path = None
+            final_video = self.get_rendition_path(video_id, profiles[0], primary=True)
+            if final_video in renditions.values():
+                playlist = os.path.join(hls_dir, "index.m3u8") if hls_dir else None
+                if playlist and os.path.exists(playlist):
+                    stream_path = playlist
+            
+            if self.is_cancelled(video_id):
+                logger.info(f"Render cancelled: {video_id}")
+                return None
             
+            if final_video not in renditions.values():
+                # Deliver the unoptimized track rather than nothing
+                logger.error("Failed to optimize video, keeping the muxed track")
+                deadlines.degrade("render", "unoptimized muxed track")
+                shutil.move(video_with_audio, final_video)
+                await asyncio.to_thread(artifact_store.record, video_id, final_video, "render")
+            
+            logger.info(f"Final video created: {final_video} ({len(renditions)} renditions)")
+            return {
+                "video_path": final_video,
+                "stream_path": stream_path,
+                "renditions": renditions,
+                "preview_path": preview_path
+            }
+        
         except Exception as e:
             logger.error(f"Error creating final video: {str(e)}")
             return None
+        finally:
+            self._rendering.discard(video_id)
+            self._cancelled.discard(video_id)
     
-    async def _concatenate_clips(
-        self, 
-        clips: List[Dict], 
-        video_id: str
+    def cancel_render(self, video_id: str) -> bool:
+        """
+        Cancel an in-progress render: kill its FFmpeg processes and skip the
+        remaining steps. Returns True if the job was rendering.
+        """
+        if video_id not in self._rendering:
+            return False
+        
+        self._cancelled.add(video_id)
+        for process in self._processes.get(video_id, set()):
+            if process.returncode is None:
+                process.kill()
+        logger.info(f"Cancelled render for {video_id}")
+        return True
+    
+    def is_cancelled(self, video_id: str) -> bool:
+        """Whether the render of this job has been cancelled"""
+        return video_id in self._cancelled
+    
+    async def _mux_clips_with_audio(
+        self,
+        clips: List[Dict],
+        audio_path: str,
+        video_id: str,
+        media_seconds: float = 0.0
     ) -> Optional[str]:
-        """Concatenate multiple video clips"""
+        """
+        Concatenate the clips and add the audio in a single FFmpeg pass
+        
+        The concat demuxer feeds the stream-copied clips straight into the
+        muxer, so no concatenated intermediate is written. The clip list is
+        looped until the narration ends, so a job with fewer clips than
+        scenes still keeps all of its audio. The output goes to the job's
+        scratch directory.
+        
+        Every later step needs this output, so a late job's deadline never
+        cuts it below media_seconds (the stream copy runs far faster than
+        real time).
+        """
         try:
             if not clips:
                 logger.error("No clips to concatenate")
                 return None
             
-            if len(clips) == 1:
-                return clips[0]['local_path']
-            
-            # Create concat list file
-            list_path = os.path.join(MEDIA_DIR, f"{video_id}_concat_list.txt")
-            concat_path = os.path.join(MEDIA_DIR, f"{video_id}_concat.mp4")
+            list_path = scratch.path(video_id, "concat_list.txt")
+            output_path = scratch.path(video_id, "with_audio.mp4")
             
             with open(list_path, 'w') as f:
                 for clip in clips:
                     f.write(f"file '{clip['local_path']}'\n")
             
-            # Run FFmpeg concat
             cmd = [
                 'ffmpeg', '-y',
+                '-stream_loop', '-1',
                 '-f', 'concat',
                 '-safe', '0',
                 '-i', list_path,
-                '-c', 'copy',
-                '-movflags', '+faststart',
-                concat_path
-            ]
-            
-            result = await self._run_ffmpeg(cmd)
-            
-            # Cleanup list file
-            if os.path.exists(list_path):
-                os.remove(list_path)
-            
-            if result and os.path.exists(concat_path):
-                return concat_path
-            
-            return None
-            
-        except Exception as e:
-            logger.error(f"Error concatenating clips: {str(e)}")
-            return None
-    
-    async def _add_audio(
-        self, 
-        video_path: str, 
-        audio_path: str,
-        video_id: str
-    ) -> Optional[str]:
-        """Add audio to video"""
-        try:
-            output_path = os.path.join(MEDIA_DIR, f"{video_id}_with_audio.mp4")
-            
-            cmd = [
-                'ffmpeg', '-y',
-                '-i', video_path,
                 '-i', audio_path,
+                '-map', '0:v:0',
+                '-map', '1:a:0',
                 '-c:v', 'copy',
                 '-c:a', 'aac',
                 '-b:a', '192k',
@@ -166,174 +283,476 @@ class VideoService:
                 output_path
             ]
             
-            result = await self._run_ffmpeg(cmd)
+            result = await self._run_ffmpeg(cmd, operation="mux", video_id=video_id, min_timeout=media_seconds)
             
             if result and os.path.exists(output_path):
                 return output_path
             
             return None
-            
+        
         except Exception as e:
-            logger.error(f"Error adding audio: {str(e)}")
+            logger.error(f"Error concatenating clips: {str(e)}")
             return None
     
-    async def _burn_subtitles(
-        self, 
-        video_path: str, 
+    def _subtitle_filter(self, subtitle_path: str) -> str:
+        """Subtitles filter for burning captions, preferring the ASS file if present"""
+        # Use ASS format for better styling if available
+        ass_path = subtitle_path.replace('.srt', '.ass')
+        subtitle_file = ass_path if os.path.exists(ass_path) else subtitle_path
+        
+        return f"subtitles={subtitle_file}:force_style='FontSize=24,PrimaryColour=&HFFFFFF,OutlineColour=&H000000,Outline=2'"
+    
+    async def _render_preview(
+        self,
+        video_path: str,
         subtitle_path: str,
         video_id: str
     ) -> Optional[str]:
-        """Burn subtitles into video"""
+        """
+        Render a small ultrafast preview with captions in one pass
+        
+        The preview is scaled down before the subtitles are drawn, so it
+        costs a fraction of the full-quality encode.
+        """
         try:
-            output_path = os.path.join(MEDIA_DIR, f"{video_id}_final.mp4")
-            
-            # Use ASS format for better styling if available
-            ass_path = subtitle_path.replace('.srt', '.ass')
+            output_path = os.path.join(MEDIA_DIR, f"{video_id}_preview.mp4")
             
-            if os.path.exists(ass_path):
-                subtitle_file = ass_path
-                subtitle_format = "ass"
-            else:
-                subtitle_file = subtitle_path
-                subtitle_format = "srt"
+            video_filter = (
+                f"scale={PREVIEW_WIDTH}:{PREVIEW_HEIGHT}:force_original_aspect_ratio=decrease,"
+                f"pad={PREVIEW_WIDTH}:{PREVIEW_HEIGHT}:(ow-iw)/2:(oh-ih)/2:black"
+            )
+            if subtitle_path and os.path.exists(subtitle_path):
+                video_filter += "," + self._subtitle_filter(subtitle_path)
             
             cmd = [
                 'ffmpeg', '-y',
                 '-i', video_path,
-                '-vf', f"subtitles={subtitle_file}:force_style='FontSize=24,PrimaryColour=&HFFFFFF,OutlineColour=&H000000,Outline=2'",
-                '-c:a', 'copy',
+                '-vf', video_filter,
+                '-c:v', 'libx264',
+                '-preset', 'ultrafast',
+                '-crf', '30',
+                '-c:a', 'aac',
+                '-b:a', '64k',
                 '-movflags', '+faststart',
+                '-pix_fmt', 'yuv420p',
                 output_path
             ]
             
-            result = await self._run_ffmpeg(cmd)
+            result = await self._run_ffmpeg(cmd, operation="preview", video_id=video_id)
             
             if result and os.path.exists(output_path):
+                await asyncio.to_thread(artifact_store.record, video_id, output_path, "preview")
                 return output_path
             
+            if os.path.exists(output_path):
+                # A failed run can leave a truncated file behind, which is not indexed
+                os.remove(output_path)
             return None
-            
+        
         except Exception as e:
-            logger.error(f"Error burning subtitles: {str(e)}")
+            logger.error(f"Error rendering preview: {str(e)}")
             return None
     
     async def _optimize_video(
         self, 
         video_path: str, 
-        video_id: str
-    ) -> Optional[str]:
-        """Optimize video for web and mobile"""
+        video_id: str,
+        hls_dir: Optional[str] = None,
+        profiles: Optional[List[str]] = None,
+        encoding: Optional[Dict] = None,
+        subtitle_path: Optional[str] = None,
+        subtitle_track: Optional[str] = None
+    ) -> Dict[str, str]:
+        """
+        Optimize video for web and mobile
+        
+        All requested render profiles are produced from a single decode: the
+        video is fanned out with the split filter and each branch is scaled
+        and encoded to its own output. The first profile is the primary
+        rendition ({video_id}.mp4); when hls_dir is given it is also written
+        through the tee muxer as HLS segments plus an index.m3u8 playlist.
+        The x264 preset and a CRF offset come from the encoding policy.
+        Subtitles, if given, are drawn once at source resolution before the
+        fan-out; a subtitle_track (SRT) is instead muxed into every MP4 as a
+        mov_text stream, with no filtering (HLS segments carry audio and
+        video only).
+        
+        Returns:
+            Dict mapping profile name to output path (empty on failure)
+        """
         try:
-            output_path = os.path.join(MEDIA_DIR, f"{video_id}.mp4")
-            
-            cmd = [
-                'ffmpeg', '-y',
-                '-i', video_path,
-                '-vf', 'scale=1080:1920:force_original_aspect_ratio=decrease,pad=1080:1920:(ow-iw)/2:(oh-ih)/2:black',
-                '-c:v', 'libx264',
-                '-preset', 'fast',
-                '-crf', '23',
-                '-c:a', 'aac',
-                '-b:a', '128k',
-                '-movflags', '+faststart',
-                '-pix_fmt', 'yuv420p',
-                output_path
-            ]
-            
-            result = await self._run_ffmpeg(cmd)
-            
-            if result and os.path.exists(output_path):
-                return output_path
+            profiles = [p for p in (profiles or DEFAULT_RENDER_PROFILES) if p in RENDER_PROFILES]
+            if not profiles:
+                profiles = list(DEFAULT_RENDER_PROFILES)
+            
+            preset = (encoding or {}).get("preset", "fast")
+            crf_offset = (encoding or {}).get("crf_offset", 0)
+            
+            source = "[0:v]"
+            if subtitle_path and os.path.exists(subtitle_path):
+                source += self._subtitle_filter(subtitle_path) + ","
+            
+            # One decode, fanned out to every rendition
+            labels = [f"v{i}" for i in range(len(profiles))]
+            if len(profiles) > 1:
+                split = f"{source}split={len(profiles)}" + ''.join(f"[s{i}]" for i in range(len(profiles)))
+                branches = [split]
+                sources = [f"[s{i}]" for i in range(len(profiles))]
+            else:
+                branches = []
+                sources = [source]
+            for name, source, label in zip(profiles, sources, labels):
+                width = RENDER_PROFILES[name]["width"]
+                height = RENDER_PROFILES[name]["height"]
+                branches.append(
+                    f"{source}scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                    f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:black[{label}]"
+                )
+            
+            cmd = ['ffmpeg', '-y', '-i', video_path]
+            if subtitle_track:
+                cmd += ['-i', subtitle_track]
+            cmd += ['-filter_complex', ';'.join(branches)]
+            
+            outputs = {}
+            for i, (name, label) in enumerate(zip(profiles, labels)):
+                profile = RENDER_PROFILES[name]
+                output_path = self.get_rendition_path(video_id, name, primary=(i == 0))
+                outputs[name] = output_path
+                
+                cmd += [
+                    '-map', f"[{label}]",
+                    '-map', '0:a:0?',
+                    '-c:v', 'libx264',
+                    '-preset', preset,
+                    '-crf', str(min(profile["crf"] + crf_offset, 51)),
+                    '-c:a', 'aac',
+                    '-b:a', profile["audio_bitrate"],
+                    '-pix_fmt', 'yuv420p'
+                ]
+                if subtitle_track:
+                    cmd += ['-map', '1:s:0', '-c:s', 'mov_text']
+                
+                if i == 0 and hls_dir:
+                    os.makedirs(hls_dir, exist_ok=True)
+                    cmd += [
+                        # Keyframe on every segment boundary so segments are cut evenly
+                        '-force_key_frames', f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})",
+                        '-flags', '+global_header',
+                        '-f', 'tee',
+                        self._tee_outputs(output_path, hls_dir, av_only=bool(subtitle_track))
+                    ]
+                else:
+                    cmd += ['-movflags', '+faststart', output_path]
+            
+            result = await self._run_ffmpeg(
+                cmd, operation="optimize", video_id=video_id, niceness=FINAL_RENDER_NICENESS
+            )
+            await asyncio.to_thread(
+                artifact_store.record_many,
+                video_id,
+                [(output_path, "render") for output_path in outputs.values()] + [(hls_dir, "stream")]
+            )
             
-            return None
+            if result:
+                return {name: path for name, path in outputs.items() if os.path.exists(path)}
             
+            return {}
+        
         except Exception as e:
             logger.error(f"Error optimizing video: {str(e)}")
-            return None
+            return {}
+    
+    def get_rendition_path(self, video_id: str, profile: str, primary: bool = False) -> str:
+        """Output path of a rendition; the primary one keeps the plain {video_id}.mp4 name"""
+        if primary:
+            return os.path.join(MEDIA_DIR, f"{video_id}.mp4")
+        return os.path.join(MEDIA_DIR, f"{video_id}_{profile}.mp4")
+    
+    def _tee_outputs(self, mp4_path: str, hls_dir: str, av_only: bool = False) -> str:
+        """
+        Build the tee muxer spec for an MP4 file plus an HLS rendition
+        
+        With av_only the HLS output only takes the audio and video
+        streams (e.g. when the MP4 also carries a subtitle track).
+        """
+        segment_ext = "m4s" if HLS_SEGMENT_TYPE == "fmp4" else "ts"
+        hls_options = ':'.join(([r"select=\'v,a\'"] if av_only else []) + [
+            "f=hls",
+            f"hls_time={HLS_SEGMENT_SECONDS}",
+            "hls_playlist_type=vod",
+            f"hls_segment_type={HLS_SEGMENT_TYPE}",
+            "hls_flags=independent_segments",
+            f"hls_segment_filename={os.path.join(hls_dir, f'segment_%03d.{segment_ext}')}"
+        ])
+        playlist_path = os.path.join(hls_dir, "index.m3u8")
+        return f"[f=mp4:movflags=+faststart]{mp4_path}|[{hls_options}]{playlist_path}"
     
-    async def _run_ffmpeg(self, cmd: List[str]) -> bool:
-        """Run FFmpeg command asynchronously"""
+    def get_hls_dir(self, video_id: str) -> str:
+        """Directory holding the HLS playlist and segments for a video"""
+        return os.path.join(MEDIA_DIR, f"{video_id}_hls")
+    
+    async def _run_ffmpeg(
+        self,
+        cmd: List[str],
+        operation: str = "ffmpeg",
+        video_id: Optional[str] = None,
+        niceness: int = 0,
+        min_timeout: float = 0.0
+    ) -> bool:
+        """
+        Run FFmpeg command asynchronously
+        
+        Args:
+            cmd: FFmpeg argv
+            operation: Metrics/trace label for what this invocation does
+            video_id: Job the process belongs to, so cancel_render can kill it
+            niceness: CPU niceness increment for the child process
+            min_timeout: Floor for the deadline-cut timeout, for passes the
+                job cannot do without (seconds)
+        """
+        argv_hash = hashlib.sha1('\0'.join(cmd).encode()).hexdigest()[:12]
+        with tracer.span(f"ffmpeg.{operation}", argv_hash=argv_hash) as span:
+            outcome = "error"
+            start = time.perf_counter()
+            try:
+                outcome = await self._execute_ffmpeg(cmd, video_id, niceness, min_timeout)
+                return outcome == "success"
+            except asyncio.CancelledError:
+                outcome = "cancelled"
+                raise
+            finally:
+                FFMPEG_SECONDS.labels(operation=operation, outcome=outcome).observe(
+                    time.perf_counter() - start
+                )
+                if span is not None:
+                    span.set_attribute("outcome", outcome)
+    
+    async def _execute_ffmpeg(
+        self,
+        cmd: List[str],
+        video_id: Optional[str],
+        niceness: int,
+        min_timeout: float = 0.0
+    ) -> str:
+        """Run the FFmpeg process; returns success, failed, cancelled, timeout or error"""
+        process = None
         try:
             logger.info(f"Running FFmpeg: {' '.join(cmd[:10])}...")
             
             process = await asyncio.create_subprocess_exec(
                 *cmd,
                 stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
+                stderr=asyncio.subprocess.PIPE,
+                preexec_fn=(lambda: os.nice(niceness)) if niceness else None
             )
+            if video_id:
+                self._processes.setdefault(video_id, set()).add(process)
             
             stdout, stderr = await asyncio.wait_for(
                 process.communicate(),
-                timeout=300  # 5 minute timeout
+                # 5 minutes at most, less when the job is near its deadline
+                timeout=deadlines.job_timeout(300, floor=min_timeout)
             )
             
             if process.returncode == 0:
                 logger.info("FFmpeg completed successfully")
-                return True
+                return "success"
+            elif video_id and self.is_cancelled(video_id):
+                logger.info(f"FFmpeg killed, render cancelled: {video_id}")
+                return "cancelled"
             else:
                 logger.error(f"FFmpeg failed: {stderr.decode()[:500]}")
-                return False
-                
+                return "failed"
+        
         except asyncio.TimeoutError:
             logger.error("FFmpeg timeout")
-            return False
+            if process and process.returncode is None:
+                process.kill()
+                await process.wait()
+            return "timeout"
+        except asyncio.CancelledError:
+            # The job was cancelled; don't leave FFmpeg running without it
+            if process and process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
         except Exception as e:
             logger.error(f"FFmpeg error: {str(e)}")
-            return False
+            return "error"
+        finally:
+            if video_id and process:
+                running = self._processes.get(video_id)
+                if running is not None:
+                    running.discard(process)
+                    if not running:
+                        self._processes.pop(video_id, None)
     
     async def generate_thumbnail(
         self, 
         video_path: str, 
         video_id: str,
-        time_offset: str = "00:00:03"
-    ) -> Optional[str]:
-        """Generate thumbnail from video"""
+        time_offset: str = "00:00:03",
+        mode: str = THUMBNAIL_MODE,
+        storyboard: bool = STORYBOARD_ENABLED,
+        duration: Optional[float] = None
+    ) -> Dict[str, Optional[str]]:
+        """
+        Generate thumbnail (and optionally a storyboard sprite) from video
+        
+        Everything comes out of a single FFmpeg run. Each thumbnail candidate
+        is its own input with -ss placed before -i, so FFmpeg seeks to the
+        nearest keyframe instead of decoding from the start. The storyboard,
+        when requested, is one more full input tiled into a sprite sheet.
+        
+        Args:
+            video_path: Rendered video
+            video_id: Unique video ID
+            time_offset: Frame position used in 'fixed' mode
+            mode: 'fixed' (frame at time_offset) or 'scored' (best of
+                several candidate frames by sharpness/exposure)
+            storyboard: Also produce a tiled scrub-preview sprite
+            duration: Video duration in seconds (probed if not given)
+        
+        Returns:
+            Dict with 'thumbnail_path' and 'storyboard_path' (either may be None)
+        """
+        result = {"thumbnail_path": None, "storyboard_path": None}
         try:
             thumbnail_path = os.path.join(MEDIA_DIR, f"{video_id}_thumb.jpg")
+            storyboard_path = os.path.join(MEDIA_DIR, f"{video_id}_storyboard.jpg")
             
-            cmd = [
-                'ffmpeg', '-y',
-                '-i', video_path,
-                '-ss', time_offset,
-                '-vframes', '1',
-                '-q:v', '2',
-                thumbnail_path
-            ]
-            
-            result = await self._run_ffmpeg(cmd)
-            
-            if result and os.path.exists(thumbnail_path):
-                return thumbnail_path
+            if (mode == "scored" or storyboard) and not duration:
+                duration = await self.probe_duration(video_path)
             
-            return None
+            if mode == "scored" and duration:
+                # Spread candidates over the video, skipping the very start and end
+                count = THUMBNAIL_CANDIDATES
+                offsets = [duration * (i + 1) / (count + 1) for i in range(count)]
+                outputs = [scratch.path(video_id, f"thumb_candidate_{i}.jpg") for i in range(count)]
+            else:
+                offsets = [self._parse_timestamp(time_offset)]
+                if duration:
+                    offsets = [min(offsets[0], duration / 2)]
+                outputs = [thumbnail_path]
+            
+            cmd = ['ffmpeg', '-y']
+            for offset in offsets:
+                cmd += ['-ss', f"{offset:.3f}", '-i', video_path]
+            
+            make_storyboard = storyboard and bool(duration)
+            if make_storyboard:
+                cmd += ['-i', video_path]
+            
+            for i, output in enumerate(outputs):
+                cmd += ['-map', f"{i}:v:0", '-frames:v', '1', '-q:v', '2', output]
+            
+            if make_storyboard:
+                tiles = STORYBOARD_COLUMNS * STORYBOARD_ROWS
+                cmd += [
+                    '-map', f"{len(offsets)}:v:0",
+                    '-vf', (
+                        f"fps={tiles}/{duration:.3f},"
+                        f"scale={STORYBOARD_TILE_WIDTH}:-2,"
+                        f"tile={STORYBOARD_COLUMNS}x{STORYBOARD_ROWS}"
+                    ),
+                    '-frames:v', '1',
+                    '-q:v', '4',
+                    storyboard_path
+                ]
+            
+            if not await self._run_ffmpeg(cmd, operation="thumbnail", video_id=video_id):
+                return result
+            
+            if outputs[0] != thumbnail_path:
+                # NumPy/Pillow are only loaded when scoring is used
+                from utils.frame_scorer import frame_scorer
+                
+                candidates = [path for path in outputs if os.path.exists(path)]
+                best = await asyncio.to_thread(frame_scorer.pick_best, candidates)
+                if best:
+                    shutil.move(best, thumbnail_path)
+                for path in candidates:
+                    if path != best and os.path.exists(path):
+                        os.remove(path)
+            
+            await asyncio.to_thread(
+                artifact_store.record_many,
+                video_id,
+                [(thumbnail_path, "thumbnail"), (storyboard_path, "thumbnail")]
+            )
+            if os.path.exists(thumbnail_path):
+                result["thumbnail_path"] = thumbnail_path
+            if make_storyboard and os.path.exists(storyboard_path):
+                result["storyboard_path"] = storyboard_path
             
+            return result
+        
         except Exception as e:
             logger.error(f"Error generating thumbnail: {str(e)}")
-            return None
+            return result
     
-    async def cleanup_temp_files(self, video_id: str):
-        """Clean up temporary files after processing"""
+    async def get_fallback_video(self, video_id: str) -> Optional[str]:
+        """
+        Get a fallback video (solid color or pattern) if stock fetch fails
+        """
+        output_path = scratch.path(video_id, "fallback.mp4")
+        cmd = [
+            'ffmpeg', '-y',
+            '-f', 'lavfi',
+            '-i', 'color=c=0x1a1a2e:s=1080x1920:d=10',
+            '-f', 'lavfi',
+            '-i', 'anoisesrc=a=0.1:c=pink',
+            '-shortest',
+            '-c:v', 'libx264',
+            '-preset', 'ultrafast',
+            '-crf', '28',
+            '-c:a', 'aac',
+            '-b:a', '128k',
+            output_path
+        ]
+        
+        # Without it the job has no footage at all, so the deadline leaves it its 10 seconds
+        if (
+            await self._run_ffmpeg(cmd, operation="fallback", video_id=video_id, min_timeout=10)
+            and os.path.exists(output_path)
+        ):
+            return output_path
+        logger.error(f"Error creating fallback video for {video_id}")
+        return None
+    
+    async def probe_duration(self, video_path: str) -> Optional[float]:
+        """Read a media file's duration in seconds with ffprobe"""
         try:
-            temp_patterns = [
-                f"{video_id}_concat",
-                f"{video_id}_with_audio",
-                f"{video_id}_scene_",
-                f"{video_id}_concat_list"
-            ]
-            
-            for filename in os.listdir(MEDIA_DIR):
-                for pattern in temp_patterns:
-                    if pattern in filename:
-                        filepath = os.path.join(MEDIA_DIR, filename)
-                        try:
-                            os.remove(filepath)
-                            logger.info(f"Cleaned up: {filepath}")
-                        except Exception as e:
-                            logger.warning(f"Failed to cleanup {filepath}: {e}")
-                            
+            process = await asyncio.create_subprocess_exec(
+                'ffprobe', '-v', 'error',
+                '-show_entries', 'format=duration',
+                '-of', 'default=noprint_wrappers=1:nokey=1',
+                video_path,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            stdout, _ = await asyncio.wait_for(process.communicate(), timeout=30)
+            if process.returncode == 0:
+                return float(stdout.decode().strip())
         except Exception as e:
-            logger.error(f"Error during cleanup: {str(e)}")
-
-
-# Singleton instance
-video_service = VideoService()
+            logger.warning(f"ffprobe failed for {video_path}: {e}")
+        
+        return None
+    
+    def _parse_timestamp(self, timestamp: str) -> float:
+        """Convert an HH:MM:SS(.ms) or plain seconds string to seconds"""
+        seconds = 0.0
+        for part in str(timestamp).split(':'):
+            seconds = seconds * 60 + float(part)
+        return seconds
+    
+    async def cleanup_temp_files(self, video_id: str):
+        """Clean up the job's intermediate files, as recorded in the artifact index"""
+        # The scratch directory is indexed now, at its final size
+        scratch_dir = scratch.location(video_id)
+        await asyncio.to_thread(artifact_store.record, video_id, scratch_dir, "temp")
+        await asyncio.to_thread(artifact_store.cleanup, video_id, TEMP_KINDS)
+        if os.path.isdir(scratch_dir):
+            # Could not be indexed, e.g. the job was deleted while running
+            await asyncio.to_thread(shutil.rmtree, scratch_dir, True)
@@ -0,0 +1,171 @@
+"""
+Tests for admission control and scheduling (utils.admission)
+
+From the backend directory:
+    python -m pytest tests        (or: python -m unittest discover tests)
+"""
+import time
+import asyncio
+import unittest
+from collections import deque
+
+from utils.admission import AdmissionController, QueueFullError
+from utils.metrics import JOBS_REJECTED_TOTAL
+
+
+async def noop():
+    pass
+
+
+def queues(**classes) -> dict:
+    """{'interactive': {'a': ['a1', 'a2']}} -> the controller's queue layout"""
+    return {
+        priority: {tenant: deque((video_id, noop) for video_id in ids) for tenant, ids in tenants.items()}
+        for priority, tenants in {"interactive": {}, "bulk": {}, **classes}.items()
+    }
+
+
+class PickTest(unittest.TestCase):
+
+    def setUp(self):
+        self.admission = AdmissionController(max_inflight=2, max_inflight_per_tenant=1)
+
+    def pick_all(self, queued: dict, running: dict = None, served: dict = None) -> list:
+        running = dict(running or {})
+        served = dict(served or {})
+        order = []
+        while True:
+            picked = self.admission._pick(queued, running, served)
+            if picked is None:
+                return order
+            order.append(picked[0])
+
+    def test_interactive_before_bulk(self):
+        queued = queues(interactive={"b": ["b1"]}, bulk={"a": ["a1", "a2"]})
+        self.assertEqual(self.pick_all(queued), ["b1", "a1", "a2"])
+
+    def test_least_served_tenant_goes_next(self):
+        queued = queues(interactive={"a": ["a1", "a2", "a3"], "b": ["b1"]})
+        # a has had two jobs started, b none: b goes first, then a's backlog
+        self.assertEqual(self.pick_all(queued, served={"a": 2, "b": 0}), ["b1", "a1", "a2", "a3"])
+
+    def test_ties_go_to_the_tenant_waiting_longest(self):
+        queued = queues(interactive={"a": ["a1", "a2"], "b": ["b1", "b2"]})
+        self.assertEqual(self.pick_all(queued), ["a1", "b1", "a2", "b2"])
+
+    def test_tenant_cap_applies_while_others_wait(self):
+        queued = queues(interactive={"a": ["a1"], "b": ["b1"]})
+        # a is less served but already holds its one slot, so b goes first
+        video_id, tenant, _ = self.admission._pick(queued, {"a": 1}, {"a": 0, "b": 5})
+        self.assertEqual((video_id, tenant), ("b1", "b"))
+
+    def test_tenant_cap_does_not_leave_slots_idle(self):
+        queued = queues(interactive={"a": ["a1"]})
+        # Only a is waiting: it gets another slot despite holding its share
+        video_id, tenant, _ = self.admission._pick(queued, {"a": 1}, {"a": 3})
+        self.assertEqual((video_id, tenant), ("a1", "a"))
+
+    def test_cap_is_per_class(self):
+        queued = queues(interactive={"a": ["a1"]}, bulk={"b": ["b1"]})
+        # b waits in a lower class, so it does not hold a back
+        video_id, _, _ = self.admission._pick(queued, {"a": 1}, {})
+        self.assertEqual(video_id, "a1")
+
+
+class DispatchPlanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.admission = AdmissionController(max_inflight=2, max_inflight_per_tenant=1)
+        self.admission._job_seconds = 120
+
+    def run_jobs(self, **started_ago: float):
+        now = time.monotonic()
+        for video_id, ago in started_ago.items():
+            self.admission._running[video_id] = (now - ago, video_id[0])
+
+    def plan(self) -> list:
+        return [(video_id, round(wait)) for video_id, wait in self.admission._dispatch_plan()]
+
+    def test_free_slots_start_at_once(self):
+        self.admission._queues = queues(interactive={"a": ["a1"], "b": ["b1"], "c": ["c1"]})
+        self.assertEqual(self.plan(), [("a1", 0), ("b1", 0), ("c1", 120)])
+
+    def test_waits_follow_slot_release(self):
+        # a's job frees its slot in 20 s, b's in 120 s
+        self.run_jobs(a0=100, b0=0)
+        self.admission._queues = queues(interactive={"a": ["a1", "a2"]}, bulk={"c": ["c1"]})
+        self.assertEqual(self.plan(), [("a1", 20), ("a2", 120), ("c1", 140)])
+
+    def test_released_share_goes_to_its_tenant(self):
+        # Both slots are held by a and b. When a's job ends, a is below its
+        # share again and, being less served, takes the slot ahead of c
+        self.run_jobs(a0=100, b0=60)
+        self.admission._served = {"a": 1, "b": 1, "c": 2}
+        self.admission._queues = queues(interactive={"c": ["c1"], "a": ["a1"], "b": ["b1"]})
+        self.assertEqual(self.plan(), [("a1", 20), ("b1", 60), ("c1", 140)])
+
+    def test_held_share_defers_the_tenant(self):
+        # a's slot frees first, but b still holds its share, so b's queued job
+        # waits for b's own slot instead of taking a's
+        self.run_jobs(a0=100, b0=0)
+        self.admission._served = {"b": 0, "c": 1}
+        self.admission._queues = queues(interactive={"b": ["b1"], "c": ["c1"]})
+        self.assertEqual(self.plan(), [("c1", 20), ("b1", 120)])
+
+    def test_queue_position_and_estimated_start(self):
+        self.run_jobs(a0=100, b0=0)
+        self.admission._queues = queues(interactive={"a": ["a1"]}, bulk={"c": ["c1"]})
+
+        self.assertEqual(self.admission.queue_position("a0"), 0)
+        self.assertEqual(self.admission.queue_position("a1"), 1)
+        self.assertEqual(self.admission.queue_position("c1"), 2)
+        self.assertIsNone(self.admission.queue_position("unknown"))
+        self.assertIsNone(self.admission.estimated_start("a0"))
+        self.assertLess(self.admission.estimated_start("a1"), self.admission.estimated_start("c1"))
+
+    def test_retry_after_is_the_first_free_slot(self):
+        self.run_jobs(a0=100, b0=0)
+        self.assertEqual(self.admission.retry_after(), 20)
+
+
+class SubmitTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_queue_full_is_rejected_once(self):
+        admission = AdmissionController(max_inflight=1, max_pending=1, max_pending_per_tenant=1)
+        release = asyncio.Event()
+        started = []
+
+        def job(video_id):
+            async def run():
+                started.append(video_id)
+                await release.wait()
+            return run
+
+        admission.submit("v1", job("v1"))
+        admission.submit("v2", job("v2"))
+        rejected = JOBS_REJECTED_TOTAL._value.get()
+        with self.assertRaises(QueueFullError) as caught:
+            admission.submit("v3", job("v3"))
+        self.assertEqual(JOBS_REJECTED_TOTAL._value.get(), rejected + 1)
+        self.assertGreaterEqual(caught.exception.retry_after, 1)
+        self.assertEqual(admission.queue_position("v2"), 1)
+
+        release.set()
+        while len(started) < 2:
+            await asyncio.sleep(0.01)
+        self.assertEqual(started, ["v1", "v2"])
+        await admission.shutdown()
+
+    async def test_other_tenant_is_admitted_when_one_tenant_is_full(self):
+        admission = AdmissionController(max_inflight=1, max_pending=5, max_pending_per_tenant=1)
+        admission.submit("a1", noop, tenant="a")
+        admission.submit("a2", noop, tenant="a")
+
+        self.assertTrue(admission.is_full("a"))
+        self.assertFalse(admission.is_full("b"))
+        admission.submit("b1", noop, tenant="b")
+        await admission.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+"""
+Tests for the job endpoints: idempotent creates, backpressure, batched
+status with ETags, and cancellation
+
+The app runs under FastAPI's TestClient on a throwaway SQLite database;
+process_video is replaced with a job that just waits, so no provider or
+FFmpeg is involved. From the backend directory:
+    python -m pytest tests        (or: python -m unittest discover tests)
+"""
+import os
+import asyncio
+import tempfile
+import unittest
+from unittest import mock
+
+# Settings are read at import, so point them at a scratch directory first
+_work_dir = tempfile.mkdtemp(prefix="faceless_api_test_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_work_dir, 'test.db')}"
+os.environ["MEDIA_DIR"] = os.path.join(_work_dir, "media")
+os.environ["SCRATCH_DIR"] = os.path.join(_work_dir, "scratch")
+os.makedirs(os.environ["MEDIA_DIR"], exist_ok=True)
+
+from fastapi.testclient import TestClient
+
+import main
+from database import SessionLocal, VideoDB
+
+
+async def waiting_job(**kwargs):
+    """Stands in for process_video: holds its slot until cancelled"""
+    await asyncio.sleep(3600)
+
+
+class ApiTestCase(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(main, "process_video", waiting_job)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = TestClient(main.app)
+        self.client.__enter__()
+        # Shutdown cancels the waiting jobs and empties the queue
+        self.addCleanup(self.client.__exit__, None, None, None)
+
+    def create(self, topic: str = "Facts about octopuses", key: str = None, tenant: str = None, **body):
+        headers = {}
+        if key is not None:
+            headers["Idempotency-Key"] = key
+        if tenant is not None:
+            headers["X-Tenant-ID"] = tenant
+        return self.client.post("/api/videos", json={"topic": topic, "duration": 30, **body}, headers=headers)
+
+    def job_count(self) -> int:
+        db = SessionLocal()
+        try:
+            return db.query(VideoDB).count()
+        finally:
+            db.close()
+
+
+class IdempotentCreateTest(ApiTestCase):
+
+    def test_replay_returns_the_original_job(self):
+        first = self.create(key="replay-1")
+        self.assertEqual(first.status_code, 200)
+        self.assertNotIn("Idempotent-Replayed", first.headers)
+        jobs = self.job_count()
+
+        again = self.create(key="replay-1")
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.headers["Idempotent-Replayed"], "true")
+        self.assertEqual(again.json()["id"], first.json()["id"])
+        self.assertEqual(self.job_count(), jobs)
+
+    def test_key_reused_with_another_body_is_rejected(self):
+        self.assertEqual(self.create(key="mismatch-1").status_code, 200)
+        response = self.create(topic="Something else entirely", key="mismatch-1")
+        self.assertEqual(response.status_code, 422)
+
+    def test_keys_are_per_tenant(self):
+        first = self.create(key="tenant-key", tenant="a")
+        second = self.create(key="tenant-key", tenant="b")
+        self.assertEqual(second.status_code, 200)
+        self.assertNotIn("Idempotent-Replayed", second.headers)
+        self.assertNotEqual(first.json()["id"], second.json()["id"])
+
+    def test_blank_key_is_rejected(self):
+        self.assertEqual(self.create(key=" ").status_code, 400)
+
+    def test_concurrent_retry_replays_after_integrity_error(self):
+        first = self.create(key="race-1")
+        jobs = self.job_count()
+        real_find = main._find_idempotent_job
+        calls = []
+
+        def find_after_the_race(*args):
+            # The first lookup runs before the other request has committed
+            calls.append(args)
+            return None if len(calls) == 1 else real_find(*args)
+
+        with mock.patch.object(main, "_find_idempotent_job", find_after_the_race):
+            again = self.create(key="race-1")
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.headers["Idempotent-Replayed"], "true")
+        self.assertEqual(again.json()["id"], first.json()["id"])
+        self.assertEqual(self.job_count(), jobs)
+
+
+class BackpressureTest(ApiTestCase):
+
+    def test_full_queue_answers_429_with_retry_after(self):
+        with mock.patch.multiple(main.admission, max_inflight=1, max_pending=0):
+            self.assertEqual(self.create().status_code, 200)
+            jobs = self.job_count()
+
+            response = self.create(topic="One job too many", key="full-1")
+            self.assertEqual(response.status_code, 429)
+            self.assertGreaterEqual(int(response.headers["Retry-After"]), 1)
+            # The rejected job is not kept, so a retry with its key is admitted afresh
+            self.assertEqual(self.job_count(), jobs)
+
+
+class StatusBatchTest(ApiTestCase):
+
+    def test_etag_revalidation(self):
+        ids = [self.create(topic=f"Status topic {i}").json()["id"] for i in range(2)]
+        url = f"/api/videos/status?ids={','.join(ids)},unknown-id"
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([v["id"] for v in response.json()["videos"]], ids)
+        self.assertEqual(response.json()["missing"], ["unknown-id"])
+        etag = response.headers["ETag"]
+        self.assertTrue(etag.startswith('W/"'))
+
+        unchanged = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(unchanged.status_code, 304)
+        self.assertEqual(unchanged.content, b"")
+        self.assertEqual(unchanged.headers["ETag"], etag)
+
+        self.client.post(f"/api/videos/{ids[1]}/cancel")
+        changed = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers["ETag"], etag)
+
+    def test_ids_are_required(self):
+        self.assertEqual(self.client.get("/api/videos/status?ids=,").status_code, 400)
+
+
+class CancelTest(ApiTestCase):
+
+    def test_cancel_running_and_queued_jobs(self):
+        with mock.patch.multiple(main.admission, max_inflight=1, max_pending=5):
+            running = self.create(topic="Running job").json()["id"]
+            queued = self.create(topic="Queued job").json()["id"]
+            self.assertEqual(self.client.get(f"/api/videos/{queued}").json()["queue_position"], 1)
+
+            for video_id in (queued, running):
+                response = self.client.post(f"/api/videos/{video_id}/cancel")
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()["status"], "cancelled")
+                self.assertIsNone(main.admission.queue_position(video_id))
+
+    def test_second_cancel_conflicts(self):
+        video_id = self.create(topic="Cancel me twice").json()["id"]
+        self.assertEqual(self.client.post(f"/api/videos/{video_id}/cancel").status_code, 200)
+        self.assertEqual(self.client.post(f"/api/videos/{video_id}/cancel").status_code, 409)
+
+    def test_unknown_job(self):
+        self.assertEqual(self.client.post("/api/videos/unknown-id/cancel").status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
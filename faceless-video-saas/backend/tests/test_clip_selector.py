@@ -0,0 +1,77 @@
+"""
+Tests for stock clip selection (utils.clip_selector)
+
+From the backend directory:
+    python -m pytest tests        (or: python -m unittest discover tests)
+"""
+import unittest
+
+from utils.clip_selector import ClipSelector
+
+PORTRAIT = (1080, 1920)
+
+
+def clip(width: int, height: int, duration: float = 10, **extra) -> dict:
+    return {"url": f"https://example.com/{width}x{height}_{duration}.mp4", "width": width, "height": height,
+            "duration": duration, **extra}
+
+
+class ClipSelectorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.selector = ClipSelector()
+
+    def select(self, candidates: list, scene_duration: float = 5, target_size=PORTRAIT) -> dict:
+        return self.selector.select(candidates, scene_duration, target_size)
+
+    def test_covering_the_scene_comes_first(self):
+        short = clip(1080, 1920, duration=3)
+        long_enough = clip(1920, 1080, duration=8)
+        # Landscape is worse than portrait, but a clip that ends early is worse still
+        self.assertIs(self.select([short, long_enough]), long_enough)
+
+    def test_orientation_before_resolution(self):
+        landscape = clip(1920, 1080)
+        portrait = clip(540, 960)
+        self.assertIs(self.select([landscape, portrait]), portrait)
+
+    def test_smallest_rendition_that_fills_the_frame(self):
+        renditions = [clip(2160, 3840), clip(1080, 1920), clip(720, 1280), clip(1440, 2560)]
+        self.assertIs(self.select(renditions), renditions[1])
+
+    def test_largest_rendition_when_none_fills_the_frame(self):
+        renditions = [clip(360, 640), clip(720, 1280), clip(540, 960)]
+        self.assertIs(self.select(renditions), renditions[1])
+
+    def test_oversized_only_when_nothing_smaller_matches(self):
+        uhd = clip(2160, 3840)
+        small = clip(540, 960)
+        # 4K fills the frame and the small one does not, but 4K is not worth downloading
+        self.assertIs(self.select([uhd, small]), small)
+        self.assertIs(self.select([uhd, clip(1920, 1080)]), uhd)
+
+    def test_output_frame_raises_the_size_limit(self):
+        uhd = clip(2160, 3840)
+        self.assertIs(self.select([uhd, clip(1080, 1920)], target_size=(2160, 3840)), uhd)
+
+    def test_ties_go_to_fewer_bytes_then_provider_rank(self):
+        first = clip(1080, 1920, size_bytes=9_000_000)
+        second = clip(1080, 1920, size_bytes=4_000_000)
+        third = clip(1080, 1920, size_bytes=4_000_000)
+        self.assertIs(self.select([first, second, third]), second)
+
+    def test_unusable_candidates_are_skipped(self):
+        usable = clip(720, 1280)
+        candidates = [{"url": None, "width": 1080, "height": 1920}, {"url": "x", "width": 0, "height": 0}, usable]
+        self.assertIs(self.select(candidates), usable)
+        self.assertIsNone(self.select([]))
+
+    def test_cost_orders_criteria_by_importance(self):
+        cost = self.selector._cost(clip(1080, 1920, duration=2), 0, 5, PORTRAIT)
+        self.assertEqual(cost[:4], (True, False, False, False))
+        cost = self.selector._cost(clip(720, 1280), 3, 5, PORTRAIT)
+        self.assertEqual(cost, (False, False, False, True, -720 * 1280, 0, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
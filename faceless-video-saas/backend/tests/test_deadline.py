@@ -0,0 +1,136 @@
+"""
+Tests for the per-job deadline budget (utils.deadline)
+
+The clock is replaced with a counter the tests move by hand. From the
+backend directory:
+    python -m pytest tests        (or: python -m unittest discover tests)
+"""
+import math
+import asyncio
+import unittest
+from unittest import mock
+
+from utils import deadline as deadline_module
+from utils.deadline import JobDeadline, deadlines, STAGE_SHARES, MIN_CALL_SECONDS
+
+
+def later_shares(stage: str) -> float:
+    stages = list(STAGE_SHARES)
+    return sum(STAGE_SHARES[s] for s in stages[stages.index(stage):])
+
+
+class ClockTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(deadline_module.time, "monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class StageBudgetTest(ClockTestCase):
+
+    def test_first_stage_gets_its_share(self):
+        deadline = JobDeadline("v", 100)
+        self.assertAlmostEqual(deadline.stage_budget("script"), 100 * STAGE_SHARES["script"])
+
+    def test_later_stage_splits_what_is_left(self):
+        deadline = JobDeadline("v", 100)
+        # script overran: 40 s are gone, and the render gets its share of the
+        # remaining 60 s among itself and the thumbnail
+        self.now += 40
+        render, thumbnail = STAGE_SHARES["render"], STAGE_SHARES["thumbnail"]
+        self.assertAlmostEqual(deadline.stage_budget("render"), 60 * render / (render + thumbnail))
+
+    def test_last_stage_gets_everything_left(self):
+        deadline = JobDeadline("v", 100)
+        self.now += 90
+        self.assertAlmostEqual(deadline.stage_budget("thumbnail"), 10)
+
+    def test_budgets_add_up_to_the_job(self):
+        deadline = JobDeadline("v", 100)
+        total = 0.0
+        for stage in STAGE_SHARES:
+            budget = deadline.stage_budget(stage)
+            total += budget
+            self.now += budget
+        self.assertAlmostEqual(total, 100)
+
+    def test_past_the_deadline_there_is_no_budget(self):
+        deadline = JobDeadline("v", 100)
+        self.now += 150
+        self.assertEqual(deadline.stage_budget("render"), 0.0)
+
+    def test_unknown_stage_and_no_deadline(self):
+        self.assertAlmostEqual(JobDeadline("v", 100).stage_budget("cleanup"), 100)
+        self.assertTrue(math.isinf(JobDeadline("v", 0).stage_budget("render")))
+
+
+class DeadlinesTest(ClockTestCase):
+
+    def test_without_a_job_nothing_is_cut(self):
+        self.assertEqual(deadlines.timeout(60.0), 60.0)
+        self.assertEqual(deadlines.job_timeout(300.0), 300.0)
+        self.assertIsNone(deadlines.stage_budget("render"))
+        self.assertFalse(deadlines.exhausted())
+        self.assertFalse(deadlines.job_exhausted())
+        self.assertEqual(deadlines.degradations(), [])
+
+    def test_timeout_follows_the_stage_budget(self):
+        with deadlines.job("v", 100), deadlines.stage("script"):
+            self.assertAlmostEqual(deadlines.timeout(60.0), 100 * STAGE_SHARES["script"])
+            self.assertEqual(deadlines.timeout(10.0), 10.0)
+            # Out of budget, a call still gets the minimum
+            self.now += 20
+            self.assertTrue(deadlines.exhausted())
+            self.assertFalse(deadlines.job_exhausted())
+            self.assertEqual(deadlines.timeout(60.0), MIN_CALL_SECONDS)
+
+    def test_job_timeout_keeps_its_floor(self):
+        with deadlines.job("v", 100), deadlines.stage("render"):
+            self.assertEqual(deadlines.job_timeout(300.0), 100)
+            self.now += 99
+            self.assertEqual(deadlines.job_timeout(300.0), MIN_CALL_SECONDS)
+            self.assertEqual(deadlines.job_timeout(300.0, floor=120), 120)
+            self.now += 2
+            self.assertTrue(deadlines.job_exhausted())
+
+    def test_stage_ends_with_the_job(self):
+        with deadlines.job("v", 100):
+            self.now += 98
+            with deadlines.stage("thumbnail"):
+                self.assertEqual(deadlines.timeout(60.0), MIN_CALL_SECONDS)
+                self.now += 2
+                self.assertTrue(deadlines.exhausted())
+
+    def test_degradations_are_recorded_on_the_job(self):
+        with deadlines.job("v", 100) as deadline:
+            deadlines.degrade("render", "no preview")
+            self.assertEqual(deadlines.degradations(), ["render: no preview"])
+        self.assertEqual(deadline.degradations, ["render: no preview"])
+        self.assertEqual(deadlines.degradations(), [])
+
+
+class ConcurrentStagesTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_each_task_keeps_its_own_stage_budget(self):
+        async def stage(name: str) -> float:
+            with deadlines.stage(name):
+                await asyncio.sleep(0)
+                return deadlines.timeout(math.inf)
+
+        with deadlines.job("v", 100):
+            tts, clips = await asyncio.gather(
+                asyncio.create_task(stage("tts")),
+                asyncio.create_task(stage("clips"))
+            )
+            # Outside any stage, calls are bounded by the job alone
+            self.assertAlmostEqual(deadlines.timeout(math.inf), 100, places=1)
+
+        # Started together, so both split the same 100 s from their own stage on
+        self.assertAlmostEqual(tts, 100 * STAGE_SHARES["tts"] / later_shares("tts"), places=1)
+        self.assertAlmostEqual(clips, 100 * STAGE_SHARES["clips"] / later_shares("clips"), places=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,199 @@
+"""
+Tests for the streamed script generation (ScriptService.stream_script)
+
+The HuggingFace endpoint is replaced with an httpx.MockTransport, which can
+break a stream off at a chosen token; one test streams from the benchmark
+stand-in over a local socket instead. Both run offline. From the backend
+directory:
+    python -m pytest tests        (or: python -m unittest discover tests)
+"""
+import json
+import unittest
+from unittest import mock
+
+import httpx
+
+from benchmarks.stand_ins import StandInServer, HuggingFaceHandler
+from services import script_service
+from services.script_service import ScriptService
+from utils.deadline import deadlines
+
+SCRIPT = (
+    "One fish swims here. Two fish swim there. "
+    "Red fish are bright. Blue fish are calm. "
+    "Old fish are wise. New fish are fast."
+)
+
+
+class TokenStream(httpx.AsyncByteStream):
+    """Server-sent token events for a text, optionally breaking off after some tokens"""
+
+    def __init__(self, text: str, break_after: int = None):
+        self.words = text.split(" ")
+        self.break_after = break_after
+
+    async def __aiter__(self):
+        for i, word in enumerate(self.words):
+            if i == self.break_after:
+                raise httpx.ReadError("connection reset")
+            token = {"text": word if i == 0 else " " + word}
+            yield f"data:{json.dumps({'token': token})}\n\n".encode()
+        yield f"data:{json.dumps({'token': {'text': '</s>', 'special': True}})}\n\n".encode()
+
+
+def streaming_endpoint(break_after: int = None, fail_stream: bool = False):
+    """Handler answering "stream": true with tokens and plain requests with JSON"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        if json.loads(request.content).get("stream"):
+            if fail_stream:
+                raise httpx.ConnectError("connection refused")
+            return httpx.Response(
+                200,
+                headers={"content-type": "text/event-stream"},
+                stream=TokenStream(SCRIPT, break_after)
+            )
+        return httpx.Response(200, json=[{"generated_text": SCRIPT}])
+    return handler
+
+
+def unreachable_endpoint(request: httpx.Request) -> httpx.Response:
+    raise httpx.ConnectError("connection refused")
+
+
+def non_streaming_endpoint(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(200, json=[{"generated_text": SCRIPT}])
+
+
+class CompleteScenesTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(unreachable_endpoint))
+        self.addAsyncCleanup(client.aclose)
+        self.service = ScriptService(client)
+
+    def test_last_sentence_is_held_back(self):
+        # The fourth sentence may still be growing, so only the first scene is done
+        scenes = self.service._complete_scenes("One fish swims here. Two fish swim there. Red fish are bright. Blue fish")
+        self.assertEqual([scene["text"] for scene in scenes], ["One fish swims here. Two fish swim there."])
+
+        scenes = self.service._complete_scenes("One fish swims here. Two fish swim there. Red fish are bright. Blue fish are calm.")
+        self.assertEqual(len(scenes), 1)
+
+    def test_incomplete_scene_is_held_back(self):
+        self.assertEqual(self.service._complete_scenes("One fish swims here. Two fish"), [])
+        self.assertEqual(self.service._complete_scenes(""), [])
+
+    def test_matches_split_of_the_finished_script(self):
+        scenes = self.service._complete_scenes(SCRIPT + " And")
+        self.assertEqual(scenes, self.service._split_into_scenes(SCRIPT))
+
+
+class StreamScriptTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.emitted = []
+        # No real backoff between generate_script retries
+        patcher = mock.patch.object(script_service.asyncio, "sleep", mock.AsyncMock())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def on_scene(self, scene: dict):
+        self.emitted.append(scene)
+
+    async def stream(self, handler) -> tuple:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            self.service = ScriptService(client)
+            with deadlines.job("test-video", 60) as deadline:
+                result = await self.service.stream_script("fish", 30, on_scene=self.on_scene)
+        return result, deadline.degradations
+
+    async def test_full_stream(self):
+        result, degradations = await self.stream(streaming_endpoint())
+
+        expected = self.service._split_into_scenes(SCRIPT)
+        self.assertEqual(result["scenes"], expected)
+        self.assertEqual(result["full_script"], SCRIPT)
+        # Each scene is handed out once, in order
+        self.assertEqual(self.emitted, expected)
+        self.assertEqual(degradations, [])
+
+    async def test_non_streaming_reply(self):
+        result, degradations = await self.stream(non_streaming_endpoint)
+
+        self.assertEqual(result["full_script"], SCRIPT)
+        self.assertEqual(self.emitted, result["scenes"])
+        self.assertEqual(len(result["scenes"]), 3)
+        self.assertEqual(degradations, [])
+
+    async def test_interrupted_stream_keeps_emitted_scenes(self):
+        # Breaks off on the fifth sentence's second word: two scenes are complete
+        result, degradations = await self.stream(streaming_endpoint(break_after=17))
+
+        self.assertEqual([scene["scene_number"] for scene in result["scenes"]], [1, 2])
+        self.assertEqual(self.emitted, result["scenes"])
+        self.assertEqual(
+            result["full_script"],
+            "One fish swims here. Two fish swim there. Red fish are bright. Blue fish are calm."
+        )
+        self.assertNotIn("fallback", result)
+        self.assertEqual(degradations, ["script: partial script (2 scenes, stream interrupted)"])
+
+    async def test_failure_before_first_scene_retries_without_streaming(self):
+        result, degradations = await self.stream(streaming_endpoint(fail_stream=True))
+
+        self.assertEqual(result["full_script"], SCRIPT)
+        self.assertNotIn("fallback", result)
+        self.assertEqual(self.emitted, result["scenes"])
+        self.assertEqual(degradations, [])
+
+    async def test_interrupted_before_first_scene_falls_back(self):
+        result, degradations = await self.stream(streaming_endpoint(break_after=3))
+
+        self.assertEqual(result["full_script"], SCRIPT)
+        self.assertEqual(self.emitted, result["scenes"])
+        self.assertEqual(degradations, [])
+
+    async def test_unreachable_endpoint_uses_template(self):
+        result, degradations = await self.stream(unreachable_endpoint)
+
+        self.assertTrue(result["fallback"])
+        self.assertIn("fish", result["full_script"])
+        self.assertEqual(self.emitted, result["scenes"])
+        self.assertEqual(degradations, ["script: fallback script (generation failed)"])
+
+
+class StandInStreamTest(unittest.IsolatedAsyncioTestCase):
+    """Streams over HTTP from the HuggingFace stand-in the pipeline benchmark uses"""
+
+    async def asyncSetUp(self):
+        # Tokens spread over 0.3 s, as text-generation-inference sends them
+        self.server = StandInServer("huggingface", HuggingFaceHandler, 0.3, {}).start()
+        self.addCleanup(self.server.stop)
+        patcher = mock.patch.object(script_service, "HF_API_URL", f"{self.server.base_url}/models/test")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_stream_from_the_stand_in(self):
+        emitted = []
+
+        async def on_scene(scene: dict):
+            emitted.append(scene)
+
+        # trust_env=False keeps a configured proxy out of the loopback requests
+        async with httpx.AsyncClient(trust_env=False) as client:
+            service = ScriptService(client)
+            with deadlines.job("test-video", 60) as deadline:
+                result = await service.stream_script("octopuses", 30, on_scene=on_scene)
+
+        # One streamed request, with no retry of the whole script
+        self.assertEqual(self.server.requests, 1)
+        self.assertNotIn("fallback", result)
+        self.assertTrue(result["full_script"].startswith("This is why octopuses will change"))
+        self.assertTrue(result["full_script"].endswith("Follow for more amazing content like this!"))
+        self.assertEqual(result["scenes"], service._split_into_scenes(result["full_script"]))
+        self.assertEqual(emitted, result["scenes"])
+        self.assertEqual(deadline.degradations, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+"""
+Tests for the pipeline stage executor (utils.stage_graph)
+
+From the backend directory:
+    python -m pytest tests        (or: python -m unittest discover tests)
+"""
+import asyncio
+import unittest
+
+from utils.stage_graph import StageGraph
+
+
+class StageGraphTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.events = []
+
+    def stage(self, name: str, wait: asyncio.Event = None, fail: Exception = None):
+        """A stage that logs its start and end, optionally waiting for an event or failing"""
+        async def run(results: dict):
+            self.events.append(f"{name} start")
+            try:
+                if wait is not None:
+                    await wait.wait()
+                else:
+                    await asyncio.sleep(0)
+                if fail is not None:
+                    raise fail
+            except asyncio.CancelledError:
+                self.events.append(f"{name} cancelled")
+                raise
+            self.events.append(f"{name} end")
+            # The stages that had finished when this one ran
+            return set(results)
+        return run
+
+    async def test_stages_wait_for_their_dependencies(self):
+        graph = StageGraph("test-video")
+        graph.add("script", self.stage("script"))
+        graph.add("tts", self.stage("tts"), after=["script"])
+        graph.add("clips", self.stage("clips"))
+        graph.add("render", self.stage("render"), after=["clips", "tts"])
+
+        results = await graph.run()
+
+        # Each stage sees the results of its dependencies
+        self.assertLessEqual({"script"}, results["tts"])
+        self.assertLessEqual({"script", "clips", "tts"}, results["render"])
+        for before, after in [("script", "tts"), ("tts", "render"), ("clips", "render")]:
+            self.assertLess(self.events.index(f"{before} end"), self.events.index(f"{after} start"))
+        self.assertEqual(set(graph.timings), {"script", "tts", "clips", "render"})
+
+    async def test_independent_stages_overlap(self):
+        clips_started = asyncio.Event()
+
+        async def script(results: dict):
+            # Only finishes once clips is running alongside it
+            await clips_started.wait()
+            return "script"
+
+        async def clips(results: dict):
+            clips_started.set()
+            return "clips"
+
+        graph = StageGraph("test-video").add("script", script).add("clips", clips)
+        results = await asyncio.wait_for(graph.run(), timeout=5)
+        self.assertEqual(results, {"script": "script", "clips": "clips"})
+
+    async def test_failure_cancels_running_siblings(self):
+        never = asyncio.Event()
+        graph = StageGraph("test-video")
+        graph.add("script", self.stage("script", fail=RuntimeError("no script")))
+        graph.add("clips", self.stage("clips", wait=never))
+        graph.add("tts", self.stage("tts"), after=["script"])
+
+        with self.assertRaises(RuntimeError):
+            await asyncio.wait_for(graph.run(), timeout=5)
+
+        self.assertIn("clips cancelled", self.events)
+        # A stage whose dependency failed never starts
+        self.assertNotIn("tts start", self.events)
+
+    async def test_first_error_surfaces(self):
+        second_may_fail = asyncio.Event()
+
+        async def first(results: dict):
+            second_may_fail.set()
+            raise ValueError("first")
+
+        async def second(results: dict):
+            await second_may_fail.wait()
+            await asyncio.sleep(0)
+            raise KeyError("second")
+
+        graph = StageGraph("test-video").add("first", first).add("second", second)
+        with self.assertRaises(ValueError) as caught:
+            await asyncio.wait_for(graph.run(), timeout=5)
+        self.assertEqual(str(caught.exception), "first")
+
+    def test_unknown_and_duplicate_stages_are_rejected(self):
+        graph = StageGraph("test-video").add("script", self.stage("script"))
+        with self.assertRaises(ValueError):
+            graph.add("tts", self.stage("tts"), after=["narration"])
+        with self.assertRaises(ValueError):
+            graph.add("script", self.stage("script"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+"""
+Tests for subtitle timing against the narration (utils.subtitle_aligner)
+
+From the backend directory:
+    python -m pytest tests        (or: python -m unittest discover tests)
+"""
+import unittest
+
+import numpy as np
+
+from utils.subtitle_aligner import SubtitleAligner, SAMPLE_RATE, MIN_CAPTION_SECONDS
+
+
+def tone(seconds: float) -> np.ndarray:
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def silence(seconds: float) -> np.ndarray:
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+
+
+class SpeechSpansTest(unittest.TestCase):
+
+    def setUp(self):
+        self.aligner = SubtitleAligner()
+
+    def test_pauses_split_speech(self):
+        samples = np.concatenate([silence(0.5), tone(1.0), silence(0.5), tone(1.5), silence(0.3)])
+        spans = self.aligner.speech_spans(samples)
+        np.testing.assert_allclose(spans, [[0.5, 1.5], [2.0, 3.5]], atol=0.02)
+
+    def test_short_gaps_are_not_pauses(self):
+        samples = np.concatenate([tone(1.0), silence(0.05), tone(1.0), silence(0.5)])
+        self.assertEqual(len(self.aligner.speech_spans(samples)), 1)
+
+    def test_silence_has_no_speech(self):
+        self.assertEqual(len(self.aligner.speech_spans(silence(2.0))), 0)
+
+
+class LayoutTest(unittest.TestCase):
+
+    def setUp(self):
+        self.aligner = SubtitleAligner()
+
+    def assert_contiguous(self, timings: list, start: float, end: float):
+        self.assertAlmostEqual(timings[0][0], start)
+        self.assertAlmostEqual(timings[-1][1], end)
+        for (_, previous_end), (next_start, _) in zip(timings, timings[1:]):
+            self.assertAlmostEqual(previous_end, next_start)
+
+    def test_chunks_follow_their_length(self):
+        timings = self.aligner._layout(np.array([[0.0, 3.0]]), ["a" * 10, "b" * 20])
+        self.assertEqual(len(timings), 2)
+        self.assertAlmostEqual(timings[0][1], 1.0)
+        self.assert_contiguous(timings, 0.0, 3.0)
+
+    def test_pauses_take_no_caption_time(self):
+        # 2 s of speech with a 1 s pause: the midpoint of speech time is the pause
+        timings = self.aligner._layout(np.array([[0.0, 1.0], [2.0, 3.0]]), ["a" * 10, "b" * 10])
+        self.assertAlmostEqual(timings[0][1], 2.0)
+
+    def test_boundary_snaps_to_the_end_of_a_pause(self):
+        # By length the boundary is at 1.1 s, 0.5 s before the next phrase starts
+        timings = self.aligner._layout(np.array([[0.0, 1.2], [1.6, 3.0]]), ["a" * 11, "b" * 15])
+        self.assertAlmostEqual(timings[0][1], 1.6)
+        self.assert_contiguous(timings, 0.0, 3.0)
+
+    def test_clash_keeps_the_minimum_duration(self):
+        # Both boundaries fall just before the pause ending at 1.5 s. The first
+        # snaps to it; the second, left behind it, used to collapse onto it
+        spans = np.array([[0.0, 1.0], [1.5, 3.0]])
+        timings = self.aligner._layout(spans, ["a" * 92, "b" * 6, "c" * 152])
+
+        self.assertAlmostEqual(timings[0][1], 1.5)
+        for start, end in timings:
+            self.assertGreaterEqual(end - start, MIN_CAPTION_SECONDS - 1e-9)
+        self.assert_contiguous(timings, 0.0, 3.0)
+
+    def test_short_narration_splits_evenly(self):
+        # Too short for MIN_CAPTION_SECONDS each: every caption gets an equal share
+        timings = self.aligner._layout(np.array([[0.0, 0.6]]), ["a", "b", "c"])
+        for start, end in timings:
+            self.assertAlmostEqual(end - start, 0.2)
+
+    def test_single_chunk_covers_the_speech(self):
+        self.assertEqual(self.aligner._layout(np.array([[0.2, 2.0]]), ["only"]), [(0.2, 2.0)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,320 @@
+"""
+Admission control and scheduling for video jobs
+
+At most MAX_INFLIGHT_JOBS pipelines run at once; further jobs wait in a
+bounded queue of MAX_PENDING_JOBS (and MAX_PENDING_PER_TENANT per tenant).
+When the queue is full new jobs are rejected, and the caller answers 429
+with a Retry-After estimate.
+
+Queued jobs are scheduled by class first ('interactive' before 'bulk') and
+fair-share across tenants within a class: the waiting tenant that has had
+the fewest jobs started goes next, so one tenant's backlog cannot delay
+everyone else. A tenant that already holds MAX_INFLIGHT_PER_TENANT slots
+only gets another one when no other tenant in the class is waiting.
+Queue position and estimated start time are estimates: the dispatch order
+is replayed assuming every job takes the running average duration, with
+each finished job freeing its slot (and its tenant's share) for the next
+pick, and nothing else arriving.
+"""
+import os
+import math
+import time
+import heapq
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from utils.metrics import JOBS_INFLIGHT, JOBS_QUEUED, JOBS_REJECTED_TOTAL
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAX_INFLIGHT_JOBS = max(1, int(os.getenv("MAX_INFLIGHT_JOBS", "2")))
+MAX_PENDING_JOBS = max(0, int(os.getenv("MAX_PENDING_JOBS", "20")))
+# Per-tenant limits, so one tenant cannot fill the queue or hold every slot
+MAX_PENDING_PER_TENANT = max(0, int(os.getenv("MAX_PENDING_PER_TENANT", "10")))
+MAX_INFLIGHT_PER_TENANT = max(1, int(os.getenv("MAX_INFLIGHT_PER_TENANT", "1")))
+# Initial estimate of one job's duration, refined from finished jobs (seconds)
+JOB_ESTIMATE_SECONDS = float(os.getenv("JOB_ESTIMATE_SECONDS", "120"))
+
+# Scheduling classes, highest priority first
+PRIORITY_CLASSES = ["interactive", "bulk"]
+DEFAULT_TENANT = "default"
+
+# Weight of a finished job in the duration estimate
+ESTIMATE_SMOOTHING = 0.2
+
+Job = Callable[[], Awaitable[None]]
+TenantQueues = Dict[str, Deque[Tuple[str, Job]]]
+
+
+class QueueFullError(Exception):
+    """Raised when the pending queue is full; retry_after is in seconds"""
+    
+    def __init__(self, retry_after: int):
+        super().__init__(f"Job queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bound concurrent pipelines and schedule the queued rest fairly"""
+    
+    def __init__(
+        self,
+        max_inflight: int = MAX_INFLIGHT_JOBS,
+        max_pending: int = MAX_PENDING_JOBS,
+        max_pending_per_tenant: int = MAX_PENDING_PER_TENANT,
+        max_inflight_per_tenant: int = MAX_INFLIGHT_PER_TENANT
+    ):
+        self.max_inflight = max_inflight
+        self.max_pending = max_pending
+        self.max_pending_per_tenant = max_pending_per_tenant
+        self.max_inflight_per_tenant = max_inflight_per_tenant
+        # class -> tenant -> queued (video_id, job)
+        self._queues: Dict[str, TenantQueues] = {priority: {} for priority in PRIORITY_CLASSES}
+        # video_id -> (start time, tenant)
+        self._running: Dict[str, Tuple[float, str]] = {}
+        # Jobs started per active tenant, the fair-share key
+        self._served: Dict[str, int] = {}
+        # Keep references so running tasks are not garbage collected
+        self._tasks: Set[asyncio.Task] = set()
+        # video_id -> task of a running job, so it can be cancelled
+        self._job_tasks: Dict[str, asyncio.Task] = {}
+        self._job_seconds = JOB_ESTIMATE_SECONDS
+    
+    def submit(
+        self,
+        video_id: str,
+        job: Job,
+        priority: str = PRIORITY_CLASSES[0],
+        tenant: str = DEFAULT_TENANT
+    ):
+        """
+        Admit a job: start it now if a slot is free, otherwise queue it
+        
+        Args:
+            video_id: Job ID
+            job: Called with no arguments to create the job's coroutine
+            priority: Scheduling class, one of PRIORITY_CLASSES
+            tenant: Tenant the job belongs to
+        
+        Raises:
+            QueueFullError: No slot is free and the queue (or the tenant's share) is full
+        """
+        if self.is_full(tenant):
+            JOBS_REJECTED_TOTAL.inc()
+            retry_after = self.retry_after()
+            logger.warning(f"[{video_id}] Job queue full, rejecting (retry after {retry_after}s)")
+            raise QueueFullError(retry_after)
+        
+        if priority not in self._queues:
+            priority = PRIORITY_CLASSES[-1]
+        if tenant not in self._active_tenants():
+            # Returning tenants start level with the others instead of cashing in idle time
+            self._served[tenant] = min(self._served.values(), default=0)
+        self._queues[priority].setdefault(tenant, deque()).append((video_id, job))
+        self._dispatch()
+    
+    def is_full(self, tenant: str = DEFAULT_TENANT) -> bool:
+        """Whether a new job for this tenant would be rejected right now"""
+        if len(self._running) < self.max_inflight:
+            return False
+        tenant_queued = sum(len(tenants.get(tenant, ())) for tenants in self._queues.values())
+        return len(self._queued_ids()) >= self.max_pending or tenant_queued >= self.max_pending_per_tenant
+    
+    async def cancel(self, video_id: str, timeout: float = 30) -> bool:
+        """
+        Stop a job: drop it from the queue, or cancel its running task
+        
+        A running job's task is cancelled and awaited (up to timeout
+        seconds), so its HTTP requests and FFmpeg processes are aborted and
+        its slot is free when this returns.
+        
+        Returns:
+            True if the job was queued or running
+        """
+        if self._dequeue(video_id):
+            return True
+        
+        task = self._job_tasks.get(video_id)
+        if task is None:
+            return False
+        task.cancel()
+        await asyncio.wait([task], timeout=timeout)
+        logger.info(f"[{video_id}] Running job cancelled")
+        return True
+    
+    def _dequeue(self, video_id: str) -> bool:
+        """Drop a job that has not started yet; returns True if it was queued"""
+        for tenants in self._queues.values():
+            for tenant, queue in tenants.items():
+                for entry in queue:
+                    if entry[0] == video_id:
+                        queue.remove(entry)
+                        if not queue:
+                            del tenants[tenant]
+                        self._update_gauges()
+                        return True
+        return False
+    
+    def queue_position(self, video_id: str) -> Optional[int]:
+        """1-based position in the dispatch order, 0 if running, None if unknown"""
+        if video_id in self._running:
+            return 0
+        order = [queued_id for queued_id, _ in self._dispatch_plan()]
+        if video_id in order:
+            return order.index(video_id) + 1
+        return None
+    
+    def estimated_start(self, video_id: str) -> Optional[datetime]:
+        """When a queued job is expected to start (None unless it is queued)"""
+        for queued_id, wait in self._dispatch_plan():
+            if queued_id == video_id:
+                return datetime.utcnow() + timedelta(seconds=wait)
+        return None
+    
+    def retry_after(self) -> int:
+        """Seconds until a queue slot is expected to free up"""
+        return max(1, math.ceil(min(free_in for free_in, _ in self._slots())))
+    
+    def _slots(self) -> List[Tuple[float, str]]:
+        """(seconds until free, tenant holding it) per slot; free slots have tenant ''"""
+        now = time.monotonic()
+        slots = [
+            (max(0.0, self._job_seconds - (now - start)), tenant) for start, tenant in self._running.values()
+        ]
+        slots += [(0.0, "")] * (self.max_inflight - len(slots))
+        return slots
+    
+    def _pick(
+        self,
+        queues: Dict[str, TenantQueues],
+        running: Dict[str, int],
+        served: Dict[str, int]
+    ) -> Optional[Tuple[str, str, Job]]:
+        """
+        Pop the next job to run from queues (mutated in place, as is served)
+        
+        Highest class first; within a class the least-served tenant that is
+        below its in-flight share, or the least-served tenant overall if all
+        of them are at their share (so idle slots are still used). Ties go to
+        the tenant that has been waiting longest.
+        """
+        for tenants in queues.values():
+            if not tenants:
+                continue
+            candidates = [t for t in tenants if running.get(t, 0) < self.max_inflight_per_tenant] or list(tenants)
+            tenant = min(candidates, key=lambda t: served.get(t, 0))
+            queue = tenants[tenant]
+            video_id, job = queue.popleft()
+            if not queue:
+                del tenants[tenant]
+            served[tenant] = served.get(tenant, 0) + 1
+            return video_id, tenant, job
+        return None
+    
+    def _dispatch_plan(self) -> List[Tuple[str, float]]:
+        """
+        Queued job IDs in expected start order, with the expected wait (seconds)
+        
+        Replays _dispatch: the slot that frees first releases its tenant's
+        share, then the next job is picked into it and holds it for the
+        average job duration.
+        """
+        queues = {
+            priority: {tenant: deque(queue) for tenant, queue in tenants.items()}
+            for priority, tenants in self._queues.items()
+        }
+        running = self._running_per_tenant()
+        served = dict(self._served)
+        slots = self._slots()
+        heapq.heapify(slots)
+        
+        plan = []
+        while True:
+            free_in, holder = heapq.heappop(slots)
+            if holder:
+                running[holder] -= 1
+            picked = self._pick(queues, running, served)
+            if picked is None:
+                return plan
+            video_id, tenant, _ = picked
+            plan.append((video_id, free_in))
+            running[tenant] = running.get(tenant, 0) + 1
+            heapq.heappush(slots, (free_in + self._job_seconds, tenant))
+    
+    def _queued_ids(self) -> List[str]:
+        return [
+            video_id
+            for tenants in self._queues.values()
+            for queue in tenants.values()
+            for video_id, _ in queue
+        ]
+    
+    def _active_tenants(self) -> Set[str]:
+        """Tenants with queued or running jobs"""
+        active = {tenant for _, tenant in self._running.values()}
+        for tenants in self._queues.values():
+            active.update(tenants)
+        return active
+    
+    def _running_per_tenant(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for _, tenant in self._running.values():
+            counts[tenant] = counts.get(tenant, 0) + 1
+        return counts
+    
+    def _dispatch(self):
+        """Start queued jobs while slots are free"""
+        while len(self._running) < self.max_inflight:
+            picked = self._pick(self._queues, self._running_per_tenant(), self._served)
+            if picked is None:
+                break
+            video_id, tenant, job = picked
+            self._running[video_id] = (time.monotonic(), tenant)
+            task = asyncio.create_task(self._run(video_id, job))
+            self._tasks.add(task)
+            self._job_tasks[video_id] = task
+            task.add_done_callback(self._tasks.discard)
+        self._update_gauges()
+    
+    async def _run(self, video_id: str, job: Job):
+        start, _ = self._running[video_id]
+        try:
+            await job()
+        except Exception as e:
+            logger.error(f"[{video_id}] Job failed outside the pipeline: {str(e)}")
+        finally:
+            self._running.pop(video_id, None)
+            self._job_tasks.pop(video_id, None)
+            elapsed = time.monotonic() - start
+            self._job_seconds += ESTIMATE_SMOOTHING * (elapsed - self._job_seconds)
+            self._dispatch()
+            # Forget tenants that have nothing left, so the counters stay bounded
+            active = self._active_tenants()
+            for tenant in [t for t in self._served if t not in active]:
+                del self._served[tenant]
+    
+    async def shutdown(self):
+        """Drop queued jobs and cancel running ones"""
+        queued = len(self._queued_ids())
+        if queued or self._tasks:
+            logger.warning(f"Shutting down with {len(self._running)} running and {queued} queued jobs")
+        for tenants in self._queues.values():
+            tenants.clear()
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._update_gauges()
+    
+    def _update_gauges(self):
+        JOBS_INFLIGHT.set(len(self._running))
+        for priority, tenants in self._queues.items():
+            JOBS_QUEUED.labels(priority=priority).set(sum(len(queue) for queue in tenants.values()))
+
+
+# Singleton instance
+admission = AdmissionController()
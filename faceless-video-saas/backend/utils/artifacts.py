@@ -0,0 +1,224 @@
+"""
+Artifact index and media garbage collection
+
+Every file (or directory, e.g. an HLS rendition) a job writes to MEDIA_DIR
+is recorded in the video_artifacts table with its kind and size. Per-job
+cleanup deletes by index instead of scanning the shared directory, and a
+background collector can enforce a TTL and a disk quota on finished jobs
+(both off unless MEDIA_TTL_DAYS / MEDIA_QUOTA_GB are set).
+"""
+import os
+import shutil
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+
+from utils.metrics import MEDIA_BYTES, MEDIA_BYTES_FREED_TOTAL
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Delete finished jobs' media after this many days (0 = keep forever, the default)
+MEDIA_TTL_DAYS = float(os.getenv("MEDIA_TTL_DAYS", "0"))
+# Evict the oldest finished jobs' media above this size (0 = no quota, the default)
+MEDIA_QUOTA_BYTES = int(float(os.getenv("MEDIA_QUOTA_GB", "0")) * 1024 ** 3)
+GC_INTERVAL_SECONDS = float(os.getenv("MEDIA_GC_INTERVAL_SECONDS", "600"))
+
+ARTIFACT_KINDS = ["temp", "subtitle", "audio", "preview", "render", "stream", "thumbnail", "report"]
+# Intermediate files (incl. the job's scratch directory), removed as soon as the job finishes
+TEMP_KINDS = ["temp"]
+
+
+class ArtifactStore:
+    """Record job artifacts and delete them by index"""
+    
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+    
+    def record(self, video_id: str, path: str, kind: str):
+        """
+        Record (or refresh the size of) a file or directory a job produced
+        
+        Queries the database and walks directories, so async callers run it
+        with asyncio.to_thread.
+        """
+        self.record_many(video_id, [(path, kind)])
+    
+    def record_many(self, video_id: str, entries: Iterable[Tuple[str, str]]):
+        """record() several (path, kind) pairs in one transaction"""
+        from database import SessionLocal, VideoArtifactDB
+        
+        entries = [(path, kind) for path, kind in entries if path and os.path.exists(path)]
+        if not entries:
+            return
+        
+        db = SessionLocal()
+        try:
+            for path, kind in entries:
+                size = _path_size(path)
+                artifact = db.query(VideoArtifactDB).filter(VideoArtifactDB.path == path).first()
+                if artifact:
+                    artifact.kind = kind
+                    artifact.size_bytes = size
+                else:
+                    db.add(VideoArtifactDB(video_id=video_id, path=path, kind=kind, size_bytes=size))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"[{video_id}] Failed to record artifacts {[path for path, _ in entries]}: {e}")
+        finally:
+            db.close()
+    
+    def cleanup(self, video_id: str, kinds: Optional[Iterable[str]] = None) -> int:
+        """
+        Delete a job's artifacts (optionally only some kinds)
+        
+        Returns:
+            Bytes freed
+        """
+        from database import SessionLocal, VideoArtifactDB
+        
+        db = SessionLocal()
+        try:
+            query = db.query(VideoArtifactDB).filter(VideoArtifactDB.video_id == video_id)
+            if kinds is not None:
+                query = query.filter(VideoArtifactDB.kind.in_(list(kinds)))
+            freed = self._delete(db, query.all())
+            db.commit()
+            if freed:
+                logger.info(f"[{video_id}] Cleaned up {freed} bytes")
+            return freed
+        except Exception as e:
+            db.rollback()
+            logger.error(f"[{video_id}] Error during cleanup: {str(e)}")
+            return 0
+        finally:
+            db.close()
+    
+    def collect_garbage(self) -> Dict[str, int]:
+        """
+        One collection pass: artifacts of deleted jobs, finished jobs past
+        the TTL, then the oldest finished jobs until under the quota
+        
+        Returns:
+            Bytes freed per reason
+        """
+        from database import SessionLocal, VideoDB, VideoArtifactDB
+        from models import VideoStatus
+        
+        finished = [VideoStatus.COMPLETED, VideoStatus.FAILED, VideoStatus.CANCELLED]
+        freed = {"orphaned": 0, "expired": 0, "quota": 0}
+        db = SessionLocal()
+        try:
+            orphans = (
+                db.query(VideoArtifactDB)
+                .outerjoin(VideoDB, VideoArtifactDB.video_id == VideoDB.id)
+                .filter(VideoDB.id.is_(None))
+                .all()
+            )
+            freed["orphaned"] = self._delete(db, orphans)
+            
+            if MEDIA_TTL_DAYS > 0:
+                cutoff = datetime.utcnow() - timedelta(days=MEDIA_TTL_DAYS)
+                expired = (
+                    db.query(VideoDB)
+                    .filter(VideoDB.status.in_(finished), VideoDB.updated_at < cutoff, VideoDB.artifacts.any())
+                    .all()
+                )
+                for video in expired:
+                    freed["expired"] += self._expire(db, video)
+            
+            db.commit()
+            total = db.query(func.coalesce(func.sum(VideoArtifactDB.size_bytes), 0)).scalar()
+            
+            if MEDIA_QUOTA_BYTES > 0 and total > MEDIA_QUOTA_BYTES:
+                oldest_first = (
+                    db.query(VideoDB)
+                    .filter(VideoDB.status.in_(finished), VideoDB.artifacts.any())
+                    .order_by(VideoDB.updated_at.asc())
+                )
+                for video in oldest_first:
+                    if total <= MEDIA_QUOTA_BYTES:
+                        break
+                    evicted = self._expire(db, video)
+                    freed["quota"] += evicted
+                    total -= evicted
+                db.commit()
+            
+            MEDIA_BYTES.set(total)
+            for reason, count in freed.items():
+                if count:
+                    MEDIA_BYTES_FREED_TOTAL.labels(reason=reason).inc(count)
+                    logger.info(f"Media GC freed {count} bytes ({reason})")
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Media GC failed: {str(e)}")
+        finally:
+            db.close()
+        
+        return freed
+    
+    def start(self):
+        """Run the collector in the background; call from inside the event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        while True:
+            # File deletes and queries block, so they run off the event loop
+            await asyncio.to_thread(self.collect_garbage)
+            await asyncio.sleep(GC_INTERVAL_SECONDS)
+    
+    def _expire(self, db, video) -> int:
+        """Delete all media of a finished job and unlink it from the job record"""
+        freed = self._delete(db, list(video.artifacts))
+        for attr in ['audio_path', 'video_path', 'thumbnail_path', 'storyboard_path', 'stream_path',
+                     'preview_path', 'profile_path', 'profile_report_path', 'memory_report_path',
+                     'srt_path', 'vtt_path']:
+            setattr(video, attr, None)
+        video.renditions.clear()
+        logger.info(f"[{video.id}] Media expired ({freed} bytes)")
+        return freed
+    
+    def _delete(self, db, artifacts: List) -> int:
+        """Delete artifact files and their rows; returns bytes freed"""
+        freed = 0
+        for artifact in artifacts:
+            try:
+                if os.path.isdir(artifact.path):
+                    shutil.rmtree(artifact.path)
+                elif os.path.exists(artifact.path):
+                    os.remove(artifact.path)
+                freed += artifact.size_bytes or 0
+            except Exception as e:
+                logger.warning(f"Failed to delete {artifact.path}: {e}")
+                continue
+            db.delete(artifact)
+        return freed
+
+
+def _path_size(path: str) -> int:
+    """Size of a file, or of everything under a directory"""
+    if os.path.isdir(path):
+        return sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, names in os.walk(path)
+            for name in names
+        )
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+# Singleton instance
+artifact_store = ArtifactStore()
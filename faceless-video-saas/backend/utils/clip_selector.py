@@ -0,0 +1,91 @@
+"""
+Stock clip selection across search results and their renditions
+
+Providers return several videos per query, each in several renditions.
+Every (video, rendition) pair is scored, in order of importance, on:
+1. duration: the clip covers the scene
+2. orientation: portrait for portrait output (no letterboxing)
+3. resolution: the smallest rendition that still fills the output frame
+   without upscaling (fewest bytes to download and pixels to decode); if
+   none does, the largest one available
+Renditions whose long side exceeds MAX_SOURCE_LONG_SIDE (1920 px, or the
+output frame's if larger) are only used when nothing smaller matches.
+"""
+from typing import Dict, List, Optional, Tuple
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Output frame the clips are scaled into (width, height)
+DEFAULT_TARGET_SIZE = (1080, 1920)
+# Longest source side worth downloading for the largest render profile
+MAX_SOURCE_LONG_SIDE = 1920
+
+
+class ClipSelector:
+    """Pick the cheapest stock rendition that still looks right in the output"""
+    
+    def select(
+        self,
+        candidates: List[Dict],
+        scene_duration: float,
+        target_size: Tuple[int, int] = DEFAULT_TARGET_SIZE
+    ) -> Optional[Dict]:
+        """
+        Choose one candidate
+        
+        Args:
+            candidates: Dicts with 'url', 'width', 'height', 'duration' and
+                optionally 'size_bytes', in the provider's relevance order
+            scene_duration: Seconds of footage the scene needs
+            target_size: Output (width, height)
+        
+        Returns:
+            The best candidate, or None if there are none usable
+        """
+        usable = [
+            (i, c) for i, c in enumerate(candidates)
+            if c.get("url") and c.get("width") and c.get("height")
+        ]
+        if not usable:
+            return None
+        
+        _, best = min(usable, key=lambda item: self._cost(item[1], item[0], scene_duration, target_size))
+        logger.info(
+            f"Selected {best['width']}x{best['height']} {best.get('duration')}s clip "
+            f"from {len(candidates)} candidates"
+        )
+        return best
+    
+    def _cost(
+        self,
+        candidate: Dict,
+        rank: int,
+        scene_duration: float,
+        target_size: Tuple[int, int]
+    ) -> Tuple:
+        """Sort key, lower is better"""
+        target_w, target_h = target_size
+        width, height = candidate["width"], candidate["height"]
+        pixels = width * height
+        
+        covers = (candidate.get("duration") or 0) >= scene_duration
+        same_orientation = (height >= width) == (target_h >= target_w)
+        oversized = max(width, height) > max(MAX_SOURCE_LONG_SIDE, target_w, target_h)
+        # Scaled to fit the frame (as the renderer does), no upscaling needed
+        fills_frame = min(target_w / width, target_h / height) <= 1.0
+        
+        return (
+            not covers,
+            not same_orientation,
+            oversized,
+            not fills_frame,
+            pixels if fills_frame else -pixels,
+            candidate.get("size_bytes") or 0,
+            rank
+        )
+
+
+# Singleton instance
+clip_selector = ClipSelector()
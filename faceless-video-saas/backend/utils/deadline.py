@@ -0,0 +1,160 @@
+"""
+Per-job deadline budget
+
+Each process_video run gets JOB_DEADLINE_SECONDS end to end, split across
+the stages by STAGE_SHARES. A stage's budget is its share of whatever is
+left when it starts, so time one stage saves (or overruns) is passed on to
+the ones after it. Services read the budget through a context variable:
+provider requests are bounded by the current stage's remaining time, FFmpeg
+calls by the job's, and when a stage runs out the pipeline degrades instead
+of failing (template script, fewer clips, a faster encoding tier, no preview
+or final encode). Passes the job cannot do without, like the mux, keep a
+floor however late the job is. Every degradation is recorded on the job.
+"""
+import os
+import math
+import time
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+from utils.metrics import JOB_DEGRADATIONS_TOTAL
+from utils.tracing import tracer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# End-to-end budget of one pipeline run (0 = no deadline)
+JOB_DEADLINE_SECONDS = float(os.getenv("JOB_DEADLINE_SECONDS", "600"))
+# Any call still gets this long, so a late stage can produce something
+MIN_CALL_SECONDS = float(os.getenv("DEADLINE_MIN_CALL_SECONDS", "5"))
+
+# Share of the job budget per stage, in pipeline order
+STAGE_SHARES = {
+    "script": 0.15,
+    "tts": 0.10,
+    "clips": 0.25,
+    "subtitles": 0.05,
+    "render": 0.40,
+    "thumbnail": 0.05,
+}
+
+
+class JobDeadline:
+    """Budget of one job run and the degradations applied to meet it"""
+    
+    def __init__(self, video_id: str, total_seconds: float = JOB_DEADLINE_SECONDS):
+        self.video_id = video_id
+        self.total_seconds = total_seconds
+        self.expires_at = time.monotonic() + total_seconds if total_seconds > 0 else math.inf
+        self.degradations: List[str] = []
+    
+    def remaining(self) -> float:
+        """Seconds left for the whole job"""
+        return self.expires_at - time.monotonic()
+    
+    def stage_remaining(self) -> float:
+        """Seconds left for the current stage"""
+        return min(_stage_expires_at.get(), self.expires_at) - time.monotonic()
+    
+    def stage_budget(self, stage: str) -> float:
+        """Budget a stage gets if it starts now: its share of the time left"""
+        remaining = max(0.0, self.remaining())
+        stages = list(STAGE_SHARES)
+        if stage not in STAGE_SHARES or math.isinf(remaining):
+            return remaining
+        later = sum(STAGE_SHARES[s] for s in stages[stages.index(stage):])
+        return remaining * STAGE_SHARES[stage] / later
+
+
+_current_deadline: ContextVar[Optional[JobDeadline]] = ContextVar("current_deadline", default=None)
+# Per task, so stages running concurrently each keep their own budget
+_stage_expires_at: ContextVar[float] = ContextVar("stage_expires_at", default=math.inf)
+
+
+class Deadlines:
+    """Open job deadlines and answer budget questions for the current one"""
+    
+    @contextmanager
+    def job(self, video_id: str, total_seconds: float = JOB_DEADLINE_SECONDS):
+        """Start the deadline of a job run; everything awaited inside shares it"""
+        deadline = JobDeadline(video_id, total_seconds)
+        token = _current_deadline.set(deadline)
+        try:
+            yield deadline
+        finally:
+            _current_deadline.reset(token)
+    
+    @contextmanager
+    def stage(self, name: str):
+        """Run a stage on its share of the remaining budget"""
+        deadline = _current_deadline.get()
+        if deadline is None:
+            yield
+            return
+        
+        budget = deadline.stage_budget(name)
+        token = _stage_expires_at.set(time.monotonic() + budget)
+        tracer.set_attribute("budget_seconds", round(budget, 1) if not math.isinf(budget) else None)
+        try:
+            yield
+        finally:
+            _stage_expires_at.reset(token)
+    
+    def timeout(self, default: float) -> float:
+        """Timeout for a call in the current stage: the default, cut to the stage's remaining budget"""
+        deadline = _current_deadline.get()
+        if deadline is None:
+            return default
+        return min(default, max(deadline.stage_remaining(), MIN_CALL_SECONDS))
+    
+    def job_timeout(self, default: float, floor: float = 0.0) -> float:
+        """
+        Timeout for a call that has no cheaper fallback: cut to the job's remaining budget
+        
+        Args:
+            default: Timeout without a deadline
+            floor: Never cut below this (for passes the job cannot skip)
+        """
+        deadline = _current_deadline.get()
+        if deadline is None:
+            return default
+        return min(default, max(deadline.remaining(), MIN_CALL_SECONDS, floor))
+    
+    def stage_budget(self, stage: str) -> Optional[float]:
+        """Budget the stage would get now, or None without a deadline"""
+        deadline = _current_deadline.get()
+        if deadline is None or math.isinf(deadline.remaining()):
+            return None
+        return deadline.stage_budget(stage)
+    
+    def exhausted(self) -> bool:
+        """Whether the current stage has used up its budget"""
+        deadline = _current_deadline.get()
+        return deadline is not None and deadline.stage_remaining() <= 0
+    
+    def job_exhausted(self) -> bool:
+        """Whether the whole job is past its deadline"""
+        deadline = _current_deadline.get()
+        return deadline is not None and deadline.remaining() <= 0
+    
+    def degrade(self, stage: str, degradation: str):
+        """Record that the job settled for less in a stage (e.g. 'fallback script')"""
+        JOB_DEGRADATIONS_TOTAL.labels(stage=stage).inc()
+        deadline = _current_deadline.get()
+        if deadline is None:
+            return
+        deadline.degradations.append(f"{stage}: {degradation}")
+        logger.warning(f"[{deadline.video_id}] Degraded {stage}: {degradation}")
+        with tracer.span(f"degrade.{stage}", degradation=degradation):
+            pass
+    
+    def degradations(self) -> List[str]:
+        """Degradations applied to the current job so far"""
+        deadline = _current_deadline.get()
+        return list(deadline.degradations) if deadline else []
+
+
+# Singleton instance
+deadlines = Deadlines()
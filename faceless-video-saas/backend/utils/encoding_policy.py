@@ -0,0 +1,167 @@
+"""
+Load-adaptive encoding policy for the final x264 encode
+
+The policy walks a ladder of encoding tiers, from the best quality to the
+cheapest, and picks the first one whose estimated queue drain time
+(queue depth x estimated encode time / parallel encodes) fits the target
+SLA. A job near its deadline also moves down the ladder until one encode
+fits the job's remaining render budget. Tiers beyond the configured quality
+floors are never used. The estimate follows the observed encode times, so
+it adapts to the host.
+"""
+import os
+import logging
+from typing import Dict, List, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ADAPTIVE_ENCODING = os.getenv("ADAPTIVE_ENCODING", "true").lower() == "true"
+# Target time for the current queue to finish rendering (seconds)
+ENCODE_SLA_SECONDS = float(os.getenv("ENCODE_SLA_SECONDS", "900"))
+# Final encodes that effectively run in parallel on this host
+ENCODE_PARALLELISM = max(1, int(os.getenv("ENCODE_PARALLELISM", "1")))
+# Initial estimate of one final encode at the 'fast' preset, refined from observed runs
+ENCODE_BASELINE_SECONDS = float(os.getenv("ENCODE_BASELINE_SECONDS", "60"))
+# Quality floors: never go faster than this preset, above this CRF offset or below this height
+ENCODE_MIN_PRESET = os.getenv("ENCODE_MIN_PRESET", "veryfast")
+ENCODE_MAX_CRF_OFFSET = int(os.getenv("ENCODE_MAX_CRF_OFFSET", "4"))
+ENCODE_MIN_HEIGHT = int(os.getenv("ENCODE_MIN_HEIGHT", "1280"))
+
+# x264 presets from slowest to fastest, with their approximate encode cost relative to 'fast'
+PRESET_COST = {
+    "medium": 1.4,
+    "fast": 1.0,
+    "faster": 0.75,
+    "veryfast": 0.5,
+    "superfast": 0.35,
+    "ultrafast": 0.25,
+}
+
+# Ladder from best quality to cheapest; max_height caps the output resolution
+ENCODING_TIERS = [
+    {"name": "quality", "preset": "fast", "crf_offset": 0, "max_height": None},
+    {"name": "balanced", "preset": "faster", "crf_offset": 1, "max_height": None},
+    {"name": "throughput", "preset": "veryfast", "crf_offset": 2, "max_height": None},
+    {"name": "reduced", "preset": "veryfast", "crf_offset": 2, "max_height": 1280},
+    {"name": "minimum", "preset": "superfast", "crf_offset": 4, "max_height": 854},
+]
+
+# Weight of a new observation in the encode time estimate
+ESTIMATE_SMOOTHING = 0.3
+
+
+class EncodingPolicy:
+    """Pick the final encode's preset, CRF and resolution from the render queue"""
+    
+    def __init__(self):
+        # Seconds per final encode at the 'fast' preset and full resolution
+        self._baseline_seconds = ENCODE_BASELINE_SECONDS
+    
+    def choose(
+        self,
+        queue_depth: int,
+        render_profiles: List[str],
+        profiles: Dict[str, Dict],
+        budget_seconds: Optional[float] = None
+    ) -> Dict:
+        """
+        Choose the encoding tier for a job
+        
+        Args:
+            queue_depth: Jobs that still need a final encode, this one included
+            render_profiles: Requested profile names, primary first
+            profiles: Known render profiles (name -> width/height/crf)
+            budget_seconds: Time the job has left for its render, if it has
+                a deadline
+        
+        Returns:
+            Dict with the tier, preset, crf_offset, the (possibly reduced)
+            render_profiles and the inputs the decision was based on;
+            'deadline_limited' is True if the budget forced a cheaper tier
+        """
+        allowed = self._allowed_tiers(profiles)
+        tier = allowed[0]
+        drain_seconds = self.estimate_drain(queue_depth, tier)
+        
+        if ADAPTIVE_ENCODING:
+            for candidate in allowed:
+                tier = candidate
+                drain_seconds = self.estimate_drain(queue_depth, tier)
+                if drain_seconds <= ENCODE_SLA_SECONDS:
+                    break
+        
+        deadline_limited = False
+        if budget_seconds is not None:
+            # This job's own encode must fit what is left of its deadline
+            start = allowed.index(tier)
+            for candidate in allowed[start:]:
+                tier = candidate
+                if self.estimate_drain(1, tier) <= budget_seconds:
+                    break
+            deadline_limited = allowed.index(tier) > start
+        
+        return {
+            "tier": tier["name"],
+            "preset": tier["preset"],
+            "crf_offset": tier["crf_offset"],
+            "render_profiles": self._cap_profiles(render_profiles, profiles, tier["max_height"]),
+            "queue_depth": queue_depth,
+            "estimated_drain_seconds": round(drain_seconds, 1),
+            "sla_seconds": ENCODE_SLA_SECONDS,
+            "budget_seconds": round(budget_seconds, 1) if budget_seconds is not None else None,
+            "deadline_limited": deadline_limited,
+        }
+    
+    def estimate_drain(self, queue_depth: int, tier: Dict) -> float:
+        """Estimated seconds until the queue has been encoded at this tier"""
+        seconds_per_job = self._baseline_seconds * PRESET_COST[tier["preset"]]
+        if tier["max_height"]:
+            # Encode cost scales roughly with the pixel count
+            seconds_per_job *= (tier["max_height"] / 1920) ** 2
+        return queue_depth * seconds_per_job / ENCODE_PARALLELISM
+    
+    def observe(self, encoding: Dict, seconds: float, primary_height: int):
+        """Refine the encode time estimate from a finished final encode"""
+        cost = PRESET_COST.get(encoding.get("preset"), 1.0) * (min(primary_height, 1920) / 1920) ** 2
+        if cost <= 0 or seconds <= 0:
+            return
+        normalized = seconds / cost
+        self._baseline_seconds += ESTIMATE_SMOOTHING * (normalized - self._baseline_seconds)
+    
+    def _allowed_tiers(self, profiles: Dict[str, Dict]) -> List[Dict]:
+        """Tiers within the quality floors, best first"""
+        presets = list(PRESET_COST)
+        min_preset = presets.index(ENCODE_MIN_PRESET) if ENCODE_MIN_PRESET in presets else len(presets) - 1
+        smallest = min(profile["height"] for profile in profiles.values())
+        allowed = [
+            tier for tier in ENCODING_TIERS
+            if presets.index(tier["preset"]) <= min_preset
+            and tier["crf_offset"] <= ENCODE_MAX_CRF_OFFSET
+            and (tier["max_height"] is None or tier["max_height"] >= max(ENCODE_MIN_HEIGHT, smallest))
+        ]
+        return allowed or ENCODING_TIERS[:1]
+    
+    def _cap_profiles(
+        self,
+        render_profiles: List[str],
+        profiles: Dict[str, Dict],
+        max_height: Optional[int]
+    ) -> List[str]:
+        """Replace profiles above max_height with the largest one that fits"""
+        if not max_height:
+            return list(render_profiles)
+        
+        fitting = sorted(
+            (name for name, profile in profiles.items() if profile["height"] <= max_height),
+            key=lambda name: profiles[name]["height"],
+            reverse=True
+        )
+        if not fitting:
+            return list(render_profiles)
+        capped = [name if profiles[name]["height"] <= max_height else fitting[0] for name in render_profiles]
+        return list(dict.fromkeys(capped))
+
+
+# Singleton instance
+encoding_policy = EncodingPolicy()
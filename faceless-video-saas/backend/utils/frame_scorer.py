@@ -0,0 +1,83 @@
+"""
+Frame scoring for thumbnail selection (NumPy + Pillow)
+"""
+from typing import List, Optional
+import logging
+
+import numpy as np
+from PIL import Image
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Frames are scored on a downscaled grayscale copy; the score only ranks candidates
+SCORING_WIDTH = 270
+# Mean luma below this is treated as a black (fade/transition) frame
+BLACK_THRESHOLD = 20.0
+
+
+class FrameScorer:
+    """Rank candidate frames by sharpness, exposure and contrast"""
+    
+    def score(self, image_path: str) -> float:
+        """
+        Score a single frame, higher is better
+        
+        Args:
+            image_path: Path to a decoded frame (JPEG/PNG)
+            
+        Returns:
+            Score, or -inf for black or unreadable frames
+        """
+        try:
+            with Image.open(image_path) as image:
+                gray = image.convert("L")
+                if gray.width > SCORING_WIDTH:
+                    height = max(1, int(gray.height * SCORING_WIDTH / gray.width))
+                    gray = gray.resize((SCORING_WIDTH, height), Image.BILINEAR)
+                pixels = np.asarray(gray, dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"Failed to read frame {image_path}: {e}")
+            return float("-inf")
+        
+        brightness = float(pixels.mean())
+        if brightness < BLACK_THRESHOLD or pixels.shape[0] < 3 or pixels.shape[1] < 3:
+            return float("-inf")
+        
+        # Variance of the 4-neighbour Laplacian: blurry frames score low
+        laplacian = (
+            pixels[:-2, 1:-1] + pixels[2:, 1:-1] + pixels[1:-1, :-2] + pixels[1:-1, 2:]
+            - 4.0 * pixels[1:-1, 1:-1]
+        )
+        sharpness = float(np.log1p(laplacian.var()))
+        
+        # 1.0 at mid-grey, falling off towards under/over-exposure
+        exposure = 1.0 - abs(brightness - 128.0) / 128.0
+        contrast = float(pixels.std()) / 64.0
+        
+        return sharpness * (0.5 + 0.5 * exposure) + contrast
+    
+    def pick_best(self, image_paths: List[str]) -> Optional[str]:
+        """
+        Return the best-scoring frame
+        
+        If every frame is black or unreadable, the middle one (candidates
+        are in time order) is still better than no thumbnail. None only
+        for an empty list.
+        """
+        if not image_paths:
+            return None
+        best_path = image_paths[len(image_paths) // 2]
+        best_score = float("-inf")
+        
+        for path in image_paths:
+            score = self.score(path)
+            logger.info(f"Thumbnail candidate {path}: {score:.3f}")
+            if score > best_score:
+                best_path, best_score = path, score
+        
+        return best_path
+
+
+# Singleton instance
+frame_scorer = FrameScorer()
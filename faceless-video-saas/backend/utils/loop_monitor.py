@@ -0,0 +1,106 @@
+"""
+Event-loop lag monitor
+
+A heartbeat task sleeps for a fixed interval and measures how late it wakes
+up; that scheduling delay is exported as a histogram. A watchdog thread
+checks the heartbeat, and when the loop has not come back for longer than
+the threshold it logs the loop thread's current stack, which points at the
+blocking call (e.g. a synchronous HTTP, subprocess or database call inside
+a coroutine).
+"""
+import os
+import sys
+import time
+import asyncio
+import threading
+import traceback
+import logging
+from typing import Optional
+
+from utils.metrics import EVENT_LOOP_LAG_SECONDS, EVENT_LOOP_BLOCKED_TOTAL
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+# Heartbeat interval (seconds)
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.1"))
+# Log the loop thread's stack when it has been blocked this long (seconds)
+LOOP_LAG_THRESHOLD = float(os.getenv("LOOP_LAG_THRESHOLD", "0.25"))
+LOOP_STACK_LIMIT = 30
+
+
+class LoopLagMonitor:
+    """Measure event-loop scheduling delay and report what blocked it"""
+    
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, threshold: float = LOOP_LAG_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = time.monotonic()
+        # Heartbeat the watchdog already reported, so one stall is logged once
+        self._reported_beat: Optional[float] = None
+    
+    def start(self):
+        """Start monitoring the running loop; call from inside it"""
+        if self._task is not None:
+            return
+        
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(f"Event loop monitor started (interval {self.interval}s, threshold {self.threshold}s)")
+    
+    async def stop(self):
+        """Stop the heartbeat task and the watchdog thread"""
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=self.interval * 2)
+            self._watchdog = None
+    
+    async def _heartbeat(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - start - self.interval)
+            self._last_beat = now
+            EVENT_LOOP_LAG_SECONDS.observe(lag)
+            
+            if lag >= self.threshold:
+                logger.warning(f"Event loop was blocked for {lag * 1000:.0f} ms")
+    
+    def _watch(self):
+        """Runs in a thread: catch the loop while it is still blocked"""
+        while not self._stopped.wait(self.interval):
+            beat = self._last_beat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled < self.threshold or beat == self._reported_beat:
+                continue
+            
+            self._reported_beat = beat
+            EVENT_LOOP_BLOCKED_TOTAL.inc()
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = ''.join(traceback.format_stack(frame, limit=LOOP_STACK_LIMIT))
+            logger.warning(
+                f"Event loop blocked for over {stalled * 1000:.0f} ms, loop thread is at:\n{stack}"
+            )
+
+
+# Singleton instance
+loop_monitor = LoopLagMonitor()
@@ -0,0 +1,158 @@
+"""
+Prometheus metrics for the video pipeline
+"""
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from utils.tracing import tracer
+
+# Stages run minutes apart, FFmpeg runs seconds to minutes, HTTP calls sub-second to a minute
+STAGE_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600, 1200)
+FFMPEG_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+PROVIDER_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Event-loop scheduling delay: healthy is well under 10 ms
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+PIPELINE_STAGE_SECONDS = Histogram(
+    "pipeline_stage_duration_seconds",
+    "Time spent in each process_video stage",
+    ["stage"],
+    buckets=STAGE_BUCKETS
+)
+
+PIPELINE_JOB_SECONDS = Histogram(
+    "pipeline_job_duration_seconds",
+    "End-to-end process_video duration by outcome",
+    ["outcome"],
+    buckets=STAGE_BUCKETS
+)
+
+FFMPEG_SECONDS = Histogram(
+    "ffmpeg_duration_seconds",
+    "Duration of each FFmpeg invocation by operation",
+    ["operation", "outcome"],
+    buckets=FFMPEG_BUCKETS
+)
+
+PROVIDER_REQUEST_SECONDS = Histogram(
+    "provider_request_duration_seconds",
+    "Duration of external provider calls by status code",
+    ["provider", "status_code"],
+    buckets=PROVIDER_BUCKETS
+)
+
+JOBS_BY_STATUS = Gauge(
+    "video_jobs",
+    "Video jobs currently in each status",
+    ["status"]
+)
+
+FALLBACK_SCRIPT_TOTAL = Counter(
+    "fallback_script_total",
+    "Jobs that used the template script because generation failed"
+)
+
+FALLBACK_VIDEO_TOTAL = Counter(
+    "fallback_video_total",
+    "Jobs that used the generated fallback video because no stock clips were found"
+)
+
+STOCK_CLIPS_TOTAL = Counter(
+    "stock_clips_total",
+    "Scene clips by where they came from ('local' library, a provider, or 'none')",
+    ["source"]
+)
+
+STOCK_DOWNLOAD_BYTES_TOTAL = Counter(
+    "stock_download_bytes_total",
+    "Bytes of stock footage downloaded"
+)
+
+JOBS_INFLIGHT = Gauge(
+    "video_jobs_inflight",
+    "Pipelines currently running"
+)
+
+JOBS_QUEUED = Gauge(
+    "video_jobs_queued",
+    "Jobs waiting for a pipeline slot by scheduling class",
+    ["priority"]
+)
+
+JOBS_REJECTED_TOTAL = Counter(
+    "video_jobs_rejected_total",
+    "Job submissions rejected because the queue was full"
+)
+
+JOB_DEGRADATIONS_TOTAL = Counter(
+    "job_degradations_total",
+    "Stages that settled for a cheaper result to stay within the job deadline",
+    ["stage"]
+)
+
+ENCODING_TIER_TOTAL = Counter(
+    "encoding_tier_total",
+    "Final encodes by the tier the encoding policy chose",
+    ["tier"]
+)
+
+MEDIA_BYTES = Gauge(
+    "media_bytes",
+    "Bytes of job artifacts on disk, as of the last media GC pass"
+)
+
+MEDIA_BYTES_FREED_TOTAL = Counter(
+    "media_bytes_freed_total",
+    "Bytes deleted by the media garbage collector",
+    ["reason"]
+)
+
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop heartbeat woke up",
+    buckets=LOOP_LAG_BUCKETS
+)
+
+EVENT_LOOP_BLOCKED_TOTAL = Counter(
+    "event_loop_blocked_total",
+    "Times the event loop was blocked past LOOP_LAG_THRESHOLD"
+)
+
+
+@contextmanager
+def track_stage(stage: str):
+    """Time a process_video stage and trace it as a 'stage.<name>' span"""
+    with tracer.span(f"stage.{stage}") as span, PIPELINE_STAGE_SECONDS.labels(stage=stage).time():
+        yield span
+
+
+@contextmanager
+def track_provider_call(provider: str, **attributes):
+    """
+    Time an external call; the caller records the response status
+    
+    Usage:
+        with track_provider_call("pexels", query=query) as call:
+            response = await client.get(...)
+            call["status_code"] = response.status_code
+    
+    Calls that raise before a status is recorded are labelled 'error'.
+    The call is also traced as a 'provider.<name>' span with the given
+    attributes when it runs inside a job trace.
+    """
+    call: Dict = {"status_code": "error"}
+    start = time.perf_counter()
+    with tracer.span(f"provider.{provider}", **attributes) as span:
+        try:
+            yield call
+        finally:
+            PROVIDER_REQUEST_SECONDS.labels(
+                provider=provider,
+                status_code=str(call["status_code"])
+            ).observe(time.perf_counter() - start)
+            if span is not None:
+                span.set_attribute("status_code", str(call["status_code"]))
@@ -0,0 +1,127 @@
+"""
+Opt-in per-job profiling (cProfile + tracemalloc)
+"""
+import os
+import io
+import pstats
+import cProfile
+import threading
+import tracemalloc
+import logging
+from contextlib import contextmanager
+from typing import Dict
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MEDIA_DIR = os.getenv("MEDIA_DIR", "/app/media")
+
+# Profile every job (otherwise only jobs created with "profile": true)
+PROFILE_JOBS = os.getenv("PROFILE_JOBS", "false").lower() == "true"
+# Frames kept per tracemalloc allocation traceback
+TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "10"))
+PROFILE_TOP_FUNCTIONS = 60
+MEMORY_TOP_ALLOCATIONS = 30
+
+
+class JobProfiler:
+    """
+    Wrap a job run in cProfile and tracemalloc
+    
+    Both tools are process-wide: while a job is profiled, everything running
+    on the event loop thread (including other jobs) is included, and only
+    one job can be profiled at a time. A second request while one is active
+    is skipped with a warning instead of corrupting the first.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def profile(self, video_id: str, enabled: bool = PROFILE_JOBS):
+        """
+        Profile the enclosed block for a job
+        
+        Yields a dict that is filled on exit with 'profile_path',
+        'profile_report_path', 'memory_report_path' and 'peak_memory_bytes'
+        (empty if profiling was not enabled or not possible).
+        """
+        result: Dict = {}
+        if not enabled:
+            yield result
+            return
+        
+        if not self._lock.acquire(blocking=False):
+            logger.warning(f"[{video_id}] Another job is being profiled, skipping profile")
+            yield result
+            return
+        
+        profiler = cProfile.Profile()
+        started_tracemalloc = not tracemalloc.is_tracing()
+        try:
+            if started_tracemalloc:
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+            tracemalloc.reset_peak()
+            profiler.enable()
+            try:
+                yield result
+            finally:
+                profiler.disable()
+                try:
+                    _, peak = tracemalloc.get_traced_memory()
+                    snapshot = tracemalloc.take_snapshot()
+                    result.update(self._write_reports(video_id, profiler, snapshot, peak))
+                except Exception as e:
+                    logger.error(f"[{video_id}] Failed to write profile: {str(e)}")
+        finally:
+            if started_tracemalloc:
+                tracemalloc.stop()
+            self._lock.release()
+    
+    def _write_reports(
+        self,
+        video_id: str,
+        profiler: cProfile.Profile,
+        snapshot: tracemalloc.Snapshot,
+        peak: int
+    ) -> Dict:
+        """Write the raw profile, a text summary and the memory report next to the job's media"""
+        profile_path = os.path.join(MEDIA_DIR, f"{video_id}_profile.prof")
+        profile_report_path = os.path.join(MEDIA_DIR, f"{video_id}_profile.txt")
+        memory_report_path = os.path.join(MEDIA_DIR, f"{video_id}_memory.txt")
+        
+        # Raw stats for snakeviz / pstats
+        profiler.dump_stats(profile_path)
+        
+        text = io.StringIO()
+        stats = pstats.Stats(profiler, stream=text)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_TOP_FUNCTIONS)
+        with open(profile_report_path, 'w', encoding='utf-8') as f:
+            f.write(text.getvalue())
+        
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ])
+        lines = [
+            f"Job: {video_id}",
+            f"Peak traced memory: {peak / (1024 * 1024):.2f} MiB",
+            "",
+            f"Top {MEMORY_TOP_ALLOCATIONS} allocation sites still alive at the end of the job:",
+        ]
+        for stat in snapshot.statistics("lineno")[:MEMORY_TOP_ALLOCATIONS]:
+            lines.append(f"{stat.size / 1024:10.1f} KiB  {stat.count:8d} blocks  {stat.traceback}")
+        with open(memory_report_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        
+        logger.info(f"[{video_id}] Profile written: {profile_report_path}, peak memory {peak} bytes")
+        return {
+            "profile_path": profile_path,
+            "profile_report_path": profile_report_path,
+            "memory_report_path": memory_report_path,
+            "peak_memory_bytes": peak
+        }
+
+
+# Singleton instance
+job_profiler = JobProfiler()
@@ -0,0 +1,45 @@
+"""
+Per-job scratch workspace
+
+Intermediates (downloaded clips, subtitle files, the muxed clip + audio
+track, thumbnail candidates) are written to a private directory per job
+under SCRATCH_DIR instead of MEDIA_DIR, so only deliverables reach durable
+storage. Point SCRATCH_DIR at a tmpfs such as /dev/shm to keep them in
+memory. When the job ends the directory is measured, indexed as a 'temp'
+artifact and removed with the job's other temporary files.
+"""
+import os
+import tempfile
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SCRATCH_DIR = os.getenv("SCRATCH_DIR", os.path.join(tempfile.gettempdir(), "faceless-video"))
+
+
+class ScratchSpace:
+    """Hand out per-job scratch directories"""
+    
+    def __init__(self, root: str = SCRATCH_DIR):
+        self.root = root
+    
+    def location(self, video_id: str) -> str:
+        """Where the job's scratch directory is (it may not exist yet)"""
+        return os.path.join(self.root, video_id)
+    
+    def job_dir(self, video_id: str) -> str:
+        """The job's scratch directory, created on first use"""
+        path = self.location(video_id)
+        if not os.path.isdir(path):
+            os.makedirs(path, exist_ok=True)
+            logger.info(f"[{video_id}] Scratch directory: {path}")
+        return path
+    
+    def path(self, video_id: str, filename: str) -> str:
+        """Path of an intermediate file in the job's scratch directory"""
+        return os.path.join(self.job_dir(video_id), filename)
+
+
+# Singleton instance
+scratch = ScratchSpace()
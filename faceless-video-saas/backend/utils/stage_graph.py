@@ -0,0 +1,91 @@
+"""
+Dependency-graph executor for pipeline stages
+
+Stages declare the stages whose results they need; each one starts as soon
+as those have finished, so independent stages (e.g. narration and stock
+clips) run concurrently instead of one after another. Every stage is timed
+and traced like a sequential one (a 'stage.<name>' span and the stage
+duration histogram) and runs on its share of the job deadline.
+"""
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Tuple
+
+from utils.metrics import track_stage
+from utils.deadline import deadlines
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Called with the results of all finished stages (name -> result)
+StageFn = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+class StageGraph:
+    """A set of async stages and their dependencies, run concurrently where possible"""
+    
+    def __init__(self, video_id: str):
+        self.video_id = video_id
+        self._stages: Dict[str, StageFn] = {}
+        self._deps: Dict[str, List[str]] = {}
+        # name -> (start, end) seconds since the graph started
+        self.timings: Dict[str, Tuple[float, float]] = {}
+    
+    def add(self, name: str, fn: StageFn, after: Iterable[str] = ()) -> "StageGraph":
+        """
+        Add a stage
+        
+        Args:
+            name: Stage name, used for results, spans and metrics
+            fn: Coroutine function called with the results so far
+            after: Stages that must finish first; they must already be
+                added, which also rules out cycles
+        """
+        after = list(after)
+        unknown = [dep for dep in after if dep not in self._stages]
+        if unknown:
+            raise ValueError(f"Stage {name} depends on unknown stages {unknown}")
+        if name in self._stages:
+            raise ValueError(f"Stage {name} added twice")
+        self._stages[name] = fn
+        self._deps[name] = after
+        return self
+    
+    async def run(self) -> Dict[str, Any]:
+        """
+        Run every stage once its dependencies are done
+        
+        Returns:
+            Results by stage name
+        
+        Raises:
+            The first exception a stage raised; the stages still running
+            are cancelled before it propagates
+        """
+        results: Dict[str, Any] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+        started = time.perf_counter()
+        
+        async def run_stage(name: str):
+            if self._deps[name]:
+                await asyncio.gather(*(tasks[dep] for dep in self._deps[name]))
+            start = time.perf_counter() - started
+            with track_stage(name), deadlines.stage(name):
+                results[name] = await self._stages[name](results)
+            self.timings[name] = (round(start, 3), round(time.perf_counter() - started, 3))
+            logger.info(f"[{self.video_id}] Stage {name} done in {self.timings[name][1] - start:.2f}s")
+        
+        # Insertion order is a topological order, so dependencies exist before their dependents
+        for name in self._stages:
+            tasks[name] = asyncio.create_task(run_stage(name), name=f"{self.video_id}:{name}")
+        
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        
+        return results
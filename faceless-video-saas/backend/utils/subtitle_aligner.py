@@ -0,0 +1,164 @@
+"""
+Subtitle timing aligned to the narration (NumPy)
+
+The narration is decoded once to 16 kHz mono PCM and reduced to a per-frame
+energy envelope. Frames above an adaptive threshold are speech; pauses
+shorter than MIN_PAUSE_SECONDS are treated as part of the speech around
+them. Subtitle chunks are laid out over the speech time in proportion to
+their length (pauses excluded), and each boundary between chunks is moved
+to the end of a nearby pause, so a caption changes when the next phrase
+actually starts. Every caption stays on screen for at least
+MIN_CAPTION_SECONDS (less only if the narration is too short for that).
+"""
+from typing import List, Optional, Tuple
+import logging
+import subprocess
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+# Energy envelope resolution
+FRAME_SECONDS = 0.01
+# Silences shorter than this are gaps between words, not pauses
+MIN_PAUSE_SECONDS = 0.15
+# Boundaries are moved to the end of a pause at most this far away
+SNAP_SECONDS = 0.6
+# Shortest time a caption is shown
+MIN_CAPTION_SECONDS = 0.4
+# Speech threshold between the noise floor and the speech level (0..1)
+THRESHOLD_RATIO = 0.35
+DECODE_TIMEOUT = 60
+
+
+class SubtitleAligner:
+    """Time subtitle chunks against the speech in the narration"""
+    
+    def align(self, audio_path: str, chunks: List[str]) -> Optional[List[Tuple[float, float]]]:
+        """
+        Compute (start, end) seconds for each chunk
+        
+        Args:
+            audio_path: Narration audio (any format FFmpeg decodes)
+            chunks: Subtitle chunks in spoken order
+        
+        Returns:
+            One (start, end) per chunk, or None if the audio could not be
+            decoded or contains no detectable speech
+        """
+        if not chunks:
+            return None
+        
+        samples = self._decode(audio_path)
+        if samples is None:
+            return None
+        
+        spans = self.speech_spans(samples)
+        if len(spans) == 0:
+            logger.warning(f"No speech detected in {audio_path}")
+            return None
+        
+        return self._layout(spans, chunks)
+    
+    def speech_spans(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Speech spans of a mono signal
+        
+        Returns:
+            Array of shape (n, 2) with (start, end) seconds of each span
+        """
+        frame = int(SAMPLE_RATE * FRAME_SECONDS)
+        n_frames = len(samples) // frame
+        if n_frames == 0:
+            return np.empty((0, 2))
+        
+        frames = samples[:n_frames * frame].reshape(n_frames, frame)
+        energy_db = 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+        
+        # TTS narration has few pauses, so the noise floor is a low percentile
+        floor, level = np.percentile(energy_db, [2, 95])
+        if level - floor < 6.0:
+            # No contrast between speech and silence (silent or constant noise)
+            return np.empty((0, 2))
+        speech = energy_db > floor + THRESHOLD_RATIO * (level - floor)
+        
+        # Run boundaries: starts/ends of speech runs in frames
+        edges = np.diff(np.concatenate(([0], speech.astype(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        if len(starts) == 0:
+            return np.empty((0, 2))
+        
+        # Merge runs separated by gaps shorter than a pause
+        keep = (starts[1:] - ends[:-1]) * FRAME_SECONDS >= MIN_PAUSE_SECONDS
+        starts = starts[np.concatenate(([True], keep))]
+        ends = ends[np.concatenate((keep, [True]))]
+        
+        return np.stack([starts, ends], axis=1) * FRAME_SECONDS
+    
+    def _layout(self, spans: np.ndarray, chunks: List[str]) -> List[Tuple[float, float]]:
+        """Spread chunks over the speech time and snap boundaries to pauses"""
+        durations = spans[:, 1] - spans[:, 0]
+        # Speech time (pauses removed) at the start of each span
+        speech_start = np.concatenate(([0.0], np.cumsum(durations)))
+        
+        # Characters track TTS speaking time more closely than words
+        weights = np.array([max(len(chunk), 1) for chunk in chunks], dtype=np.float64)
+        targets = np.cumsum(weights)[:-1] / weights.sum() * speech_start[-1]
+        
+        # Map speech time back to wall-clock time inside the spans
+        span_index = np.clip(np.searchsorted(speech_start, targets, side='right') - 1, 0, len(spans) - 1)
+        boundaries = spans[span_index, 0] + (targets - speech_start[span_index])
+        
+        # Move each boundary to the end of the nearest pause if one is close
+        pause_ends = spans[1:, 0]
+        if len(pause_ends) and len(boundaries):
+            nearest = np.clip(np.searchsorted(pause_ends, boundaries), 1, len(pause_ends)) - 1
+            right = np.minimum(nearest + 1, len(pause_ends) - 1)
+            closer = np.where(
+                np.abs(pause_ends[right] - boundaries) < np.abs(pause_ends[nearest] - boundaries),
+                right, nearest
+            )
+            distance = np.abs(pause_ends[closer] - boundaries)
+            snapped = np.where(distance <= SNAP_SECONDS, pause_ends[closer], boundaries)
+            # Two boundaries on the same pause would leave an empty caption
+            clash = np.concatenate(([False], snapped[1:] == snapped[:-1]))
+            boundaries = np.where(clash, boundaries, snapped)
+        
+        # Snapping can reorder neighbours (or a clash leave a boundary behind
+        # the previous one); keep boundaries at least min_gap apart. With
+        # b[i] - i * min_gap non-decreasing, every caption gets min_gap
+        start, end = spans[0, 0], spans[-1, 1]
+        min_gap = min(MIN_CAPTION_SECONDS, (end - start) / len(chunks))
+        if len(boundaries):
+            steps = np.arange(1, len(boundaries) + 1) * min_gap
+            shifted = np.maximum.accumulate(boundaries - steps)
+            boundaries = np.clip(shifted, start, end - len(chunks) * min_gap) + steps
+        edges = np.concatenate(([start], boundaries, [end]))
+        return [(float(edges[i]), float(max(edges[i + 1], edges[i]))) for i in range(len(chunks))]
+    
+    def _decode(self, audio_path: str) -> Optional[np.ndarray]:
+        """Decode audio to float32 mono PCM at SAMPLE_RATE"""
+        cmd = [
+            'ffmpeg', '-v', 'error',
+            '-i', audio_path,
+            '-ac', '1',
+            '-ar', str(SAMPLE_RATE),
+            '-f', 's16le',
+            'pipe:1'
+        ]
+        try:
+            result = subprocess.run(cmd, capture_output=True, timeout=DECODE_TIMEOUT)
+            if result.returncode != 0 or not result.stdout:
+                logger.warning(f"Failed to decode {audio_path}: {result.stderr.decode(errors='replace')[:200]}")
+                return None
+            return np.frombuffer(result.stdout, dtype=np.int16).astype(np.float32) / 32768.0
+        except Exception as e:
+            logger.warning(f"Failed to decode {audio_path}: {e}")
+            return None
+
+
+# Singleton instance
+subtitle_aligner = SubtitleAligner()
@@ -3,13 +3,17 @@ Subtitle/SRT generator for videos
 """
 import os
 import re
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+import shutil
 import logging
 
+from utils.artifacts import artifact_store
+from utils.scratch import scratch
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-MEDIA_DIR = "/app/media"
+MEDIA_DIR = os.getenv("MEDIA_DIR", "/app/media")
 
 
 class SubtitleGenerator:
@@ -22,7 +26,8 @@ class SubtitleGenerator:
         self, 
         script: str, 
         video_id: str,
-        words_per_second: float = 2.3
+        words_per_second: float = 2.3,
+        audio_path: Optional[str] = None
     ) -> str:
         """
         Generate SRT subtitle file from script
@@ -30,8 +35,10 @@ class SubtitleGenerator:
         Args:
             script: Full video script
             video_id: Unique video ID
-            words_per_second: Speaking rate
-            
+            words_per_second: Speaking rate, used when there is no narration
+                to align to (or alignment fails)
+            audio_path: Narration audio; captions are timed to its speech
+        
         Returns:
             Path to generated SRT file
         """
@@ -40,16 +47,17 @@ class SubtitleGenerator:
             chunks = self._split_into_chunks(script)
             
             # Generate SRT content
-            srt_content = self._create_srt_content(chunks, words_per_second)
+            timings = self._chunk_timings(chunks, words_per_second, audio_path)
+            srt_content = self._create_srt_content(chunks, timings)
             
             # Save SRT file
-            srt_path = os.path.join(MEDIA_DIR, f"{video_id}.srt")
+            srt_path = scratch.path(video_id, "subtitles.srt")
             with open(srt_path, 'w', encoding='utf-8') as f:
                 f.write(srt_content)
             
             logger.info(f"Generated SRT file: {srt_path}")
             return srt_path
-            
+        
         except Exception as e:
             logger.error(f"Error generating subtitles: {str(e)}")
             raise
@@ -85,31 +93,50 @@ class SubtitleGenerator:
         
         return chunks
     
+    def _chunk_timings(
+        self,
+        chunks: List[str],
+        words_per_second: float,
+        audio_path: Optional[str] = None
+    ) -> List[Tuple[float, float]]:
+        """(start, end) of each chunk: aligned to the narration if possible, else at a fixed rate"""
+        if audio_path and os.path.exists(audio_path):
+            # NumPy is only loaded when there is audio to align to
+            from utils.subtitle_aligner import subtitle_aligner
+            
+            timings = subtitle_aligner.align(audio_path, chunks)
+            if timings:
+                return timings
+            logger.warning("Subtitle alignment failed, using fixed-rate timing")
+        
+        timings = []
+        current_time = 0.0
+        for chunk in chunks:
+            # Calculate duration based on word count
+            word_count = len(chunk.split())
+            duration = max(1.5, word_count / words_per_second)  # Minimum 1.5 seconds
+            timings.append((current_time, current_time + duration))
+            current_time += duration
+        return timings
+    
     def _create_srt_content(
         self, 
         chunks: List[str], 
-        words_per_second: float
+        timings: List[Tuple[float, float]]
     ) -> str:
         """Create SRT format content"""
         srt_lines = []
-        current_time = 0.0
         
-        for i, chunk in enumerate(chunks, 1):
-            # Calculate duration based on word count
-            word_count = len(chunk.split())
-            duration = max(1.5, word_count / words_per_second)  # Minimum 1.5 seconds
-            
+        for i, (chunk, (start, end)) in enumerate(zip(chunks, timings), 1):
             # Format timestamps
-            start_time = self._format_timestamp(current_time)
-            end_time = self._format_timestamp(current_time + duration)
+            start_time = self._format_timestamp(start)
+            end_time = self._format_timestamp(end)
             
             # Add subtitle entry
             srt_lines.append(f"{i}")
             srt_lines.append(f"{start_time} --> {end_time}")
             srt_lines.append(chunk)
             srt_lines.append("")  # Empty line between entries
-            
-            current_time += duration
         
         return '\n'.join(srt_lines)
     
@@ -126,11 +153,13 @@ class SubtitleGenerator:
         self, 
         script: str, 
         video_id: str,
-        style: Dict = None
+        style: Dict = None,
+        audio_path: Optional[str] = None
     ) -> str:
         """
         Generate ASS (Advanced SubStation Alpha) subtitle file
-        Better styling options than SRT
+        Better styling options than SRT; events are timed to the narration
+        in audio_path when given
         """
         try:
             default_style = {
@@ -167,39 +196,69 @@ Style: Default,{style['fontname']},{style['fontsize']},{style['primary_colour']}
 [Events]
 Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
 """
-            
+
             # Generate dialogue lines
             dialogue_lines = []
-            current_time = 0.0
-            words_per_second = 2.3
+            timings = self._chunk_timings(chunks, 2.3, audio_path)
             
-            for chunk in chunks:
-                word_count = len(chunk.split())
-                duration = max(1.5, word_count / words_per_second)
-                
-                start = self._format_ass_time(current_time)
-                end = self._format_ass_time(current_time + duration)
+            for chunk, (start_seconds, end_seconds) in zip(chunks, timings):
+                start = self._format_ass_time(start_seconds)
+                end = self._format_ass_time(end_seconds)
                 
                 dialogue_lines.append(
                     f"Dialogue: 0,{start},{end},Default,,0,0,0,,{chunk}"
                 )
-                
-                current_time += duration
             
             # Save ASS file
             ass_content = ass_header + '\n'.join(dialogue_lines)
-            ass_path = os.path.join(MEDIA_DIR, f"{video_id}.ass")
+            ass_path = scratch.path(video_id, "subtitles.ass")
             
             with open(ass_path, 'w', encoding='utf-8') as f:
                 f.write(ass_content)
             
             logger.info(f"Generated ASS file: {ass_path}")
             return ass_path
-            
+        
         except Exception as e:
             logger.error(f"Error generating ASS subtitles: {str(e)}")
             raise
     
+    def write_sidecars(self, srt_path: str, video_id: str) -> Dict[str, str]:
+        """
+        Publish the subtitles as downloadable SRT and WebVTT files
+        
+        Args:
+            srt_path: SRT file generated for the job (in its scratch directory)
+            video_id: Unique video ID
+        
+        Returns:
+            Dict mapping format ('srt', 'vtt') to its path in MEDIA_DIR
+        """
+        try:
+            sidecars = {
+                "srt": os.path.join(MEDIA_DIR, f"{video_id}.srt"),
+                "vtt": os.path.join(MEDIA_DIR, f"{video_id}.vtt")
+            }
+            shutil.copyfile(srt_path, sidecars["srt"])
+            
+            with open(srt_path, encoding='utf-8') as f:
+                srt_content = f.read()
+            with open(sidecars["vtt"], 'w', encoding='utf-8') as f:
+                f.write(self._srt_to_vtt(srt_content))
+            
+            artifact_store.record_many(video_id, [(path, "subtitle") for path in sidecars.values()])
+            logger.info(f"Wrote subtitle sidecars for {video_id}")
+            return sidecars
+        
+        except Exception as e:
+            logger.error(f"Error writing subtitle sidecars: {str(e)}")
+            return {}
+    
+    def _srt_to_vtt(self, srt_content: str) -> str:
+        """WebVTT is SRT with a header and '.' as the millisecond separator"""
+        body = re.sub(r'(\d{2}:\d{2}:\d{2}),(\d{3})', r'\1.\2', srt_content)
+        return "WEBVTT\n\n" + body
+    
     def _format_ass_time(self, seconds: float) -> str:
         """Convert seconds to ASS time format (H:MM:SS.cc)"""
         hours = int(seconds // 3600)
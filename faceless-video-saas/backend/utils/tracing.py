@@ -0,0 +1,196 @@
+"""
+Span-style tracing for video jobs
+
+Each process_video run gets a trace; stages, provider calls and FFmpeg
+commands open nested spans through a context variable, so spans started in
+child tasks are parented correctly. Finished traces are persisted per job
+(see VideoSpanDB) and can be exported in OTLP/JSON form.
+"""
+import os
+import json
+import time
+import secrets
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "faceless-video-api"
+
+# Optional OTLP/HTTP collector, e.g. http://otel-collector:4318
+OTEL_EXPORTER_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "")
+
+
+class Span:
+    """A timed operation inside a job trace"""
+    
+    def __init__(self, trace_id: str, name: str, parent_id: Optional[str], attributes: Dict):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = dict(attributes)
+        self.start_time = time.time()
+        self.end_time: Optional[float] = None
+        self.status = "ok"
+    
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+    
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.end_time is None:
+            return None
+        return round((self.end_time - self.start_time) * 1000, 3)
+    
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "attributes": self.attributes
+        }
+
+
+class JobTrace:
+    """All spans recorded for one job run"""
+    
+    def __init__(self, video_id: str):
+        self.video_id = video_id
+        self.trace_id = secrets.token_hex(16)
+        self.spans: List[Span] = []
+
+
+_current_trace: ContextVar[Optional[JobTrace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """Create job traces and nested spans"""
+    
+    def __init__(self):
+        # Traces of jobs that are still running, so their timeline is visible live
+        self._active: Dict[str, JobTrace] = {}
+    
+    @contextmanager
+    def job(self, video_id: str):
+        """Open the trace for a job run; everything traced inside belongs to it"""
+        trace = JobTrace(video_id)
+        self._active[video_id] = trace
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(None)
+        try:
+            yield trace
+        finally:
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            self._active.pop(video_id, None)
+    
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """
+        Record a span under the current one
+        
+        Outside of a job trace this is a no-op that yields None.
+        """
+        trace = _current_trace.get()
+        if trace is None:
+            yield None
+            return
+        
+        parent = _current_span.get()
+        span = Span(trace.trace_id, name, parent.span_id if parent else None, attributes)
+        trace.spans.append(span)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.set_attribute("error", f"{type(e).__name__}: {e}"[:500])
+            raise
+        finally:
+            span.end_time = time.time()
+            _current_span.reset(token)
+    
+    def set_attribute(self, key: str, value):
+        """Set an attribute on the current span, if any"""
+        span = _current_span.get()
+        if span is not None:
+            span.set_attribute(key, value)
+    
+    def active_spans(self, video_id: str) -> List[Span]:
+        """Spans of a job that is still running"""
+        trace = self._active.get(video_id)
+        return list(trace.spans) if trace else []
+    
+    async def export(self, trace: JobTrace):
+        """Push a finished trace to the OTLP/HTTP collector, if one is configured"""
+        if not OTEL_EXPORTER_OTLP_ENDPOINT or not trace.spans:
+            return
+        
+        from services.registry import registry
+        
+        try:
+            response = await registry.http_client.post(
+                f"{OTEL_EXPORTER_OTLP_ENDPOINT.rstrip('/')}/v1/traces",
+                json=to_otlp([span.to_dict() for span in trace.spans]),
+                timeout=10.0
+            )
+            if response.status_code >= 400:
+                logger.warning(f"OTLP export failed: {response.status_code}")
+        except Exception as e:
+            logger.warning(f"OTLP export failed: {str(e)}")
+
+
+def to_otlp(spans: List[Dict]) -> Dict:
+    """Convert span dicts to an OTLP/JSON ExportTraceServiceRequest"""
+    otlp_spans = []
+    for span in spans:
+        end_time = span["end_time"] or time.time()
+        otlp_spans.append({
+            "traceId": span["trace_id"],
+            "spanId": span["span_id"],
+            "parentSpanId": span["parent_id"] or "",
+            "name": span["name"],
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(int(span["start_time"] * 1e9)),
+            "endTimeUnixNano": str(int(end_time * 1e9)),
+            "attributes": [_otlp_attribute(k, v) for k, v in span["attributes"].items()],
+            "status": {"code": 2 if span["status"] == "error" else 1}
+        })
+    
+    return {
+        "resourceSpans": [{
+            "resource": {
+                "attributes": [_otlp_attribute("service.name", SERVICE_NAME)]
+            },
+            "scopeSpans": [{
+                "scope": {"name": "faceless-video.pipeline"},
+                "spans": otlp_spans
+            }]
+        }]
+    }
+
+
+def _otlp_attribute(key: str, value) -> Dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    if not isinstance(value, str):
+        value = json.dumps(value, default=str)
+    return {"key": key, "value": {"stringValue": value}}
+
+
+# Singleton instance
+tracer = Tracer()
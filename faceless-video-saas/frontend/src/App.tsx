@@ -21,7 +21,7 @@ import ProgressBar from './components/ProgressBar'
       const video = await getVideo(videoId)
       setCurrentVideo(video)
       
-      if (video.status === 'completed' || video.status === 'failed') {
+      if (video.status === 'completed' || video.status === 'failed' || video.status === 'cancelled') {
         setIsCreating(false)
         if (video.status === 'completed') {
           refreshVideos()
@@ -39,7 +39,7 @@ import ProgressBar from './components/ProgressBar'
   useEffect(() => {
     if (!currentVideo || !isCreating) return
     
-    if (currentVideo.status === 'completed' || currentVideo.status === 'failed') {
+    if (currentVideo.status === 'completed' || currentVideo.status === 'failed' || currentVideo.status === 'cancelled') {
       return
     }
 
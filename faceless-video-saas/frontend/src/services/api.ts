@@ -1,10 +1,25 @@
 export interface Video {
   id: string
   topic: string
-  status: 'pending' | 'processing' | 'completed' | 'failed'
+  status: 'pending' | 'processing' | 'completed' | 'failed' | 'cancelled'
   progress: number
   video_url?: string
   thumbnail_url?: string
+  storyboard_url?: string
+  preview_url?: string
+  stream_url?: string
+  renditions?: Record<string, string>
+  profile_report_url?: string
+  memory_report_url?: string
+  peak_memory_bytes?: number
+  encoding?: { tier: string; preset: string; crf_offset: number; render_profiles: string[] }
+  degradations?: string[]
+  priority?: 'interactive' | 'bulk'
+  tenant_id?: string
+  subtitle_mode?: 'burned' | 'embedded' | 'sidecar'
+  subtitle_urls?: Record<string, string>
+  queue_position?: number
+  estimated_start?: string
   script?: string
   created_at: string
 }
@@ -39,6 +54,23 @@ export async function getVideo(id: string) {
   return res.json()
 }
 
+// Get status of many videos in one request; pass the previous ETag to
+// get null back when nothing changed
+export async function getVideoStatuses(ids: string[], etag?: string) {
+  const res = await fetch(`${API_BASE}/videos/status?ids=${ids.map(encodeURIComponent).join(",")}`, {
+    headers: etag ? { "If-None-Match": etag } : {},
+  })
+
+  if (res.status === 304) {
+    return null
+  }
+  if (!res.ok) {
+    throw new Error("Failed to fetch video statuses")
+  }
+
+  return { etag: res.headers.get("ETag") ?? undefined, ...(await res.json()) }
+}
+
 // List all videos
 export async function listVideos() {
   const res = await fetch(`${API_BASE}/videos`)
@@ -50,6 +82,19 @@ export async function listVideos() {
   return res.json()
 }
 
+// Cancel a queued or running video
+export async function cancelVideo(id: string) {
+  const res = await fetch(`${API_BASE}/videos/${id}/cancel`, {
+    method: "POST",
+  })
+
+  if (!res.ok) {
+    throw new Error("Failed to cancel video")
+  }
+
+  return res.json()
+}
+
 // Delete video
 export async function deleteVideo(id: string) {
   const res = await fetch(`${API_BASE}/videos/${id}`, {